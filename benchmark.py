@@ -0,0 +1,1295 @@
+"""Benchmark lokal untuk bagian hot path bot
+
+Jalankan: python benchmark.py [nama_benchmark ...]
+"""
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from leaderboard import TopUsersIndex
+from command_router import RoleResolver
+from metrics import Histogram, MeteredApplication, Metric, render_prometheus
+import user_manager
+from credit_ledger import CreditLedger
+from fake_bot_api import FakeBotApi
+from update_log import UpdateLog
+from sharding import ShardedUserManager, Supervisor
+from storage import JournalStorage, JsonStorage, atomic_write_json
+from user_manager import UserManager
+from user_record import UserRecord
+from webhook import WebhookServer
+
+
+def iter_synthetic_users(count, seed=42):
+    """Hasilkan (user_id, data) sintetis dengan format users.json"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 15, 10, 30).timestamp()
+    for i in range(count):
+        user_id = str(100000000 + i)
+        first_seen = base + rng.randrange(86400 * 365)
+        premium = rng.random() < 0.01
+        yield user_id, {
+            'id': int(user_id),
+            'first_name': f"User{i}",
+            'username': f"user{i}",
+            'language_code': rng.choice(('id', 'en', 'ms')),
+            'first_seen': datetime.fromtimestamp(first_seen).isoformat(),
+            'last_seen': datetime.fromtimestamp(first_seen + rng.randrange(86400 * 30)).isoformat(),
+            'message_count': 0,
+            'total_messages': int(rng.paretovariate(1.2)),
+            'last_message': 'halo',
+            'premium': premium,
+            'premium_since': datetime.fromtimestamp(first_seen).isoformat() if premium else None,
+            'credits': 0
+        }
+
+
+def make_synthetic_users(count, seed=42):
+    """Buat dict users sintetis dengan format users.json"""
+    return dict(iter_synthetic_users(count, seed))
+
+
+def scan_top_users(users, limit=10):
+    """Cara lama get_top_users: buat dict per user lalu sort semuanya"""
+    users_list = []
+    for user_id, data in users.items():
+        users_list.append({
+            'id': user_id,
+            'name': data.get('first_name', 'Unknown'),
+            'username': data.get('username', 'No username'),
+            'total_messages': data.get('total_messages', 0),
+            'first_seen': data.get('first_seen', 'Unknown'),
+            'premium': data.get('premium', False)
+        })
+    users_list.sort(key=lambda x: x['total_messages'], reverse=True)
+    return users_list[:limit]
+
+
+def timeit(func, repeat=5):
+    """Return waktu terbaik (detik) dari beberapa kali eksekusi"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_top_users(sizes=(10_000, 100_000, 1_000_000)):
+    """Bandingkan scan-and-sort dengan TopUsersIndex untuk !topusers"""
+    print("🏆 get_top_users(10): scan-and-sort vs index")
+    for size in sizes:
+        users = make_synthetic_users(size)
+        index = TopUsersIndex()
+        build_time = timeit(lambda: index.rebuild(users), repeat=1)
+
+        # Simulasikan pesan masuk: update incremental
+        user_ids = list(users)
+        rng = random.Random(1)
+        sample = [rng.choice(user_ids) for _ in range(100_000)]
+
+        def update_messages():
+            for user_id in sample:
+                users[user_id]['total_messages'] += 1
+                index.update(user_id, users[user_id]['total_messages'])
+
+        update_time = timeit(update_messages, repeat=1)
+        scan_time = timeit(lambda: scan_top_users(users, 10), repeat=3)
+        index_time = timeit(lambda: index.top(10), repeat=100)
+
+        assert [u['total_messages'] for u in scan_top_users(users, 10)] == \
+            [users[user_id]['total_messages'] for user_id in index.top(10)]
+
+        print(f"  {size:>9,} users | scan {scan_time * 1000:10.2f} ms | "
+              f"index {index_time * 1_000_000:8.2f} µs | "
+              f"update {update_time / len(sample) * 1_000_000:6.2f} µs/pesan | "
+              f"build {build_time:6.2f} s")
+
+
+def measure_memory(build):
+    """Return (objek, byte yang masih dialokasikan) dari build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def bench_memory(sizes=(100_000, 1_000_000)):
+    """Memory UserManager.users: dict per user vs UserRecord (slots)"""
+    print("🧠 Memory users: dict per user vs UserRecord")
+    for size in sizes:
+        users, dict_bytes = measure_memory(lambda: make_synthetic_users(size))
+        del users
+        records, record_bytes = measure_memory(lambda: {
+            user_id: UserRecord.from_dict(data) for user_id, data in iter_synthetic_users(size)
+        })
+
+        # Format users.json tidak berubah
+        for user_id, data in iter_synthetic_users(1000):
+            assert records[user_id].to_dict() == data
+        del records
+
+        print(f"  {size:>9,} users | dict {dict_bytes / 2**20:8.1f} MiB ({dict_bytes / size:5.0f} B/user) | "
+              f"record {record_bytes / 2**20:8.1f} MiB ({record_bytes / size:5.0f} B/user) | "
+              f"hemat {(1 - record_bytes / dict_bytes) * 100:4.1f}%")
+
+
+def write_synthetic_users_json(filename, count):
+    """Tulis users.json sintetis secara streaming (tanpa dict besar di memory)"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for i, (user_id, data) in enumerate(iter_synthetic_users(count)):
+            if i:
+                f.write(',')
+            f.write(json.dumps(user_id))
+            f.write(':')
+            f.write(json.dumps(data, ensure_ascii=False))
+        f.write('}')
+
+
+def legacy_sanitize_input(text, max_length=1000):
+    """sanitize_input lama: re.sub + dua kali replace per pemanggilan"""
+    if text is None:
+        return ""
+    text = str(text)[:max_length]
+    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def legacy_validate_user_id(user_id):
+    """validate_user_id lama"""
+    if isinstance(user_id, (int, str)):
+        user_id_str = str(user_id)
+        if user_id_str.isdigit() and len(user_id_str) <= 20:
+            return user_id_str
+    return None
+
+
+def legacy_sanitize_user_data(user_data):
+    """sanitize_user_data lama: regex per field, cek field lewat list"""
+    sanitized = {}
+    for field, value in user_data.items():
+        if field in ['first_name', 'username', 'last_message']:
+            sanitized[field] = legacy_sanitize_input(value, 500)
+        elif field in ['first_seen', 'last_seen', 'premium_since']:
+            if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', value):
+                sanitized[field] = value
+        elif field in ['id', 'message_count', 'total_messages', 'credits']:
+            if isinstance(value, (int, float)) and value >= 0:
+                sanitized[field] = int(value)
+        elif field == 'premium':
+            sanitized[field] = bool(value)
+        elif field == 'language_code':
+            if isinstance(value, str) and re.match(r'^[a-z]{2,3}(-[A-Z]{2,3})?$', value):
+                sanitized[field] = value
+    return sanitized
+
+
+def legacy_load_users(filename):
+    """Cara lama: json.load seluruh file lalu sanitize per user dengan regex per field (hasil dict)"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {user_id: legacy_sanitize_user_data(user_data) for user_id, user_data in data.items()}
+
+
+def _load_in_child(filename, workers):
+    """Dijalankan di proses terpisah supaya peak RSS tiap loader terukur sendiri"""
+    start = time.perf_counter()
+    if workers is None:
+        users = legacy_load_users(filename)
+        TopUsersIndex().rebuild(users)
+        count = len(users)
+        timings = None
+    else:
+        storage = JsonStorage(filename, max_file_size=None, max_users=None)
+        manager = UserManager(os.path.basename(filename), storage=storage, load_workers=workers)
+        count = manager.get_total_users()
+        timings = manager.load_timings
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return count, elapsed, peak_rss, timings
+
+
+def bench_load(count=600_000, workers=(0, 4)):
+    """Startup load users.json besar: json.load + sanitize lama vs loader streaming"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'users.json')
+        write_synthetic_users_json(filename, count)
+        size_mb = os.path.getsize(filename) / 2**20
+        print(f"📂 Load users.json: {count:,} user, {size_mb:.0f} MiB")
+
+        variants = [(None, "json.load + sanitize lama")]
+        variants += [(w, f"streaming, {w} worker" if w else "streaming, tanpa pool") for w in workers]
+        for variant, label in variants:
+            # Proses baru per varian (fork) supaya peak RSS tidak tercampur
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+                loaded, elapsed, peak_rss, timings = executor.submit(_load_in_child, filename, variant).result()
+            assert loaded == count
+            phases = ""
+            if timings:
+                phases = " | " + " ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+            print(f"  {label:28} | {elapsed:6.2f} s | peak RSS {peak_rss:7.0f} MiB{phases}")
+
+
+def per_call_ns(func, number=200_000):
+    """Waktu terbaik per pemanggilan (nanodetik)"""
+    return timeit(lambda: [func() for _ in range(number)], repeat=3) / number * 1e9
+
+
+def bench_sanitize():
+    """Biaya CPU per pesan: sanitize_input, validate_user_id, sanitize_user_data, add_or_update_user"""
+    print("🧼 Sanitasi per pesan (ns/panggilan, lama vs sekarang)")
+    message = "Halo bot, tolong cek saldo saya ya 🙏"
+    long_message = "lorem ipsum dolor sit amet " * 40
+    dirty_message = 'kata "kutip" dan \\ backslash\x07'
+    user_data = next(iter_synthetic_users(1))[1]
+    cases = [
+        ("sanitize_input(pesan pendek)", lambda: legacy_sanitize_input(message, 500),
+         lambda: user_manager.sanitize_input(message, 500)),
+        ("sanitize_input(pesan panjang)", lambda: legacy_sanitize_input(long_message, 500),
+         lambda: user_manager.sanitize_input(long_message, 500)),
+        ("sanitize_input(kutip/control)", lambda: legacy_sanitize_input(dirty_message, 500),
+         lambda: user_manager.sanitize_input(dirty_message, 500)),
+        ("sanitize_input(nama sama)", lambda: legacy_sanitize_input("Budi", 100),
+         lambda: user_manager.sanitize_unchanged("Budi", "Budi", 100)),
+        ("validate_user_id(int)", lambda: legacy_validate_user_id(123456789),
+         lambda: user_manager.validate_user_id(123456789)),
+        ("validate_user_id(str)", lambda: legacy_validate_user_id("123456789"),
+         lambda: user_manager.validate_user_id("123456789")),
+        ("sanitize_user_data", lambda: legacy_sanitize_user_data(user_data),
+         lambda: user_manager.sanitize_user_data(user_data)),
+    ]
+    for label, legacy, current in cases:
+        legacy_ns = per_call_ns(legacy)
+        current_ns = per_call_ns(current)
+        print(f"  {label:30} | lama {legacy_ns:7.0f} ns | sekarang {current_ns:7.0f} ns | "
+              f"{legacy_ns / current_ns:4.1f}x")
+
+    # Satu pesan dari user lama, termasuk pencatatan ke buffer journal
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = JournalStorage(os.path.join(tmpdir, 'users.json'))
+        manager = UserManager('users.json', storage=storage, write_behind=True,
+                              flush_interval=3600, flush_threshold=10**9)
+        telegram_user = SimpleNamespace(id=123456789, first_name="Budi", username="budi", language_code="id")
+        manager.add_or_update_user(telegram_user, message)
+        message_ns = per_call_ns(lambda: manager.add_or_update_user(telegram_user, message), number=50_000)
+        print(f"  {'add_or_update_user(user lama)':30} | {message_ns:7.0f} ns/pesan")
+        manager.close()
+
+
+def bench_credits_stress(threads=16, users=8, operations=20_000, initial_credits=1000):
+    """Throughput add/deduct credits dari banyak thread (kebenaran diuji di tests/test_user_manager.py)"""
+    print(f"💰 Credits stress: {threads} thread x {operations:,} operasi, {users} user")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'users.json')
+        manager = UserManager('users.json', storage=JournalStorage(filename, compact_threshold=5000),
+                              write_behind=True, flush_interval=0.05)
+        user_ids = []
+        for i in range(users):
+            telegram_user = SimpleNamespace(id=700000 + i, first_name=f"User{i}", username=f"user{i}",
+                                            language_code='id')
+            manager.add_or_update_user(telegram_user, 'halo')
+            manager.add_credits(telegram_user.id, initial_credits)
+            user_ids.append(telegram_user.id)
+
+        net_changes = []
+        stop = threading.Event()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            net = dict.fromkeys(user_ids, 0)
+            for _ in range(operations):
+                user_id = rng.choice(user_ids)
+                amount = rng.randint(1, 50)
+                if rng.random() < 0.5:
+                    manager.add_credits(user_id, amount)
+                    net[user_id] += amount
+                elif manager.deduct_credits(user_id, amount) is not None:
+                    net[user_id] -= amount
+            net_changes.append(net)
+
+        def churn():
+            # Pesan dari user lain + snapshot penuh berjalan bersamaan
+            new_id = 900000
+            while not stop.is_set():
+                telegram_user = SimpleNamespace(id=new_id, first_name="Baru", username="baru", language_code='id')
+                manager.add_or_update_user(telegram_user, 'pesan')
+                manager.save_users()
+                new_id += 1
+
+        # Perbanyak pergantian thread supaya race condition lebih mungkin muncul
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            churn_thread = threading.Thread(target=churn)
+            churn_thread.start()
+            workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            churn_thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        expected = {
+            user_id: initial_credits + sum(net[user_id] for net in net_changes) for user_id in user_ids
+        }
+        actual = {user_id: manager.get_user_stats(user_id)['credits'] for user_id in user_ids}
+        manager.close()
+
+        # Saldo juga harus sama setelah load ulang dari snapshot + journal
+        reloaded = UserManager('users.json', storage=JournalStorage(filename))
+        persisted = {user_id: reloaded.get_user_stats(user_id)['credits'] for user_id in user_ids}
+        reloaded.close()
+
+        total_operations = threads * operations
+        if actual == expected and persisted == expected:
+            status = "✅ saldo tepat di memory dan setelah reload"
+        else:
+            status = f"❌ saldo tidak cocok (memory {actual}, reload {persisted}, seharusnya {expected})"
+        print(f"  {status} | {total_operations / elapsed:8.0f} operasi/s | {reloaded.get_total_users():,} user")
+
+
+def bench_ledger(debits=100_000, accounts=1000, batch_size=1000, threads=8, durable_debits=2000):
+    """CreditLedger: debit per detik (batch dan durable per operasi) serta pemulihan crash"""
+    print(f"📒 Credit ledger: {debits:,} debit, {accounts:,} akun")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'credits.ledger')
+        ledger = CreditLedger(filename)
+        user_ids = [str(800000 + i) for i in range(accounts)]
+        for user_id in user_ids:
+            ledger.credit(user_id, 10**9, key=f"topup:{user_id}")
+        ledger.commit()
+
+        # Banyak debit, satu write + fsync per batch
+        start = time.perf_counter()
+        for i in range(debits):
+            ledger.debit(user_ids[i % accounts], 3, key=f"debit:{i}")
+            if (i + 1) % batch_size == 0:
+                ledger.commit()
+        ledger.commit()
+        elapsed = time.perf_counter() - start
+        print(f"  batch {batch_size:>5}            | {debits / elapsed:9.0f} debit/s")
+
+        # Durable per operasi dari banyak thread: commit yang bersamaan tergabung dalam satu batch
+        batches_before = ledger.batches
+
+        def worker(worker_id):
+            for i in range(durable_debits // threads):
+                ledger.debit(user_ids[(worker_id * 7 + i) % accounts], 1, key=f"durable:{worker_id}:{i}")
+                ledger.commit()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        total = durable_debits // threads * threads
+        print(f"  durable, {threads} thread        | {total / elapsed:9.0f} debit/s | "
+              f"{ledger.batches - batches_before:,} fsync untuk {total:,} debit")
+
+        # Crash di tengah batch: tulis sebagian batch tanpa penanda commit
+        expected = dict(ledger.balances)
+        for i in range(5):
+            ledger.debit(user_ids[0], 1, key=f"crash:{i}")
+        pending_lines = ledger._pending
+        with open(filename, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(pending_lines[:3]) + '\n' + pending_lines[3][:10])
+
+        recovered = CreditLedger(filename)
+        assert recovered.balances == expected, "Saldo setelah crash tidak sama dengan batch terakhir yang di-commit"
+
+        # Ulangi batch yang hilang dengan key yang sama: hanya diterapkan sekali
+        for _ in range(2):
+            for i in range(5):
+                recovered.debit(user_ids[0], 1, key=f"crash:{i}")
+            recovered.commit()
+        reloaded = CreditLedger(filename)
+        assert reloaded.balance(user_ids[0]) == expected[user_ids[0]] - 5
+        print(f"  ✅ crash di tengah batch: batch terpotong dibuang, retry idempotent "
+              f"({reloaded.transactions:,} transaksi dimuat ulang)")
+
+
+def make_text_update(update_id, user_id, text):
+    """Buat payload update Telegram sintetis berisi pesan teks"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'language_code': 'id'},
+        'text': text
+    }
+    if text.startswith('/'):
+        # Command Telegram (/start) dikenali lewat entity bot_command
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def _run_webhook_load(total_updates, bots, concurrency, queue_size, consume_delay):
+    server = WebhookServer('127.0.0.1', 0)
+    consumers = []
+    targets = []
+    for i in range(bots):
+        token = f"{1000 + i}:benchmark"
+        application = SimpleNamespace(bot=None, update_queue=asyncio.Queue(maxsize=queue_size))
+        path, secret_token = server.add_bot(application, token, 'benchmark-secret')
+        targets.append((path, secret_token))
+
+        async def consume(queue=application.update_queue):
+            while True:
+                await queue.get()
+                if consume_delay:
+                    await asyncio.sleep(consume_delay)
+
+        consumers.append(asyncio.create_task(consume()))
+
+    await server.start()
+    port = server.bound_port
+    requests = []
+    for i in range(total_updates):
+        path, secret_token = targets[i % bots]
+        body = json.dumps(make_text_update(i, 500000 + i % 1000, 'halo')).encode()
+        requests.append(
+            f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"X-Telegram-Bot-Api-Secret-Token: {secret_token}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+
+    # Client HTTP minimal (keep-alive) supaya yang terukur adalah servernya
+    async def worker(worker_id):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for i in range(worker_id, total_updates, concurrency):
+            writer.write(requests[i])
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length:
+                await reader.readexactly(length)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    await server.stop()
+    for task in consumers:
+        task.cancel()
+    return elapsed, server.accepted, server.rejected
+
+
+def bench_webhook(total_updates=20_000, bots=10, concurrency=50, queue_size=1000):
+    """POST update sintetis ke WebhookServer lokal (routing, secret, antrian bounded)"""
+    print(f"🌐 Webhook ingest: {total_updates:,} update, {bots} bot, {concurrency} koneksi")
+    for consume_delay, label in ((0, "consumer cepat"), (0.001, "consumer lambat (backpressure)")):
+        elapsed, accepted, rejected = asyncio.run(
+            _run_webhook_load(total_updates, bots, concurrency, queue_size, consume_delay)
+        )
+        print(f"  {label:32} | {total_updates / elapsed:8.0f} update/s | "
+              f"diterima {accepted:,} | ditolak 503 {rejected:,}")
+
+
+def _process_updates(manager, worker_id, updates, user_pool):
+    """Jalur user store per update: parse Update, cek role, catat pesan"""
+    rng = random.Random(worker_id)
+    for update_id in range(updates):
+        payload = make_text_update(update_id, 200000000 + rng.randrange(user_pool), "halo")
+        message = Update.de_json(payload, None).message
+        manager.is_premium(message.from_user.id)
+        manager.add_or_update_user(message.from_user, message.text)
+
+
+async def _process_updates_async(manager, worker_id, updates, user_pool, bots, offload):
+    """Jalur handler di satu worker: ``bots`` bot berbagi event loop, tiap bot berurutan
+
+    ``offload`` menjalankan RPC ke shard di rpc_executor (seperti
+    main_bot.call_store); tanpa itu RPC memblokir event loop. Return lag
+    event loop maksimum (detik) yang diukur ticker 1 ms.
+    """
+    loop = asyncio.get_running_loop()
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, loop.time() - start - 0.001)
+
+    async def bot(bot_id):
+        rng = random.Random(worker_id * 1000 + bot_id)
+        for update_id in range(updates // bots):
+            payload = make_text_update(update_id, 200000000 + rng.randrange(user_pool), "halo")
+            message = Update.de_json(payload, None).message
+            manager.is_premium(message.from_user.id)
+            if offload:
+                await loop.run_in_executor(manager.rpc_executor, manager.add_or_update_user,
+                                           message.from_user, message.text)
+            else:
+                manager.add_or_update_user(message.from_user, message.text)
+                await asyncio.sleep(0)
+
+    lag_task = asyncio.create_task(ticker())
+    await asyncio.gather(*(bot(bot_id) for bot_id in range(bots)))
+    done.set()
+    await lag_task
+    return max_lag
+
+
+def _drive_shards(addresses, authkey, worker_id, updates, user_pool, bots, offload, barrier, results):
+    """Proses bot worker sintetis: kirim update ke shard lewat ShardedUserManager"""
+    manager = ShardedUserManager.connect(addresses, authkey)
+    barrier.wait()
+    max_lag = asyncio.run(_process_updates_async(manager, worker_id, updates, user_pool, bots, offload))
+    manager.close()
+    results.put(max_lag)
+
+
+def bench_shards(updates=5_000, worker_counts=(1, 2, 4), user_pool=50_000):
+    """Load test supervisor: throughput user store dengan N worker dan N shard
+
+    Tiap worker menjalankan BENCH_BOTS bot (default 4) di satu event loop.
+    Skala antar worker hanya bermakna jika CPU >= worker + shard; dengan
+    CPU lebih sedikit proses saling berebut core.
+    """
+    context = multiprocessing.get_context('fork')
+    bots = int(os.getenv("BENCH_BOTS", "4"))
+    cpus = os.cpu_count()
+    print(f"🔀 Sharding: {updates:,} update per worker, {bots} bot per worker, {user_pool:,} user, {cpus} CPU")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # File shard (users.shardN.json dll.) dibuat relatif ke direktori kerja
+        os.chdir(tmpdir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager = UserManager('users.json', write_behind=True)
+                start = time.perf_counter()
+                _process_updates(manager, 0, updates, user_pool)
+                elapsed = time.perf_counter() - start
+                manager.close()
+            print(f"  {'1 proses, tanpa shard':32} | {updates / elapsed:8.0f} update/s")
+
+            baseline = None
+            # Pembanding: RPC langsung di event loop (sebelum rpc_executor)
+            runs = [(1, False)] + [(workers, True) for workers in worker_counts]
+            for workers, offload in runs:
+                for name in os.listdir(tmpdir):
+                    os.remove(name)
+                supervisor = Supervisor(['bench'] * workers, workers=workers, shards=workers)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    supervisor.start_shards()
+                barrier = context.Barrier(workers + 1)
+                results = context.Queue()
+                processes = [
+                    context.Process(target=_drive_shards, args=(
+                        supervisor.addresses, supervisor.authkey, worker_id, updates, user_pool,
+                        bots, offload, barrier, results
+                    ))
+                    for worker_id in range(workers)
+                ]
+                for process in processes:
+                    process.start()
+                barrier.wait()
+                start = time.perf_counter()
+                max_lag = max(results.get() for _ in processes)
+                elapsed = time.perf_counter() - start
+                for process in processes:
+                    process.join()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    supervisor.stop()
+
+                rate = workers * (updates // bots * bots) / elapsed
+                label = f"{workers} worker, {workers} shard" + ("" if offload else ", RPC di loop")
+                line = f"  {label:32} | {rate:8.0f} update/s | lag loop maks {max_lag * 1000:6.1f} ms"
+                if offload:
+                    baseline = baseline or rate
+                    line += f" | {rate / baseline:4.2f}x (ideal {workers}x)"
+                print(line)
+            if cpus < 2 * max(worker_counts):
+                print(f"  ⚠️ {cpus} CPU untuk {2 * max(worker_counts)} proses: rasio skala tidak mewakili mesin multi-core")
+        finally:
+            os.chdir(cwd)
+
+
+async def _process_updates_ns(application, update, number):
+    """Waktu per process_update (nanodetik) untuk Application tanpa handler"""
+    application._initialized = True
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            await application.process_update(update)
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def bench_metrics(updates=50_000, bots=50, commands=20):
+    """Overhead instrumentation per update dan biaya render /metrics"""
+    histogram = Histogram()
+    print(f"📈 Metrics: overhead per update ({updates:,} update)")
+    print(f"  Histogram.observe        | {per_call_ns(lambda: histogram.observe(0.0031)):6.0f} ns")
+
+    update = Update.de_json(make_text_update(1, 100000001, "halo"), None)
+    plain = Application.builder().token("123456:TEST").build()
+    metered = Application.builder().token("123456:TEST").application_class(MeteredApplication).build()
+    plain_ns = asyncio.run(_process_updates_ns(plain, update, updates))
+    metered_ns = asyncio.run(_process_updates_ns(metered, update, updates))
+    print(f"  process_update biasa     | {plain_ns:6.0f} ns")
+    print(f"  process_update + metrics | {metered_ns:6.0f} ns | overhead {metered_ns - plain_ns:5.0f} ns")
+
+    filled = Histogram()
+    for i in range(1000):
+        filled.observe(i / 10000)
+    metrics = [
+        Metric("bot_update_duration_seconds", "histogram", "bench", [({'bot': str(i)}, filled) for i in range(bots)]),
+        Metric("bot_command_duration_seconds", "histogram", "bench",
+               [({'command': str(i)}, filled) for i in range(commands)]),
+        Metric("bot_updates_total", "counter", "bench", [({'bot': str(i)}, i) for i in range(bots)]),
+    ]
+    render_ms = timeit(lambda: render_prometheus(metrics)) * 1000
+    print(f"  render /metrics          | {render_ms:6.2f} ms ({bots} bot, {commands} command)")
+
+
+def legacy_log_command(user_id, text, status_cek, filter_status="Prefix Command"):
+    """log_command lama: enam print berwarna per command"""
+    now = datetime.now().strftime("%H:%M:%S")
+    line = "\033[95m━━━━━━━━━━━━━━━━━━━━━━━\033[0m"
+    print(line)
+    print(f"\033[96m❗ MENERIMA PERINTAH\033[97m({now})\033[0m")
+    print(f"\033[93m[ID] User   : {user_id}\033[0m")
+    print(f"\033[92m Status : {status_cek}\033[0m ")
+    print(f"\033[92m[MSG] Pesan  : {text}\033[0m")
+    print(f"\033[95m🔍 Filter : {filter_status}\033[0m")
+    print(line)
+
+
+class SlowStream(io.StringIO):
+    """stdout yang lambat (pipe/journald penuh): setiap write menunggu"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return super().write(text)
+
+
+def bench_logging(number=20_000, slow_number=500, slow_delay=0.001):
+    """Biaya log per command di handler: print sinkron lama vs UpdateLog (antrian)"""
+    print(f"📝 Log per command ({number:,} command; sink lambat {slow_delay * 1000:.0f} ms/write)")
+    for label, count, make_stream in (
+        ("/dev/null", number, lambda: open(os.devnull, 'w')),
+        ("sink lambat", slow_number, lambda: SlowStream(slow_delay)),
+    ):
+        stream = make_stream()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(stream):
+            for i in range(count):
+                legacy_log_command(100000000 + i, "!info", "❌ Bukan Premium")
+        legacy_us = (time.perf_counter() - start) / count * 1e6
+
+        stream = make_stream()
+        log = UpdateLog("json", queue_size=10000, stream=stream, name=f"bench.{label}")
+        start = time.perf_counter()
+        for i in range(count):
+            log.command(100000000 + i, "info", "ok", 0.0012, "!info")
+        queued_us = (time.perf_counter() - start) / count * 1e6
+        log.close()
+        print(f"  {label:12} | print lama {legacy_us:8.1f} us | UpdateLog {queued_us:6.1f} us | "
+              f"dibuang {log.dropped}")
+
+    log = UpdateLog("json", sample_rate=0.01, stream=open(os.devnull, 'w'), name="bench.sampled")
+    sampled_ns = per_call_ns(lambda: log.message(100000001, "ok", 0.0012))
+    log.close()
+    print(f"  pesan biasa (sampling 1%) | {sampled_ns:6.0f} ns per pesan")
+
+
+class RecordingRequest(BaseRequest):
+    """BaseRequest tanpa network: setiap request Bot API dicatat lalu dijawab sukses"""
+
+    def __init__(self, bot_id):
+        self.bot_id = bot_id
+        self.calls = Counter()
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if endpoint == 'getMe':
+            result = {'id': self.bot_id, 'is_bot': True, 'first_name': "Harness", 'username': "harness_bot"}
+        elif endpoint == 'sendMessage':
+            params = request_data.parameters
+            self._message_id += 1
+            result = {
+                'message_id': self._message_id, 'date': int(time.time()),
+                'chat': {'id': params['chat_id'], 'type': 'private'}, 'text': params['text']
+            }
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+# Campuran update untuk harness handler: (bobot, jenis)
+HANDLER_MIX = ((45, 'text'), (35, 'command'), (10, 'start'), (10, 'owner'))
+HANDLER_COMMANDS = ("!test", "!ping", "!stats", "!info", "!menu", "!myid", "!premium", "!time", "!p",
+                    "!tidakada", "!topusers")
+OWNER_COMMANDS = ("!topusers", "!premiumlist", "!ratelimit", "!metrics", "!queue", "!setpremium")
+
+
+def make_handler_updates(count, user_count, owner_id, new_user_ratio=0.05, seed=7):
+    """Payload update sintetis (jenis, payload) dengan campuran HANDLER_MIX"""
+    rng = random.Random(seed)
+    kinds = [kind for weight, kind in HANDLER_MIX for _ in range(weight)]
+    for update_id in range(count):
+        kind = rng.choice(kinds)
+        if rng.random() < new_user_ratio:
+            user_id = 300000000 + update_id
+        else:
+            user_id = 100000000 + rng.randrange(user_count)
+        if kind == 'text':
+            text = rng.choice(("halo", "apa kabar?", "terima kasih banyak 🙏"))
+        elif kind == 'command':
+            text = rng.choice(HANDLER_COMMANDS)
+        elif kind == 'start':
+            text = "/start"
+        else:
+            text = rng.choice(OWNER_COMMANDS)
+            if text == "!setpremium":
+                text = f"{text} {user_id}"
+            user_id = owner_id
+        yield kind, make_text_update(update_id, user_id, text)
+
+
+def percentile(values, q):
+    """Persentil dari list yang sudah terurut"""
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+async def _drive_handlers(updates, user_count):
+    # Modul bot diimport di sini: main_bot memuat user store dari direktori kerja saat import
+    import index_bot
+    import main_bot
+
+    bot_id = 1000
+    request = RecordingRequest(bot_id)
+    application = (
+        Application.builder()
+        .token(f"{bot_id}:harness")
+        .request(request)
+        .get_updates_request(RecordingRequest(bot_id))
+        .application_class(MeteredApplication)
+        .build()
+    )
+    manager = index_bot.BotManager(metrics_port=0)
+    manager.setup_bot_handlers(application)
+    manager.applications.append(application)
+    await application.initialize()
+
+    prepared = [(kind, Update.de_json(payload, application.bot))
+                for kind, payload in make_handler_updates(updates, user_count, main_bot.OWNER_ID)]
+    user_manager = main_bot.user_manager
+    user_manager.flush()
+    written_before = user_manager.get_storage_stats()['bytes_written']
+    sends_before = request.calls['sendMessage']
+
+    latencies = {}
+    start = time.perf_counter()
+    for kind, update in prepared:
+        update_start = time.perf_counter()
+        await application.process_update(update)
+        latencies.setdefault(kind, []).append(time.perf_counter() - update_start)
+    elapsed = time.perf_counter() - start
+
+    # Sisa write-behind ikut dihitung sebagai biaya update yang diproses
+    user_manager.flush()
+    written = user_manager.get_storage_stats()['bytes_written'] - written_before
+    throttled = main_bot.rate_limiter.get_stats()['throttled']
+    await application.shutdown()
+    user_manager.close()
+    main_bot.update_log.close()
+    return {
+        'elapsed': elapsed,
+        'latencies': {kind: sorted(values) for kind, values in latencies.items()},
+        'bytes_written': written,
+        'replies': request.calls['sendMessage'] - sends_before,
+        'throttled': throttled,
+        'errors': application.update_errors,
+    }
+
+
+def _handler_load_in_child(tmpdir, updates, user_count):
+    """Dijalankan di proses baru per jumlah user (state modul main_bot bersih)"""
+    os.chdir(tmpdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(_drive_handlers(updates, user_count))
+
+
+def bench_handlers(user_counts=None, updates=20_000):
+    """Harness offline: update sintetis lewat handler asli (setup_bot_handlers) dengan bot palsu
+
+    Jumlah user bisa diatur lewat env BENCH_USERS (misal ``BENCH_USERS=1000,500000``).
+    """
+    from config import USER_STORAGE
+
+    if user_counts is None:
+        user_counts = [int(count) for count in os.getenv("BENCH_USERS", "1000,100000").split(',')]
+    mix = ", ".join(f"{weight}% {kind}" for weight, kind in HANDLER_MIX)
+    print(f"🤖 Handler: {updates:,} update ({mix}), storage {USER_STORAGE}")
+    for user_count in user_counts:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_synthetic_users_json(os.path.join(tmpdir, 'users.json'), user_count)
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+                result = executor.submit(_handler_load_in_child, tmpdir, updates, user_count).result()
+
+        latencies = sorted(value for values in result['latencies'].values() for value in values)
+        print(f"  {user_count:>9,} user | {updates / result['elapsed']:7.0f} update/s | "
+              f"p50 {percentile(latencies, 0.5) * 1000:6.2f} ms | p99 {percentile(latencies, 0.99) * 1000:6.2f} ms | "
+              f"{result['bytes_written'] / updates:7.1f} byte/update | balasan {result['replies']:,} | "
+              f"throttle {result['throttled']:,} | error {result['errors']}")
+        for kind, values in result['latencies'].items():
+            print(f"  {'':>9}   {kind:7} | {len(values):6,}x | p50 {percentile(values, 0.5) * 1000:6.2f} ms | "
+                  f"p99 {percentile(values, 0.99) * 1000:6.2f} ms")
+
+
+async def _drive_e2e(tokens, updates, users, latency, error_rate, outbound_rate, timeout):
+    import index_bot
+
+    api = FakeBotApi(latency=latency, error_rate=error_rate, seed=1)
+    await api.start()
+    manager = index_bot.BotManager(metrics_port=0, base_url=api.base_url, outbound_rate=outbound_rate)
+    bot_tokens = [f"{2000 + i}:e2e" for i in range(tokens)]
+    manager.setup_bots(bot_tokens)
+    await asyncio.gather(*(manager.start_bot(application) for application in manager.applications))
+
+    rng = random.Random(3)
+    start = time.perf_counter()
+    for i in range(updates):
+        api.push_text(bot_tokens[i % tokens], 100000000 + rng.randrange(users), "halo")
+
+    # Selesai jika setiap pesan sudah dibalas atau gagal di handler (error dihitung terpisah)
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        errors = sum(application.update_errors for application in manager.applications)
+        if api.calls['sendMessage'] + errors >= updates:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    errors = sum(application.update_errors for application in manager.applications)
+
+    await manager.stop_all()
+    await api.stop()
+    stats = api.get_stats()
+    return {
+        'elapsed': elapsed,
+        'done': stats['sent'] + errors >= updates,
+        'sent': stats['sent'],
+        'errors': errors,
+        'get_updates': stats['calls'].get('getUpdates', 0),
+        'injected_429': stats['injected_429'],
+        'retries': manager.outbound.retries,
+        'connections': sum(bot['new_connections'] for bot in manager.transport.get_stats().values()),
+        'poll_connections': sum(bot['new_connections'] for bot in manager.poll_transport.get_stats().values()),
+    }
+
+
+def _e2e_in_child(tmpdir, *args):
+    """Satu skenario end-to-end di proses baru (state modul main_bot bersih)"""
+    os.chdir(tmpdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(_drive_e2e(*args))
+
+
+def bench_e2e(token_counts=(1, 10, 50), updates=1_000, users=10_000, timeout=120):
+    """End-to-end: BotManager (polling) melawan FakeBotApi lokal, update masuk sampai balasan terkirim
+
+    Diatur lewat env: BENCH_API_LATENCY (detik per request), BENCH_API_429
+    (peluang sendMessage dibalas 429), BENCH_OUTBOUND_RATE (batas kirim
+    global, default OUTBOUND_GLOBAL_RATE) dan BENCH_UPDATES.
+    """
+    from config import OUTBOUND_GLOBAL_RATE
+
+    latency = float(os.getenv("BENCH_API_LATENCY", "0"))
+    error_rate = float(os.getenv("BENCH_API_429", "0"))
+    outbound_rate = float(os.getenv("BENCH_OUTBOUND_RATE", OUTBOUND_GLOBAL_RATE))
+    updates = int(os.getenv("BENCH_UPDATES", updates))
+    print(f"🧪 End-to-end polling: {updates:,} pesan, {users:,} user, latency API {latency * 1000:.0f} ms, "
+          f"429 {error_rate:.0%}, batas kirim {outbound_rate:.0f}/s")
+    for tokens in token_counts:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+                result = executor.submit(
+                    _e2e_in_child, tmpdir, tokens, updates, users, latency, error_rate, outbound_rate, timeout
+                ).result()
+        status = "" if result['done'] else " | ⚠️ timeout"
+        print(f"  {tokens:3} token | {result['sent'] / result['elapsed']:7.0f} pesan/s | "
+              f"balasan {result['sent']:,} | error {result['errors']:,} | "
+              f"getUpdates {result['get_updates']:,} | koneksi baru {result['connections']} + {result['poll_connections']} polling | "
+              f"429 {result['injected_429']} (retry {result['retries']}){status}")
+
+
+def _responses_in_child(tmpdir):
+    """Biaya render per command di proses baru (main_bot memuat users.json dari tmpdir)"""
+    os.chdir(tmpdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import main_bot
+        from config import PREFIX, RESPONSE_CACHE_TTL
+
+        manager = main_bot.user_manager
+        responses = main_bot.responses
+
+        def legacy_info():
+            # !info lama: get_premium_users() membuat dict untuk setiap user premium
+            return (f"Total Users: {manager.get_total_users()}\n"
+                    f"Premium Users: {len(manager.get_premium_users())}\n")
+
+        cases = [
+            ("!menu", lambda: main_bot.commands.render_help(PREFIX),
+             lambda: responses.get(('menu', PREFIX), lambda: main_bot.commands.render_help(PREFIX))),
+            ("!info", legacy_info, lambda: responses.get('info', main_bot.render_info, RESPONSE_CACHE_TTL)),
+            ("!info (counter)", main_bot.render_info,
+             lambda: responses.get('info', main_bot.render_info, RESPONSE_CACHE_TTL)),
+            ("!topusers", main_bot.render_topusers,
+             lambda: responses.get('topusers', main_bot.render_topusers, RESPONSE_CACHE_TTL)),
+            ("!premiumlist", main_bot.render_premiumlist,
+             lambda: responses.get('premiumlist', main_bot.render_premiumlist, RESPONSE_CACHE_TTL)),
+        ]
+        results = []
+        for label, render, cached in cases:
+            results.append((label, per_call_ns(render, number=200), per_call_ns(cached, number=200_000)))
+        manager.close()
+        main_bot.update_log.close()
+    return results
+
+
+def bench_responses(count=100_000):
+    """CPU per command untuk teks balasan: render setiap kali vs ResponseCache"""
+    print(f"🗂️ Cache balasan: {count:,} user (1% premium)")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_synthetic_users_json(os.path.join(tmpdir, 'users.json'), count)
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = executor.submit(_responses_in_child, tmpdir).result()
+    for label, render_ns, cached_ns in results:
+        print(f"  {label:16} | render {render_ns / 1000:9.1f} us | cache {cached_ns:6.0f} ns | "
+              f"{render_ns / cached_ns:7.0f}x")
+
+
+async def _drive_startup(tokens, latency, legacy):
+    start = time.perf_counter()
+    import index_bot
+    from main_bot import update_log, user_manager
+
+    api = FakeBotApi(latency=latency)
+    await api.start()
+    if legacy:
+        # Cara lama: users.json dimuat saat import main_bot sebelum bot disiapkan
+        user_manager.wait_ready()
+    manager = index_bot.BotManager(metrics_port=0, base_url=api.base_url)
+    manager.setup_bots([f"{3000 + i}:startup" for i in range(tokens)])
+    if legacy:
+        for application in manager.applications:
+            await manager.start_bot(application)
+    else:
+        await manager.start_bots()
+    polling = time.perf_counter() - start
+
+    # Satu pesan per bot dari user berbeda (jeda per chat antrian kirim tidak ikut terukur)
+    for i, application in enumerate(manager.applications):
+        api.push_text(application.bot.token, 100000001 + i, "halo")
+    await api.wait_for('sendMessage', tokens, timeout=300)
+    first_reply = time.perf_counter() - start
+
+    await manager.stop_all()
+    await api.stop()
+    update_log.close()
+    return polling, first_reply, user_manager.load_seconds
+
+
+def _startup_in_child(tmpdir, tokens, latency, legacy):
+    """Cold start di proses baru: import index_bot sampai bot polling dan membalas"""
+    os.chdir(tmpdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(_drive_startup(tokens, latency, legacy))
+
+
+def bench_startup(token_counts=(10, 50), users=300_000, latency=0.05):
+    """Cold start: load sinkron + start bot serial vs warm-up background + start paralel"""
+    print(f"🚀 Startup: {users:,} user, latency Bot API {latency * 1000:.0f} ms (FakeBotApi)")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_synthetic_users_json(os.path.join(tmpdir, 'users.json'), users)
+        for tokens in token_counts:
+            for legacy, label in ((True, "lama (sinkron, serial)"), (False, "warm-up + paralel")):
+                # Salinan users.json per run supaya journal/snapshot run sebelumnya tidak terbawa
+                run_dir = os.path.join(tmpdir, f"run{tokens}{int(legacy)}")
+                os.mkdir(run_dir)
+                os.link(os.path.join(tmpdir, 'users.json'), os.path.join(run_dir, 'users.json'))
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+                    polling, first_reply, load_seconds = executor.submit(
+                        _startup_in_child, run_dir, tokens, latency, legacy
+                    ).result()
+                print(f"  {tokens:3} token, {label:22} | semua polling {polling:6.2f} s | "
+                      f"balasan pertama {first_reply:6.2f} s | load user store {load_seconds:5.2f} s")
+
+
+async def _wait_until(predicate, timeout):
+    """Tunggu sampai predicate() benar; return detik yang dibutuhkan (None jika timeout)"""
+    start = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - start > timeout:
+            return None
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - start
+
+
+async def _drive_reload(tokens, changes, burst, latency, rate):
+    import index_bot
+    from main_bot import update_log, user_manager
+
+    api = FakeBotApi(latency=latency)
+    await api.start()
+    user_manager.wait_ready()
+    manager = index_bot.BotManager(metrics_port=0, base_url=api.base_url, token_file='token.json')
+    token_list = [f"{4000 + i}:reload" for i in range(tokens)]
+    manager.save_tokens(token_list)
+    manager.setup_bots(manager.load_tokens())
+    runner = asyncio.create_task(manager.start_all(reload_interval=0.05))
+    await _wait_until(lambda: len(manager.applications) == tokens, 60)
+
+    def running():
+        return {application.bot.token for application in manager.applications}
+
+    # Separuh bot tetap (menerima pesan terus), separuh lagi diganti satu per satu
+    stable = token_list[:tokens // 2]
+    churn = token_list[tokens // 2:]
+    stable_apps = list(manager.applications[:tokens // 2])
+    pushed = 0
+
+    async def traffic():
+        nonlocal pushed
+        while True:
+            for token in stable:
+                api.push_text(token, 100000001 + pushed % 5000, f"halo {pushed}")
+                pushed += 1
+            await asyncio.sleep(len(stable) / rate)
+
+    traffic_task = asyncio.create_task(traffic())
+    results = []
+    for change in range(changes):
+        victim = churn.pop(0)
+        new_token = f"{5000 + change}:reload"
+        churn.append(new_token)
+        # Antrian untuk bot yang akan dihapus: harus diproses (drain), bukan dibuang
+        for i in range(burst):
+            api.push_text(victim, 200000001 + change * burst + i, f"drain {i}")
+        atomic_write_json('token.json', stable + churn)
+        # Bot baru masuk daftar setelah polling; reload selesai setelah bot lama selesai drain
+        start = time.perf_counter()
+        await _wait_until(lambda: new_token in running(), 30)
+        started = time.perf_counter() - start
+        await _wait_until(lambda: manager.token_reloads > change, 60)
+        drained = time.perf_counter() - start
+        bot = api.bots[victim]
+        results.append({
+            'start': started, 'drain': drained, 'replied': bot.sent,
+            'pending': len(bot.updates), 'lost': burst - bot.sent - len(bot.updates),
+        })
+
+    traffic_task.cancel()
+    await _wait_until(lambda: sum(api.bots[token].sent for token in stable) >= pushed, 30)
+    stable_replied = sum(api.bots[token].sent for token in stable)
+    untouched = all(application in manager.applications and application.running for application in stable_apps)
+
+    # Pembanding: restart penuh (semua bot berhenti lalu start ulang)
+    restart_start = time.perf_counter()
+    manager._stop_event.set()
+    await runner
+    manager = index_bot.BotManager(metrics_port=0, base_url=api.base_url, token_file='token.json')
+    manager.setup_bots(manager.load_tokens())
+    await manager.start_bots()
+    restart = time.perf_counter() - restart_start
+    await manager.stop_all()
+
+    await api.stop()
+    update_log.close()
+    return results, pushed, stable_replied, untouched, restart
+
+
+def _reload_in_child(tmpdir, *args):
+    """Skenario hot reload di proses baru (state modul main_bot bersih)"""
+    os.chdir(tmpdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(_drive_reload(*args))
+
+
+def bench_reload(tokens=10, changes=5, burst=20, latency=0.02, rate=10):
+    """Hot reload token.json: bot diganti satu per satu sementara bot lain tetap menerima pesan"""
+    print(f"🔁 Hot reload: {tokens} bot ({tokens // 2} tetap, {rate} pesan/s), {changes} perubahan token.json, "
+          f"{burst} update tertunda per bot yang dihapus, latency API {latency * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+            results, pushed, stable_replied, untouched, restart = executor.submit(
+                _reload_in_child, tmpdir, tokens, changes, burst, latency, rate
+            ).result()
+    for change, result in enumerate(results, 1):
+        print(f"  perubahan {change} | bot baru polling {result['start']:5.2f} s | reload selesai {result['drain']:5.2f} s | "
+              f"dibalas {result['replied']:2}, tertinggal di server {result['pending']:2}, hilang {result['lost']}")
+    print(f"  bot tetap: {pushed:,} pesan, dibalas {stable_replied:,}, "
+          f"{'tidak pernah di-restart' if untouched else '⚠️ ikut di-restart'}")
+    print(f"  pembanding restart penuh (tanpa import dan load user store): semua {tokens} bot berhenti {restart:.2f} s")
+
+
+def legacy_get_user_role(manager, user_id, owner_id=1):
+    """Cek role versi lama: validasi ID lalu baca data user"""
+    if user_id == owner_id:
+        return "owner"
+    user_id = manager.validate_user_id(user_id)
+    if user_id and user_id in manager.users and manager.users[user_id].premium:
+        return "premium"
+    return "regular"
+
+
+def legacy_get_premium_users(manager):
+    """get_premium_users versi lama: scan semua user"""
+    return [user_id for user_id, user in manager.users.copy().items() if user.premium]
+
+
+def bench_roles(count=100_000, premium_ratio=0.01, lookups=100_000, shards=2):
+    """Cek role per pesan dan daftar premium: data user vs set premium"""
+    print(f"🎭 Role: {count:,} user, {premium_ratio:.0%} premium")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            users = make_synthetic_users(count)
+            for i, user in enumerate(users.values()):
+                user['premium'] = i % int(1 / premium_ratio) == 0
+            with open('users.json', 'w') as f:
+                json.dump(users, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager = UserManager('users.json', write_behind=True)
+            user_ids = [int(user_id) for user_id in random.Random(1).sample(list(users), 1000)]
+            resolver = RoleResolver({1}, manager.is_premium)
+
+            def run_legacy():
+                for user_id in user_ids:
+                    legacy_get_user_role(manager, user_id)
+
+            def run_resolver():
+                for user_id in user_ids:
+                    resolver(user_id)
+
+            number = lookups // len(user_ids)
+            legacy_ns = per_call_ns(run_legacy, number) / len(user_ids)
+            resolver_ns = per_call_ns(run_resolver, number) / len(user_ids)
+            print(f"  {'role per pesan':24} | lama {legacy_ns:7.0f} ns | set premium {resolver_ns:7.0f} ns | "
+                  f"{legacy_ns / resolver_ns:4.1f}x")
+
+            legacy_ms = timeit(lambda: legacy_get_premium_users(manager)) * 1000
+            current_ms = timeit(manager.get_premium_users) * 1000
+            print(f"  {'get_premium_users':24} | scan {legacy_ms:8.2f} ms | set premium {current_ms:8.2f} ms")
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.close()
+
+            # Worker supervisor: RPC ke shard vs salinan set premium di worker
+            supervisor = Supervisor(['bench'], workers=1, shards=shards)
+            with contextlib.redirect_stdout(io.StringIO()):
+                supervisor.start_shards()
+            try:
+                sharded = ShardedUserManager.connect(supervisor.addresses, supervisor.authkey, premium_ttl=5.0)
+                sample = user_ids[:200]
+                start = time.perf_counter()
+                for user_id in sample:
+                    sharded.shard_for(user_id).is_premium(user_id)
+                rpc_us = (time.perf_counter() - start) / len(sample) * 1e6
+                resolver = RoleResolver({1}, sharded.is_premium)
+                resolver(sample[0])
+                start = time.perf_counter()
+                for user_id in sample:
+                    resolver(user_id)
+                cached_us = (time.perf_counter() - start) / len(sample) * 1e6
+                print(f"  {f'{shards} shard (proses)':24} | RPC {rpc_us:8.1f} us | salinan lokal {cached_us:6.2f} us")
+                sharded.close()
+            finally:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    supervisor.stop()
+        finally:
+            os.chdir(cwd)
+
+
+BENCHMARKS = {
+    'top_users': bench_top_users,
+    'memory': bench_memory,
+    'load': bench_load,
+    'sanitize': bench_sanitize,
+    'credits_stress': bench_credits_stress,
+    'ledger': bench_ledger,
+    'webhook': bench_webhook,
+    'shards': bench_shards,
+    'metrics': bench_metrics,
+    'logging': bench_logging,
+    'roles': bench_roles,
+    'handlers': bench_handlers,
+    'e2e': bench_e2e,
+    'responses': bench_responses,
+    'startup': bench_startup,
+    'reload': bench_reload,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Benchmark tidak dikenal: {name} (pilihan: {', '.join(BENCHMARKS)})")
+            continue
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import time
+
+from metrics import Histogram
+
+# Level izin command
+PERMISSION_ALL = "all"
+PERMISSION_PREMIUM = "premium"
+PERMISSION_OWNER = "owner"
+
+# Role user
+ROLE_OWNER = "owner"
+ROLE_PREMIUM = "premium"
+ROLE_REGULAR = "regular"
+
+# Role user yang boleh memakai tiap level izin
+ALLOWED_ROLES = {
+    PERMISSION_ALL: {ROLE_OWNER, ROLE_PREMIUM, ROLE_REGULAR},
+    PERMISSION_PREMIUM: {ROLE_OWNER, ROLE_PREMIUM},
+    PERMISSION_OWNER: {ROLE_OWNER},
+}
+
+
+class RoleResolver:
+    """Role user dari ID: owner / premium / regular, tanpa membaca data user
+
+    ``is_premium(user_id)`` harus murah (set premium di UserManager), jadi
+    cek role untuk rate limit dan izin command cukup satu lookup set.
+    """
+
+    def __init__(self, owner_ids, is_premium):
+        self.owner_ids = frozenset(owner_ids)
+        self.is_premium = is_premium
+
+    def __call__(self, user_id):
+        if user_id in self.owner_ids:
+            return ROLE_OWNER
+        if self.is_premium(user_id):
+            return ROLE_PREMIUM
+        return ROLE_REGULAR
+
+
+class Command:
+    """Satu command terdaftar beserta statistik latency-nya"""
+
+    def __init__(self, name, handler, permission, description, arg_types, usage):
+        self.name = name
+        self.handler = handler
+        self.permission = permission
+        self.description = description
+        self.arg_types = arg_types
+        self.usage = usage
+        self.latency = Histogram()
+
+    def parse_args(self, raw_args):
+        """Konversi argumen sesuai arg_types; return None jika tidak valid"""
+        if len(raw_args) < len(self.arg_types):
+            return None
+        try:
+            parsed = [arg_type(value) for arg_type, value in zip(self.arg_types, raw_args)]
+        except ValueError:
+            return None
+        return parsed + list(raw_args[len(self.arg_types):])
+
+
+class CommandRegistry:
+    """Tabel command prefix: lookup O(1) berdasarkan nama, izin, dan parsing argumen
+
+    ``role_resolver(user_id)`` harus mengembalikan "owner", "premium" atau
+    "regular"; hanya dipanggil untuk command yang izinnya bukan "all".
+    """
+
+    def __init__(self, role_resolver):
+        self.role_resolver = role_resolver
+        self.commands = {}
+        self.aliases = {}
+
+    def command(self, name, permission=PERMISSION_ALL, description="", args=(), usage="", aliases=()):
+        """Decorator untuk mendaftarkan handler ``async def handler(update, context, args)``"""
+        if permission not in ALLOWED_ROLES:
+            raise ValueError(f"Unknown permission: {permission}")
+
+        def decorator(handler):
+            if name in self.commands or name in self.aliases:
+                raise ValueError(f"Command already registered: {name}")
+            self.commands[name] = Command(name, handler, permission, description, tuple(args), usage)
+            for alias in aliases:
+                self.aliases[alias] = name
+            return handler
+
+        return decorator
+
+    def get(self, name):
+        """Cari command berdasarkan nama atau alias"""
+        command = self.commands.get(name)
+        if command is None and name in self.aliases:
+            command = self.commands[self.aliases[name]]
+        return command
+
+    def is_allowed(self, command, user_id):
+        """Cek izin user untuk command"""
+        if command.permission == PERMISSION_ALL:
+            return True
+        return self.role_resolver(user_id) in ALLOWED_ROLES[command.permission]
+
+    async def dispatch(self, command, update, context, raw_args):
+        """Jalankan handler dan catat latency-nya; return False jika argumen tidak valid"""
+        args = command.parse_args(raw_args)
+        if args is None:
+            return False
+
+        start = time.perf_counter()
+        try:
+            await command.handler(update, context, args)
+        finally:
+            command.latency.observe(time.perf_counter() - start)
+        return True
+
+    def render_help(self, prefix):
+        """Teks bantuan untuk !menu, dibuat dari tabel command"""
+        sections = (
+            (PERMISSION_ALL, "🤖 **Daftar Perintah:**"),
+            (PERMISSION_PREMIUM, "**⭐ Premium Commands:**"),
+            (PERMISSION_OWNER, "**👑 Owner Commands:**"),
+        )
+        lines = []
+        for permission, title in sections:
+            commands = [command for command in self.commands.values() if command.permission == permission]
+            if not commands:
+                continue
+            if lines:
+                lines.append("")
+            lines.append(title)
+            for command in commands:
+                usage = f" {command.usage}" if command.usage else ""
+                lines.append(f"`{prefix}{command.name}{usage}` - {command.description}")
+        return "\n" + "\n".join(lines) + "\n"
+
+    def get_stats(self):
+        """Statistik latency per command"""
+        return {
+            name: {
+                'calls': command.latency.count,
+                'avg_ms': command.latency.avg * 1000,
+                'p99_ms': command.latency.quantile(0.99) * 1000,
+                'max_ms': command.latency.max * 1000
+            }
+            for name, command in self.commands.items()
+        }
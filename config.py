@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,3 +9,78 @@ PREFIX = "!"  # Prefix perintah
 OWNER_ID = 12345678 # Gunakan perintah myid lalu isi dengan id yang ad di my id
 PREMIUM_USERS = []
 USER_JSON = "users.json"
+
+# Penyimpanan user (write-behind: simpan per batch, bukan per pesan)
+USER_STORAGE = "journal"  # "json" (tulis ulang users.json), "journal" (append-only + snapshot) atau "sqlite"
+USER_DB = "users.db"  # database untuk USER_STORAGE = "sqlite" (migrasi otomatis dari users.json)
+USER_JOURNAL_COMPACT_THRESHOLD = 10000  # jumlah mutasi di journal sebelum compact ke snapshot
+USER_WRITE_BEHIND = True
+USER_FLUSH_INTERVAL = 5  # detik
+USER_FLUSH_THRESHOLD = 500  # jumlah user dirty sebelum flush dipercepat
+USER_MAX_FILE_SIZE = 512 * 1024 * 1024  # batas ukuran users.json saat load (None = tanpa batas)
+USER_MAX_USERS = 1000000  # batas jumlah user saat menulis users.json (USER_STORAGE = "json")
+USER_LOAD_WORKERS = 0  # jumlah proses untuk validasi saat load (0 = tanpa process pool)
+USER_LOAD_BATCH_SIZE = 10000  # jumlah user per batch saat load streaming
+CREDIT_LEDGER = "credits.ledger"  # ledger transaksi credits (append-only, di-fsync sebelum add/deduct return, juga saat write-behind)
+CREDIT_LEDGER_MAX_KEYS = 1000000  # jumlah idempotency key terakhir yang diingat
+
+# Token bot: token.json dipantau saat berjalan (bot ditambah/dihapus tanpa restart bot lain)
+TOKEN_FILE = os.getenv("TOKEN_FILE", "token.json")
+BOT_TOKENS = [token.strip() for token in os.getenv("BOT_TOKENS", "").split(",") if token.strip()]  # dipisah koma, menggantikan TOKEN_FILE
+HEADLESS = os.getenv("HEADLESS", "").lower() in ("1", "true", "yes")  # tanpa prompt input(); otomatis jika stdin bukan terminal
+TOKEN_RELOAD_INTERVAL = float(os.getenv("TOKEN_RELOAD_INTERVAL", "2"))  # detik antar cek perubahan TOKEN_FILE (0 = nonaktif)
+BOT_DRAIN_TIMEOUT = 30  # detik menunggu update tertunda bot yang dihapus selesai diproses
+
+# Supervisor multi-proses (python sharding.py): token dibagi ke worker, user dipecah ke shard
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "2"))  # proses BotManager (masing-masing punya GIL sendiri)
+USER_SHARDS = int(os.getenv("USER_SHARDS", "2"))  # proses user store, user_id % USER_SHARDS (jangan diubah setelah dipakai)
+USER_SHARD_START_TIMEOUT = 300  # detik menunggu shard selesai load data user
+PREMIUM_CACHE_TTL = 5  # detik; salinan set premium dan statistik storage di worker diambil ulang dari shard
+SHARD_RPC_THREADS = 32  # thread per worker untuk RPC ke shard (handler tidak memblokir event loop)
+
+# HTTP transport bersama untuk semua bot
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "https://api.telegram.org")  # server lokal untuk testing: python fake_bot_api.py
+# getUpdates (long polling) memakai pool terpisah: satu koneksi per bot, selalu keep-alive
+HTTP_POOL_SIZE = 100  # koneksi untuk request API (kirim, getMe, setWebhook, ...)
+HTTP_POOL_RESERVE = 20  # bagian HTTP_POOL_SIZE yang tidak dipakai antrian kirim (getMe, setWebhook, dll.)
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))  # detik menunggu koneksi kosong dari pool
+HTTP_KEEPALIVE_CONNECTIONS = HTTP_POOL_SIZE  # lebih kecil dari pool = koneksi ditutup-buka saat burst
+HTTP_KEEPALIVE_EXPIRY = 30  # detik
+HTTP2 = True  # butuh: pip install "httpx[http2]"
+HTTP_CONNECT_TIMEOUT = 5  # detik
+HTTP_READ_TIMEOUT = 5  # detik (long polling menambah timeout getUpdates)
+
+# Mode bot: "polling" (getUpdates per bot) atau "webhook" (satu server HTTP untuk semua bot)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # URL publik https yang diteruskan ke server webhook
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_hex(16)
+WEBHOOK_QUEUE_SIZE = 1000  # update tertunda per bot sebelum server membalas 503
+
+# Rate limiting per user: (kapasitas burst, token per detik), None = tanpa batas
+RATE_LIMITS = {
+    "owner": None,
+    "premium": (60, 1.0),
+    "regular": (20, 20 / 60),  # 20 pesan per menit
+}
+RATE_LIMIT_MAX_BUCKETS = 100000  # batas jumlah user yang dilacak (LRU)
+
+# Antrian kirim bersama (batas Bot API: ~30 pesan/detik global, 1/detik per chat, 20/menit per grup)
+OUTBOUND_GLOBAL_RATE = 30  # pesan per detik untuk semua bot
+OUTBOUND_PRIVATE_CHAT_INTERVAL = 1.0  # detik antar pesan ke chat pribadi yang sama
+OUTBOUND_GROUP_CHAT_INTERVAL = 3.0  # detik antar pesan ke grup yang sama
+OUTBOUND_MAX_RETRIES = 3  # percobaan ulang setelah 429 (retry_after)
+CONCURRENT_UPDATES = 64  # update yang diproses bersamaan per bot (handler menunggu antrian kirim)
+
+# Cache balasan command: !menu dirender sekali, !info / !topusers / !premiumlist per TTL
+RESPONSE_CACHE_TTL = 5  # detik (!info dan !premiumlist juga dibuang saat status premium berubah)
+
+# Log per update (satu baris JSON per update, ditulis thread terpisah)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "auto")  # "auto" (berwarna jika terminal), "json" atau "pretty"
+LOG_SAMPLE_RATE = 0.01  # fraksi pesan biasa (echo) yang dicatat; command selalu dicatat
+LOG_QUEUE_SIZE = 10000  # baris log tertunda sebelum dibuang (handler tidak pernah menunggu)
+
+# Endpoint metrics format Prometheus: http://METRICS_LISTEN:METRICS_PORT/metrics (0 = nonaktif)
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # supervisor: worker ke-n memakai METRICS_PORT + n
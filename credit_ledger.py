@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from user_record import now_epoch
+
+
+class CreditLedger:
+    """Ledger credits append-only dengan idempotency key dan commit per batch
+
+    Setiap transaksi (credit/debit) dicatat sebagai satu baris JSON berisi
+    jumlah dan saldo sesudahnya. Saldo terbaru per user disimpan di memory
+    (materialized view), jadi baca saldo tidak menyentuh file. Transaksi
+    di-buffer lalu ditulis per batch dalam satu write + fsync, diakhiri baris
+    penanda commit. Saat load, batch tanpa penanda commit (crash di tengah
+    batch) dibuang utuh dan file dipotong, jadi tidak ada batch yang
+    tersimpan setengah. Idempotency key berlaku per user: key yang sama
+    dari user lain adalah transaksi lain.
+    """
+
+    def __init__(self, filename="credits.ledger", max_keys=1000000):
+        self.filename = filename
+        self.max_keys = max_keys
+        self.balances = {}
+        self._keys = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self.transactions = 0
+        self.batches = 0
+        self.bytes_written = 0
+        # Ukuran file sampai batch terakhir yang sudah di-commit
+        self._committed_size = 0
+        self.load()
+
+    def load(self):
+        """Bangun ulang saldo dan idempotency key dari file ledger"""
+        if not os.path.exists(self.filename):
+            return
+
+        batch = []
+        valid_size = 0
+        size = 0
+        with open(self.filename, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                size += len(line)
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    print(f"⚠️ Ledger baris {line_number} rusak, sisa file dibuang")
+                    break
+
+                if 'c' not in entry:
+                    batch.append(entry)
+                    continue
+                if entry['c'] != len(batch):
+                    print(f"⚠️ Ledger batch di baris {line_number} tidak lengkap, sisa file dibuang")
+                    break
+                for transaction in batch:
+                    self._apply_committed(transaction)
+                self.batches += 1
+                batch = []
+                valid_size = size
+
+        # Batch terakhir tanpa penanda commit: crash saat menulis, buang utuh
+        if os.path.getsize(self.filename) > valid_size:
+            print("⚠️ Batch ledger yang belum di-commit dibuang")
+            with open(self.filename, 'r+b') as f:
+                f.truncate(valid_size)
+        self._committed_size = valid_size
+
+        if self.transactions:
+            print(f"💰 {self.transactions} transaksi credits dimuat dari ledger")
+
+    def _apply_committed(self, transaction):
+        self.balances[transaction['u']] = transaction['b']
+        if transaction.get('k') is not None:
+            self._remember_key((transaction['u'], transaction['k']), transaction['b'])
+        self.transactions += 1
+
+    def _remember_key(self, key, balance):
+        self._keys[key] = balance
+        if len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def balance(self, user_id):
+        """Saldo terbaru user (dari memory)"""
+        return self.balances.get(user_id, 0)
+
+    def apply(self, user_id, amount, key=None):
+        """Terapkan transaksi (amount negatif = debit) ke saldo di memory
+
+        Return (saldo, diterapkan). Jika key sudah pernah dipakai user ini,
+        transaksi tidak diulang dan saldo hasil transaksi pertama dikembalikan. Saldo
+        None berarti ditolak karena saldo kurang.
+        """
+        with self._lock:
+            if key is not None and (user_id, key) in self._keys:
+                return self._keys[(user_id, key)], False
+
+            balance = self.balances.get(user_id, 0) + amount
+            if balance < 0:
+                return None, False
+
+            self.balances[user_id] = balance
+            if key is not None:
+                self._remember_key((user_id, key), balance)
+            self._pending.append(
+                json.dumps({'u': user_id, 'a': amount, 'b': balance, 'k': key, 't': now_epoch()},
+                           separators=(',', ':'))
+            )
+            self.transactions += 1
+            return balance, True
+
+    def credit(self, user_id, amount, key=None):
+        """Tambah credits; return saldo baru"""
+        return self.apply(user_id, amount, key)[0]
+
+    def debit(self, user_id, amount, key=None):
+        """Kurangi credits; return saldo baru atau None jika saldo kurang"""
+        return self.apply(user_id, -amount, key)[0]
+
+    def commit(self):
+        """Tulis semua transaksi yang tertunda sebagai satu batch (satu write + fsync)"""
+        with self._commit_lock:
+            with self._lock:
+                if not self._pending:
+                    return True
+                pending = self._pending
+                self._pending = []
+
+            data = ('\n'.join(pending) + '\n' + json.dumps({'c': len(pending)}) + '\n').encode('utf-8')
+            try:
+                with open(self.filename, 'ab') as f:
+                    # Sisa write yang gagal sebelumnya dibuang dulu
+                    if f.tell() != self._committed_size:
+                        f.truncate(self._committed_size)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._committed_size = f.tell()
+            except Exception as e:
+                print(f"❌ Error writing ledger: {e}")
+                # Kembalikan ke buffer supaya dicoba lagi di commit berikutnya
+                with self._lock:
+                    self._pending = pending + self._pending
+                return False
+
+            self.batches += 1
+            self.bytes_written += len(data)
+            return True
+
+    def get_stats(self):
+        """Jumlah transaksi, batch dan user dengan saldo"""
+        return {
+            'transactions': self.transactions,
+            'batches': self.batches,
+            'pending': len(self._pending),
+            'accounts': len(self.balances),
+            'bytes_written': self.bytes_written
+        }
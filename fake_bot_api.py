@@ -0,0 +1,323 @@
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import Counter, deque
+
+import httpx
+
+from simple_http import HttpResponse, start_http_server
+
+# Method yang mengirim ke chat (kena injeksi 429 seperti batas kirim Telegram)
+SEND_METHODS = frozenset((
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendSticker', 'sendChatAction',
+    'editMessageText', 'forwardMessage', 'copyMessage',
+))
+
+
+def _chat_id(params):
+    """chat_id dari parameter request (dikirim sebagai teks oleh PTB)"""
+    chat_id = params.get('chat_id')
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return chat_id
+
+
+class FakeBot:
+    """State satu token di server palsu: antrian update, webhook dan pesan terkirim"""
+
+    def __init__(self, token):
+        self.token = token
+        bot_id = token.split(':', 1)[0]
+        self.id = int(bot_id) if bot_id.isdigit() else 0
+        self.updates = deque()
+        self.next_update_id = 1
+        self.last_delivered = 0
+        self.message_ids = itertools.count(1)
+        self.webhook_url = ""
+        self.webhook_secret = ""
+        self.new_updates = asyncio.Event()
+        self.delivery = None
+        self.sent = 0
+
+    def as_user(self):
+        return {'id': self.id, 'is_bot': True, 'first_name': f"FakeBot{self.id}", 'username': f"fake{self.id}_bot"}
+
+
+class FakeBotApi:
+    """Server Bot API palsu (lokal) untuk test end-to-end banyak bot tanpa Telegram
+
+    Mendukung getMe, getUpdates (long polling dengan offset), sendMessage,
+    setWebhook / deleteWebhook / getWebhookInfo; method lain dijawab
+    ``true``. Token apa pun diterima. ``latency`` (detik) ditambahkan ke
+    setiap response, ``error_rate`` adalah peluang method kirim dibalas 429
+    dengan ``retry_after``; ``inject_429(n)`` membalas n request kirim
+    berikutnya dengan 429 (deterministik untuk test). Setiap request kirim
+    dicatat di ``send_log``. Jika webhook di-set, getUpdates dibalas 409
+    seperti Telegram dan update dikirim (POST) ke URL webhook.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, retry_after=1, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.bots = {}
+        self.calls = Counter()
+        self.injected_429 = 0
+        self.delivered = 0
+        # (waktu monotonic, token, method, chat_id, status) per request kirim
+        self.send_log = []
+        self._forced_429 = 0
+        self._random = random.Random(seed)
+        self._watchers = []
+        self._server = None
+        self._client = None
+
+    @property
+    def base_url(self):
+        """Nilai untuk BOT_API_BASE_URL"""
+        return f"http://{self.host}:{self.port}"
+
+    def bot(self, token):
+        bot = self.bots.get(token)
+        if bot is None:
+            bot = self.bots[token] = FakeBot(token)
+        return bot
+
+    async def start(self):
+        self._server = await start_http_server(self.handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"🧪 Fake Bot API di {self.base_url}")
+
+    async def stop(self):
+        for bot in self.bots.values():
+            if bot.delivery is not None:
+                bot.delivery.cancel()
+            # Lepas getUpdates yang masih menunggu
+            bot.new_updates.set()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def inject_429(self, count=1):
+        """Balas ``count`` request kirim berikutnya dengan 429"""
+        self._forced_429 += count
+
+    # Update masuk
+
+    def push_update(self, token, update):
+        """Masukkan update (dict tanpa update_id) untuk satu bot; return update_id"""
+        bot = self.bot(token)
+        update = dict(update, update_id=bot.next_update_id)
+        bot.next_update_id += 1
+        bot.updates.append(update)
+        bot.new_updates.set()
+        if bot.webhook_url and bot.delivery is None:
+            bot.delivery = asyncio.create_task(self._deliver(bot))
+        return update['update_id']
+
+    def push_text(self, token, user_id, text, chat_id=None):
+        """Masukkan pesan teks dari user (chat pribadi jika chat_id kosong)"""
+        chat_id = user_id if chat_id is None else chat_id
+        message = {
+            'message_id': next(self.bot(token).message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'language_code': 'id'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self.push_update(token, {'message': message})
+
+    async def _deliver(self, bot):
+        """Kirim update ke webhook satu per satu (gagal = dicoba lagi, seperti Telegram)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        try:
+            while bot.updates and bot.webhook_url:
+                update = bot.updates[0]
+                try:
+                    response = await self._client.post(
+                        bot.webhook_url, json=update,
+                        headers={'X-Telegram-Bot-Api-Secret-Token': bot.webhook_secret}
+                    )
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    bot.updates.popleft()
+                    self.delivered += 1
+                else:
+                    await asyncio.sleep(0.1)
+        finally:
+            bot.delivery = None
+
+    # Menunggu hasil
+
+    async def wait_for(self, method, count, timeout=60):
+        """Tunggu sampai ``method`` sudah dipanggil (sukses) sebanyak ``count`` kali"""
+        if self.calls[method] >= count:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._watchers.append((method, count, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _record(self, method):
+        self.calls[method] += 1
+        for watcher in list(self._watchers):
+            watched, count, waiter = watcher
+            if watched == method and self.calls[method] >= count:
+                self._watchers.remove(watcher)
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    # HTTP
+
+    async def handle(self, request):
+        # Path: /bot<token>/<method>
+        parts = request.path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return self.error(404, "Not Found")
+        bot = self.bot(parts[0][3:])
+        method = parts[1]
+        try:
+            params = request.json()
+        except ValueError:
+            return self.error(400, "Bad Request: invalid parameters")
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method in SEND_METHODS and (
+                self._forced_429 or (self.error_rate and self._random.random() < self.error_rate)):
+            self._forced_429 = max(self._forced_429 - 1, 0)
+            self.injected_429 += 1
+            self.send_log.append((time.monotonic(), bot.token, method, _chat_id(params), 429))
+            return HttpResponse.json({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after}
+            }, 429)
+
+        handler = getattr(self, f"api_{method}", None)
+        result = await handler(bot, params) if handler is not None else True
+        if isinstance(result, HttpResponse):
+            return result
+        if method in SEND_METHODS:
+            self.send_log.append((time.monotonic(), bot.token, method, _chat_id(params), 200))
+        self._record(method)
+        return HttpResponse.json({'ok': True, 'result': result})
+
+    @staticmethod
+    def error(status, description):
+        return HttpResponse.json({'ok': False, 'error_code': status, 'description': description}, status)
+
+    async def api_getMe(self, bot, params):
+        return bot.as_user()
+
+    async def api_getUpdates(self, bot, params):
+        if bot.webhook_url:
+            return self.error(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get('offset') or 0)
+        limit = min(int(params.get('limit') or 100), 100)
+        timeout = float(params.get('timeout') or 0)
+
+        # Update dengan ID di bawah offset sudah dikonfirmasi bot
+        while bot.updates and bot.updates[0]['update_id'] < offset:
+            bot.updates.popleft()
+        if not bot.updates and timeout > 0:
+            bot.new_updates.clear()
+            try:
+                await asyncio.wait_for(bot.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        updates = list(itertools.islice(bot.updates, limit))
+        if updates and updates[-1]['update_id'] > bot.last_delivered:
+            self.delivered += sum(1 for update in updates if update['update_id'] > bot.last_delivered)
+            bot.last_delivered = updates[-1]['update_id']
+        return updates
+
+    async def api_sendMessage(self, bot, params):
+        chat_id = int(params['chat_id'])
+        bot.sent += 1
+        return {
+            'message_id': next(bot.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'from': bot.as_user(),
+            'text': params.get('text', ''),
+        }
+
+    async def api_setWebhook(self, bot, params):
+        bot.webhook_url = params.get('url', '')
+        bot.webhook_secret = params.get('secret_token', '')
+        if bot.webhook_url and bot.updates and bot.delivery is None:
+            bot.delivery = asyncio.create_task(self._deliver(bot))
+        return True
+
+    async def api_deleteWebhook(self, bot, params):
+        bot.webhook_url = ""
+        if str(params.get('drop_pending_updates', '')).lower() == 'true':
+            bot.updates.clear()
+        return True
+
+    async def api_getWebhookInfo(self, bot, params):
+        return {'url': bot.webhook_url, 'has_custom_certificate': False,
+                'pending_update_count': len(bot.updates)}
+
+    def get_stats(self):
+        """Jumlah panggilan per method, update terkirim ke bot dan 429 yang diinjeksi"""
+        return {
+            'calls': dict(self.calls),
+            'bots': len(self.bots),
+            'pending_updates': sum(len(bot.updates) for bot in self.bots.values()),
+            'delivered': self.delivered,
+            'sent': sum(bot.sent for bot in self.bots.values()),
+            'injected_429': self.injected_429,
+        }
+
+
+async def _serve(port, rate, users=1000):
+    api = FakeBotApi(port=port)
+    await api.start()
+    print(f"   Jalankan bot dengan BOT_API_BASE_URL={api.base_url}")
+    rng = random.Random()
+    try:
+        while True:
+            await asyncio.sleep(1)
+            # Pesan sintetis untuk bot yang sudah terhubung (sudah getMe)
+            tokens = list(api.bots)
+            for i in range(int(rate) if tokens else 0):
+                api.push_text(tokens[i % len(tokens)], 100000000 + rng.randrange(users), "halo")
+            stats = api.get_stats()
+            print(f"📊 {stats['bots']} bot | update {stats['delivered']} | "
+                  f"terkirim {stats['sent']} | antri {stats['pending_updates']}")
+    finally:
+        await api.stop()
+
+
+def main():
+    """python fake_bot_api.py [port] [update_per_detik]"""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    try:
+        asyncio.run(_serve(port, rate))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,37 @@
+import asyncio
 import json
 import logging
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+import os
+import signal
+import sys
+import time
+
+# Waktu import modul (telegram, main_bot) dihitung untuk laporan startup
+_IMPORT_STARTED = time.perf_counter()
+
 from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters
+from config import (
+    BOT_API_BASE_URL, HTTP_POOL_SIZE, HTTP_POOL_RESERVE, HTTP_POOL_TIMEOUT,
+    HTTP_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE,
+    OWNER_ID, OUTBOUND_GLOBAL_RATE, OUTBOUND_PRIVATE_CHAT_INTERVAL, OUTBOUND_GROUP_CHAT_INTERVAL,
+    OUTBOUND_MAX_RETRIES, CONCURRENT_UPDATES, METRICS_LISTEN, METRICS_PORT,
+    TOKEN_FILE, BOT_TOKENS, HEADLESS, TOKEN_RELOAD_INTERVAL, BOT_DRAIN_TIMEOUT,
+)
+from metrics import MeteredApplication, Metric, MetricsServer, RateTracker, registry
+from outbound import OutboundScheduler
+from storage import atomic_write_json
+from transport import SharedTransport
+from webhook import WebhookServer
 
 # Import handler functions dari main_bot.py
-from main_bot import handle_start_command, handle_command_message, handle_normal_message
+from main_bot import (
+    handle_start_command, handle_command_message, handle_normal_message,
+    record_user_message, prefix_filter, check_rate_limit, wait_for_user_store, user_manager,
+)
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # Setup logging
 logging.basicConfig(
@@ -12,68 +39,256 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# httpx mencatat setiap request (termasuk tiap getUpdates) di level INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
 logger = logging.getLogger(__name__)
 
 class BotManager:
-    def __init__(self):
-        self.updaters = []
+    def __init__(self, mode="polling", metrics_port=METRICS_PORT, base_url=BOT_API_BASE_URL,
+                 outbound_rate=OUTBOUND_GLOBAL_RATE, token_file=TOKEN_FILE):
+        if mode not in ("polling", "webhook"):
+            raise ValueError(f"Unknown bot mode: {mode}")
+        
+        # Semua bot berjalan di satu event loop asyncio (python-telegram-bot v20+)
+        self.mode = mode
+        self.base_url = base_url
+        self.token_file = token_file
+        self.applications = []
+        self._stop_event = None
+        # (mtime, ukuran) token file saat terakhir dibaca, untuk hot reload
+        self._token_file_state = None
+        self.token_reloads = 0
+        # Durasi tiap tahap startup (detik), dilaporkan setelah user store siap
+        self.startup_timings = {'import': IMPORT_SECONDS}
+        
+        # Mode webhook: satu server HTTP untuk semua token
+        self.webhook_server = None
+        if self.mode == "webhook":
+            if not WEBHOOK_URL:
+                raise ValueError("WEBHOOK_URL wajib diisi untuk mode webhook")
+            self.webhook_server = WebhookServer(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        
+        # Satu connection pool HTTP untuk request API semua bot
+        self.transport = SharedTransport(
+            pool_size=HTTP_POOL_SIZE,
+            keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            http2=HTTP2,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            pool_timeout=HTTP_POOL_TIMEOUT,
+        )
+        # Long polling di pool sendiri: tiap bot menahan satu koneksi getUpdates terus-menerus,
+        # jadi pool ini tumbuh sesuai jumlah bot dan tidak berebut dengan request kirim
+        self.poll_transport = SharedTransport(
+            pool_size=None,
+            keepalive_connections=None,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            http2=HTTP2,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            pool_timeout=HTTP_POOL_TIMEOUT,
+        )
+        
+        # Satu antrian kirim untuk semua bot (batas global + per chat, owner didahulukan);
+        # request kirim yang berjalan dibatasi supaya burst tidak melebihi pool
+        self.outbound = OutboundScheduler(
+            global_rate=outbound_rate,
+            private_chat_interval=OUTBOUND_PRIVATE_CHAT_INTERVAL,
+            group_chat_interval=OUTBOUND_GROUP_CHAT_INTERVAL,
+            max_retries=OUTBOUND_MAX_RETRIES,
+            priority_chat_ids={OWNER_ID},
+            max_in_flight=max(HTTP_POOL_SIZE - HTTP_POOL_RESERVE, 1),
+        )
+        
+        # Endpoint /metrics lokal (0 = nonaktif), dibaca dari counter tiap komponen
+        self.metrics_server = MetricsServer(METRICS_LISTEN, metrics_port) if metrics_port else None
+        self._update_rates = RateTracker()
+        registry.register(self.collect_metrics)
         
     def load_tokens(self):
-        """Load tokens dari file JSON"""
+        """Load tokens dari file JSON (token kosong dan duplikat dibuang)"""
+        self._token_file_state = self.stat_token_file()
         try:
-            with open('token.json', 'r') as f:
-                return json.load(f)
+            with open(self.token_file, 'r') as f:
+                tokens = json.load(f)
         except FileNotFoundError:
             return []
+        if not isinstance(tokens, list):
+            raise ValueError(f"{self.token_file} harus berisi list token")
+        return list(dict.fromkeys(str(token).strip() for token in tokens if str(token).strip()))
     
     def save_tokens(self, tokens):
-        """Simpan tokens ke file JSON"""
-        with open('token.json', 'w') as f:
-            json.dump(tokens, f, indent=2)
+        """Simpan tokens ke file JSON (tulis file sementara lalu rename, aman dibaca saat hot reload)"""
+        atomic_write_json(self.token_file, tokens)
+        self._token_file_state = self.stat_token_file()
+    
+    def stat_token_file(self):
+        """(mtime, ukuran) token file, None jika belum ada"""
+        try:
+            stat = os.stat(self.token_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
     
-    def setup_bot_handlers(self, updater):
+    def setup_bot_handlers(self, application):
         """Setup semua handlers untuk satu bot"""
-        dp = updater.dispatcher
+        text_messages = filters.TEXT & ~filters.COMMAND
+        
+        # Warm-up (group -3): update ditahan sampai user store selesai dimuat
+        application.add_handler(TypeHandler(Update, wait_for_user_store), group=-3)
+        
+        # Rate limit (group -2): update yang di-throttle berhenti di sini
+        application.add_handler(TypeHandler(Update, check_rate_limit), group=-2)
+        
+        # Ingress (group -1): catat user sekali per pesan teks (termasuk /start dan /command lain)
+        application.add_handler(MessageHandler(filters.TEXT, record_user_message), group=-1)
         
-        # Command handlers
-        dp.add_handler(CommandHandler("start", handle_start_command))
+        # Command handlers (/start membaca data yang sudah dicatat di ingress)
+        application.add_handler(CommandHandler("start", handle_start_command))
         
-        # Message handlers - priority: command dulu, lalu normal message
-        dp.add_handler(MessageHandler(Filters.text, handle_command_message))
-        dp.add_handler(MessageHandler(Filters.text, handle_normal_message))
+        # Routing: prefix command, selain itu echo
+        application.add_handler(MessageHandler(text_messages & prefix_filter, handle_command_message))
+        application.add_handler(MessageHandler(text_messages, handle_normal_message))
         
         # Error handler
-        dp.add_error_handler(self.error_handler)
+        application.add_error_handler(self.error_handler)
     
-    def error_handler(self, update, context):
-        """Global error handler - PARAMETER DIPERBAIKI"""
-        logger.error(f"Error: {context.error}")
+    async def error_handler(self, update, context):
+        """Global error handler"""
+        if isinstance(context.application, MeteredApplication):
+            context.application.update_errors += 1
+        logger.error(f"Error: {context.error}", exc_info=context.error)
+    
+    def collect_metrics(self):
+        """Metrics per bot (update, durasi, error, antrian) dan antrian kirim"""
+        updates, rates, durations, errors, queues = [], [], [], [], []
+        for application in self.applications:
+            if not isinstance(application, MeteredApplication):
+                continue
+            # Label pakai ID bot (bagian token sebelum ':'), bukan token
+            labels = {'bot': application.bot.token.split(':', 1)[0]}
+            updates.append((labels, application.updates_total))
+            rates.append((labels, self._update_rates.rate(labels['bot'], application.updates_total)))
+            durations.append((labels, application.update_latency))
+            errors.append((labels, application.update_errors))
+            queues.append((labels, application.update_queue.qsize()))
+        
+        outbound = self.outbound.get_stats()
+        return [
+            Metric("bot_updates_total", "counter", "Update yang diproses per bot", updates),
+            Metric("bot_updates_per_second", "gauge", "Laju update per bot (60 detik terakhir)", rates),
+            Metric("bot_update_duration_seconds", "histogram", "Durasi proses satu update per bot", durations),
+            Metric("bot_update_errors_total", "counter", "Error saat memproses update per bot", errors),
+            Metric("bot_update_queue_depth", "gauge", "Update yang menunggu diproses per bot", queues),
+            Metric("bot_startup_seconds", "gauge", "Durasi tiap tahap startup",
+                   [({'phase': phase}, seconds) for phase, seconds in self.startup_timings.items()]),
+            Metric("bot_token_reloads_total", "counter", "Perubahan token file yang diterapkan tanpa restart",
+                   [({}, self.token_reloads)]),
+            Metric("outbound_queue_depth", "gauge", "Request kirim yang sedang antri",
+                   [({}, outbound['queue_depth'])]),
+            Metric("outbound_sent_total", "counter", "Request kirim yang selesai", [({}, outbound['sent'])]),
+            Metric("outbound_retries_total", "counter", "Retry setelah 429", [({}, outbound['retries'])]),
+            Metric("outbound_coalesced_total", "counter", "sendMessage identik yang digabung",
+                   [({}, outbound['coalesced'])]),
+        ]
     
     def setup_bots(self, tokens):
-        """Setup semua bot dari list tokens"""
+        """Setup semua bot dari list tokens (tanpa network; getMe dilakukan saat start)"""
+        start = time.perf_counter()
         for token in tokens:
-            try:
-                # Gunakan Updater dengan use_context=True untuk versi baru
-                updater = Updater(token, use_context=True)
-                
-                # Setup handlers untuk bot ini
-                self.setup_bot_handlers(updater)
-                
-                self.updaters.append(updater)
-                print(f"✅ Bot dengan token {token[:10]}... berhasil di setup!")
-                
-            except Exception as e:
-                print(f"❌ Error setup bot {token[:10]}: {e}")
+            application = self.build_application(token)
+            if application is not None:
+                self.applications.append(application)
+        self.startup_timings['setup'] = time.perf_counter() - start
+    
+    def build_application(self, token):
+        """Buat Application untuk satu token beserta handlernya, None jika gagal"""
+        try:
+            builder = (
+                Application.builder()
+                .token(token)
+                .base_url(f"{self.base_url}/bot")
+                .base_file_url(f"{self.base_url}/file/bot")
+                .request(self.transport.request_for(token[:10]))
+                .get_updates_request(self.poll_transport.request_for(token[:10]))
+                .rate_limiter(self.outbound)
+                .concurrent_updates(CONCURRENT_UPDATES)
+                .application_class(MeteredApplication)
+            )
+            if self.mode == "webhook":
+                # Update datang dari server webhook, antrian dibatasi untuk backpressure
+                builder = builder.updater(None).update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE))
+            application = builder.build()
+            
+            # Setup handlers untuk bot ini
+            self.setup_bot_handlers(application)
+            
+            print(f"✅ Bot dengan token {token[:10]}... berhasil di setup!")
+            return application
+            
+        except Exception as e:
+            print(f"❌ Error setup bot {token[:10]}: {e}")
+            return None
+    
+    async def start_bot(self, application):
+        """Initialize, start, dan mulai polling / daftarkan webhook untuk satu bot"""
+        await application.initialize()
+        await application.start()
+        if self.mode == "webhook":
+            token = application.bot.token
+            path, secret_token = self.webhook_server.add_bot(application, token, WEBHOOK_SECRET)
+            await application.bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}{path}",
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+        else:
+            await application.updater.start_polling()
     
-    def start_all(self):
-        """Mulai semua bot"""
+    async def stop_bot(self, application, drain_timeout=None):
+        """Hentikan polling / webhook dan shutdown satu bot
+
+        ``application.stop()`` memproses dulu update yang sudah masuk antrian;
+        ``drain_timeout`` (detik) membatasi lama menunggunya.
+        """
+        try:
+            if self.webhook_server is not None:
+                self.webhook_server.remove_bot(application.bot.token)
+            if application.updater is not None and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                try:
+                    await asyncio.wait_for(application.stop(), drain_timeout)
+                except asyncio.TimeoutError:
+                    print(f"⚠️ Bot {application.bot.token[:10]}... belum selesai memproses antrian "
+                          f"setelah {drain_timeout} detik, dihentikan paksa")
+            await application.shutdown()
+        except Exception as e:
+            print(f"❌ Error stopping bot {application.bot.token[:10]}: {e}")
+    
+    async def start_all(self, reload_interval=0):
+        """Mulai semua bot lalu tunggu sampai dihentikan
+
+        ``reload_interval`` > 0: token file dipantau dan perubahan diterapkan
+        tanpa restart (lihat ``watch_tokens``).
+        """
         print("🚀 Memulai semua bot...")
-        for updater in self.updaters:
+        self._stop_event = asyncio.Event()
+        
+        if self.webhook_server is not None:
+            await self.webhook_server.start()
+        if self.metrics_server is not None:
             try:
-                updater.start_polling()
-                print(f"📡 Bot {updater.bot.token[:10]}... mulai polling!")
-            except Exception as e:
-                print(f"❌ Error starting bot: {e}")
+                await self.metrics_server.start()
+            except OSError as e:
+                print(f"❌ Metrics endpoint gagal dimulai: {e}")
+                self.metrics_server = None
+        
+        await self.start_bots()
+        user_store_watch = asyncio.create_task(self.watch_user_store())
+        token_watch = asyncio.create_task(self.watch_tokens(reload_interval)) if reload_interval > 0 else None
         
         # Keep the program running
         print("\n" + "="*50)
@@ -81,20 +296,155 @@ class BotManager:
         print("⏹️  Tekan Ctrl+C untuk berhenti")
         print("="*50)
         
-        # Idle untuk menjaga bot tetap running
-        for updater in self.updaters:
-            updater.idle()
-
-def main():
-    """Main function"""
-    manager = BotManager()
+        # Ctrl+C / SIGTERM menghentikan semua bot dengan rapi
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows tidak mendukung add_signal_handler
+                pass
+        
+        try:
+            await self._stop_event.wait()
+        finally:
+            user_store_watch.cancel()
+            if token_watch is not None:
+                # Reload yang sedang berjalan diselesaikan dulu supaya tidak ada bot yang tertinggal
+                self._stop_event.set()
+                await token_watch
+            await self.stop_all()
     
-    # Load existing tokens
-    tokens = manager.load_tokens()
+    async def start_bots(self):
+        """Start semua bot bersamaan (getMe dan getUpdates/setWebhook tiap bot paralel)"""
+        start = time.perf_counter()
+        self.applications = await self.start_applications(self.applications)
+        self.startup_timings['start'] = time.perf_counter() - start
     
-    print("🤖 Multi-Bot Manager")
-    print("=" * 30)
+    async def start_applications(self, applications):
+        """Start beberapa bot bersamaan; return bot yang berhasil (yang gagal di-shutdown)"""
+        results = await asyncio.gather(
+            *(self.start_bot(application) for application in applications), return_exceptions=True
+        )
+        running = []
+        for application, result in zip(applications, results):
+            if isinstance(result, Exception):
+                print(f"❌ Error starting bot {application.bot.token[:10]}: {result}")
+                await self.stop_bot(application)
+            else:
+                running.append(application)
+                print(f"📡 Bot {application.bot.token[:10]}... mulai {self.mode}!")
+        return running
+    
+    async def add_bots(self, tokens):
+        """Tambah bot ke manager yang sedang berjalan (bot lain tidak disentuh)"""
+        applications = [application for application in map(self.build_application, tokens) if application is not None]
+        if applications:
+            self.applications.extend(await self.start_applications(applications))
+    
+    async def remove_bot(self, application):
+        """Hapus satu bot yang sedang berjalan: berhenti menerima update, proses sisa antrian, lalu shutdown"""
+        self.applications.remove(application)
+        token = application.bot.token
+        if self.mode == "webhook":
+            try:
+                # Telegram menyimpan update berikutnya sampai token dipakai lagi
+                await application.bot.delete_webhook()
+            except Exception as e:
+                print(f"❌ Error delete webhook bot {token[:10]}: {e}")
+        pending = application.update_queue.qsize()
+        await self.stop_bot(application, drain_timeout=BOT_DRAIN_TIMEOUT)
+        print(f"➖ Bot {token[:10]}... dihapus ({pending} update tertunda diproses)")
+    
+    async def reload_tokens(self, tokens):
+        """Samakan bot yang berjalan dengan list token: token baru di-start, token yang hilang di-drain"""
+        running = {application.bot.token: application for application in self.applications}
+        wanted = set(tokens)
+        added = [token for token in tokens if token not in running]
+        removed = [application for token, application in running.items() if token not in wanted]
+        if not added and not removed:
+            return
+        print(f"🔄 {self.token_file} berubah: +{len(added)} bot, -{len(removed)} bot")
+        await asyncio.gather(self.add_bots(added), *(self.remove_bot(application) for application in removed))
+        self.token_reloads += 1
+        print(f"✅ {len(self.applications)} bot berjalan")
+    
+    async def watch_tokens(self, interval):
+        """Cek (mtime, ukuran) token file tiap ``interval`` detik dan terapkan perubahannya"""
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            
+            state = self.stat_token_file()
+            # File yang hilang (misal sedang diganti editor) tidak menghentikan bot
+            if state is None or state == self._token_file_state:
+                continue
+            try:
+                tokens = self.load_tokens()
+            except (OSError, ValueError) as e:
+                print(f"❌ {self.token_file} tidak valid, perubahan diabaikan: {e}")
+                continue
+            await self.reload_tokens(tokens)
+    
+    async def watch_user_store(self):
+        """Tunggu warm-up user store, lalu laporkan durasi startup; berhenti jika load gagal"""
+        try:
+            await user_manager.wait_ready_async()
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            self._stop_event.set()
+            return
+        self.startup_timings['user_store'] = user_manager.load_seconds
+        self.print_startup_timings()
     
+    def print_startup_timings(self):
+        """Tampilkan durasi tiap tahap startup"""
+        timings = self.startup_timings
+        print(
+            f"⏱️ Startup: import {timings.get('import', 0):.2f}s | setup {timings.get('setup', 0):.2f}s | "
+            f"start {len(self.applications)} bot {timings.get('start', 0):.2f}s | "
+            f"user store {timings.get('user_store', 0):.2f}s (background)"
+        )
+    
+    async def stop_all(self):
+        """Hentikan semua bot secara bersamaan"""
+        print("🛑 Menghentikan semua bot...")
+        if self.webhook_server is not None:
+            # Berhenti menerima update baru, sisa antrian diproses saat stop
+            await self.webhook_server.stop()
+        await asyncio.gather(*(self.stop_bot(application) for application in self.applications))
+        self.applications = []
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        self.print_transport_stats()
+        self.print_outbound_stats()
+    
+    def print_outbound_stats(self):
+        """Tampilkan statistik antrian kirim"""
+        stats = self.outbound.get_stats()
+        print(
+            f"📤 Terkirim: {stats['sent']}, retry 429: {stats['retries']}, "
+            f"digabung: {stats['coalesced']}, latency rata-rata: {stats['avg_latency_ms']:.1f} ms, "
+            f"maks: {stats['max_latency_ms']:.1f} ms"
+        )
+    
+    def print_transport_stats(self):
+        """Tampilkan statistik pemakaian ulang koneksi per bot (request API dan long polling)"""
+        for label, transport in (("API", self.transport), ("polling", self.poll_transport)):
+            for name, stats in transport.get_stats().items():
+                print(
+                    f"📶 Bot {name}... {label} request: {stats['requests']}, "
+                    f"koneksi baru: {stats['new_connections']}, "
+                    f"reuse: {stats['reused_connections']}, "
+                    f"error: {stats['errors']}, "
+                    f"rata-rata: {stats['avg_latency_ms']:.1f} ms"
+                )
+
+def prompt_tokens(manager, tokens):
+    """Tanya token baru lewat input() dan simpan ke token file"""
     # Jika belum ada tokens, minta input pertama
     if not tokens:
         print("Belum ada token yang terdaftar.")
@@ -124,14 +474,43 @@ def main():
                     print("❌ Token sudah terdaftar!")
         else:
             break
+    return tokens
+
+def main():
+    """Main function"""
+    manager = BotManager(mode=BOT_MODE)
     
-    # Setup dan start semua bot
-    if tokens:
-        print(f"\n🔄 Setting up {len(tokens)} bot...")
-        manager.setup_bots(tokens)
-        manager.start_all()
+    # BOT_TOKENS (env) menggantikan token file dan tidak di-reload
+    tokens = BOT_TOKENS or manager.load_tokens()
+    reload_interval = 0 if BOT_TOKENS else TOKEN_RELOAD_INTERVAL
+    # Tanpa terminal (systemd, docker, supervisor) tidak ada yang menjawab input()
+    headless = HEADLESS or bool(BOT_TOKENS) or not sys.stdin.isatty()
+    
+    print("🤖 Multi-Bot Manager")
+    print(f"📶 Mode: {manager.mode}")
+    print("=" * 30)
+    
+    if headless:
+        print(f"📋 Headless: {len(tokens)} bot dari {'BOT_TOKENS' if BOT_TOKENS else manager.token_file}")
+    else:
+        tokens = prompt_tokens(manager, tokens)
+    
+    # Setup dan start semua bot; dengan hot reload boleh mulai kosong dan menunggu token file diisi
+    if tokens or (headless and reload_interval > 0):
+        if tokens:
+            print(f"\n🔄 Setting up {len(tokens)} bot...")
+            manager.setup_bots(tokens)
+        else:
+            print(f"⏳ Belum ada token, menunggu {manager.token_file} diisi...")
+        if reload_interval > 0:
+            print(f"👀 Perubahan {manager.token_file} diterapkan otomatis (cek tiap {reload_interval:g} detik)")
+        try:
+            asyncio.run(manager.start_all(reload_interval=reload_interval))
+        except KeyboardInterrupt:
+            pass
+        print("👋 Semua bot berhenti")
     else:
         print("❌ Tidak ada bot yang bisa dijalankan!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
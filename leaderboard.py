@@ -0,0 +1,68 @@
+from bisect import bisect_left, insort
+
+
+class TopUsersIndex:
+    """Ranking user berdasarkan total_messages yang di-update secara incremental
+
+    User dikelompokkan per jumlah pesan (bucket), dan daftar jumlah pesan yang
+    ada disimpan terurut. Mengambil top-k cukup berjalan dari bucket terbesar,
+    jadi biayanya O(k) dan tidak tergantung jumlah user. Dalam satu bucket,
+    user diurutkan berdasarkan siapa yang lebih dulu mencapai jumlah tersebut.
+    """
+
+    def __init__(self):
+        self._scores = {}
+        self._buckets = {}
+        self._counts = []
+
+    def __len__(self):
+        return len(self._scores)
+
+    def rebuild(self, users):
+        """Bangun ulang index dari dict users (dipakai saat load)"""
+        self._scores = {}
+        self._buckets = {}
+        self._counts = []
+        for user_id, data in users.items():
+            self.update(user_id, data.get('total_messages', 0))
+
+    def update(self, user_id, total_messages):
+        """Pindahkan user ke bucket sesuai total_messages terbaru"""
+        old = self._scores.get(user_id)
+        if old == total_messages:
+            return
+
+        if old is not None:
+            self._remove_from_bucket(user_id, old)
+
+        self._scores[user_id] = total_messages
+        bucket = self._buckets.get(total_messages)
+        if bucket is None:
+            bucket = self._buckets[total_messages] = {}
+            insort(self._counts, total_messages)
+        bucket[user_id] = None
+
+    def remove(self, user_id):
+        """Hapus user dari index"""
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            self._remove_from_bucket(user_id, old)
+
+    def _remove_from_bucket(self, user_id, count):
+        bucket = self._buckets[count]
+        del bucket[user_id]
+        if not bucket:
+            del self._buckets[count]
+            del self._counts[bisect_left(self._counts, count)]
+
+    def top(self, limit=10):
+        """Ambil ``limit`` user_id teratas, dari total_messages terbesar"""
+        result = []
+        if limit <= 0:
+            return result
+        for count in reversed(self._counts):
+            for user_id in self._buckets[count]:
+                result.append(user_id)
+                if len(result) >= limit:
+                    return result
+        return result
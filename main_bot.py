@@ -1,65 +1,100 @@
-from config import PREFIX, OWNER_ID
+import asyncio
+import time
+from config import (
+    PREFIX, OWNER_ID,
+    RATE_LIMITS, RATE_LIMIT_MAX_BUCKETS, RESPONSE_CACHE_TTL,
+    LOG_FORMAT, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE,
+)
 from datetime import datetime
-from user_manager import UserManager
+from telegram import Chat, ReplyParameters
+from telegram.ext import ApplicationHandlerStop, filters
+from command_router import CommandRegistry, RoleResolver, PERMISSION_OWNER
+from metrics import Metric, registry
+from rate_limiter import TokenBucketLimiter
+from response_cache import ResponseCache
+from sharding import BackgroundUserManager, create_user_manager
+from update_log import UpdateLog
 
-# Inisialisasi UserManager
-user_manager = UserManager()
+# Inisialisasi UserManager (proxy ke proses shard jika dijalankan oleh supervisor)
+# Dimuat di thread background: bot sudah bisa start selagi users.json dibaca
+user_manager = BackgroundUserManager(create_user_manager).start()
+
+# Log per update lewat antrian (ditulis thread terpisah, tidak memblokir handler)
+update_log = UpdateLog(LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE)
+
+# Cache teks balasan command (statis dan per TTL)
+responses = ResponseCache()
 
 def is_user_premium(user_id):
     """Cek apakah user premium - PENgecekan dilakukan di sini"""
     return user_manager.is_premium(user_id)
 
-def log_command(user_id, text, filter_status=None):
-    """Logging command dengan warna dan format yang keren"""
-    now = datetime.now().strftime("%H:%M:%S") 
-    GREEN = "\033[92m"
-    CYAN = "\033[96m"
-    PURPLE = "\033[95m"
-    RESET = "\033[0m"
-    WHITE = "\033[97m"
-    YELLOW = "\033[93m"
-    LINE = f"{PURPLE}━━━━━━━━━━━━━━━━━━━━━━━{RESET}"
-    
-    # Cek status premium di sini
-    if user_id == OWNER_ID:
-        status_cek = "👑 Ownerr"
-    elif is_user_premium(user_id):
-        status_cek = "✅ Premium"
-    else:
-        status_cek = "❌ Bukan Premium"
-    
-    print(LINE)
-    print(f"{CYAN}❗ MENERIMA PERINTAH{WHITE}({now}){RESET}")
-    print(f"{YELLOW}[ID] User   : {user_id}{RESET}")
-    print(f"{GREEN} Status : {status_cek}{RESET} ")
-    print(f"{GREEN}[MSG] Pesan  : {text}{RESET}")
-    if filter_status is not None:
-        print(f"{PURPLE}🔍 Filter : {filter_status}{RESET}")
-    print(LINE)
-
-def handle_start_command(update, context):
+async def call_store(function, *args):
+    """Panggil method user store dari handler
+
+    Di bawah supervisor method itu RPC blocking ke proses shard: dijalankan
+    di thread pool supaya event loop tetap melayani update lain (juga saat
+    shard lambat). UserManager lokal dipanggil langsung.
+    """
+    executor = user_manager.rpc_executor
+    if executor is None:
+        return function(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+# Role user untuk rate limit dan izin command (lookup set premium, tanpa baca data user)
+get_user_role = RoleResolver({OWNER_ID}, is_user_premium)
+
+# Laporan owner yang diulang selagi balasan sebelumnya masih antri cukup dikirim sekali
+OWNER_REPLY_ARGS = {'coalesce': True}
+
+async def reply_owner(update, context, text, **kwargs):
+    """Balas command owner seperti reply_text, lewat antrian kirim dengan penggabungan
+
+    Hanya payload yang sama persis yang digabung: di chat pribadi balasan
+    tidak me-reply pesan (default reply_text), di grup setiap balasan
+    me-reply pesannya sendiri sehingga tidak pernah digabung.
+    """
+    message = update.message
+    if context.bot.rate_limiter is None:
+        return await message.reply_text(text, **kwargs)
+    reply_parameters = None
+    if message.chat.type != Chat.PRIVATE:
+        reply_parameters = ReplyParameters(message_id=message.message_id)
+    return await context.bot.send_message(
+        message.chat_id, text, reply_parameters=reply_parameters,
+        message_thread_id=message.message_thread_id if message.is_topic_message else None,
+        rate_limit_args=OWNER_REPLY_ARGS, **kwargs
+    )
+
+async def handle_start_command(update, context):
     """Handler untuk /start"""
+    start = time.perf_counter()
     user = update.message.from_user
     user_id = user.id
     
-    # Simpan/update user data
-    user_data = user_manager.add_or_update_user(user, "/start")
-    
-    log_command(user_id, "/start", "Start Command")
-    
-    # Cek status premium untuk welcome message
-    premium_status = "✅ Premium User" if is_user_premium(user_id) else "❌ Regular User"
+    # User sudah dicatat di ingress (group -1), di sini hanya dibaca
+    user_data = await call_store(user_manager.get_user_stats, user_id)
     
-    welcome_text = f"""
-👋 **Selamat Datang {user.first_name}!**
-
-📊 **Statistik Anda:**
+    if user_data:
+        # Status premium untuk welcome message (sudah ada di data user)
+        premium_status = "✅ Premium User" if user_data['premium'] else "❌ Regular User"
+        stats_text = f"""📊 **Statistik Anda:**
 🆔 ID: `{user_id}`
 📛 Status: {premium_status}
 📨 Total Pesan: {user_data['total_messages']}
 💰 Credits: {user_data.get('credits', 0)}
 📅 Bergabung: {user_data['first_seen'][:10]}
+"""
+        status = "ok"
+    else:
+        # Pencatatan di ingress gagal (ID ditolak atau store menolak user): sambut tanpa statistik
+        stats_text = f"🆔 ID: `{user_id}`\n❌ Data Anda belum tersimpan, coba lagi nanti.\n"
+        status = "no_data"
+    
+    welcome_text = f"""
+👋 **Selamat Datang {user.first_name}!**
 
+{stats_text}
 Gunakan prefix `{PREFIX}` di depan perintah.
 
 Contoh:
@@ -69,92 +104,79 @@ Contoh:
 
 Bot siap melayani!
 """
-    update.message.reply_text(welcome_text, parse_mode='Markdown')
+    await update.message.reply_text(welcome_text, parse_mode='Markdown')
+    update_log.command(user_id, "/start", status, time.perf_counter() - start)
 
-def handle_command_message(update, context):
-    """Main handler untuk semua command dengan prefix"""
-    text = update.message.text
-    user = update.message.from_user
-    user_id = user.id
-    
-    # Cek apakah pesan diawali prefix
-    if not text.startswith(PREFIX):
-        return  # Langsung skip jika tidak ada prefix
-    
-    # Simpan/update user data
-    user_data = user_manager.add_or_update_user(user, text)
-    if command == "p":
-        update.message.reply_text(f"Prefix : {PREFIX}")
-    # Log command
-    log_command(user_id, text, "Prefix Command")
-    
-    # Ambil command setelah prefix
-    command = text[len(PREFIX):].strip().lower()
-    
-    # Handle command dengan if statement
-    elif command == "test":
-        update.message.reply_text("🏓 Pong!")
-    
-    elif command == "menu":
-        help_text = f"""
-🤖 **Daftar Perintah:**
-`{PREFIX}test` - Test bot response
-`{PREFIX}menu` - Menampilkan bantuan
-`{PREFIX}info` - Info bot
-`{PREFIX}time` - Waktu sekarang
-`{PREFIX}ping` - Test ping
-`{PREFIX}stats` - Statistik Anda
-`{PREFIX}myid` - Lihat ID Anda
-`{PREFIX}premium` - Cek status premium
+# Tabel command prefix
+commands = CommandRegistry(get_user_role)
 
-**👑 Owner Commands:**
-`{PREFIX}topusers` - Top 10 pengguna
-`{PREFIX}setpremium` - Set user premium
-`{PREFIX}premiumlist` - List user premium
-"""
-        update.message.reply_text(help_text, parse_mode='Markdown')
-    
-    elif command == "info":
-        total_users = user_manager.get_total_users()
-        premium_users = len(user_manager.get_premium_users())
-        info_text = f"""
+# Rate limiter per user (dicek sebelum data user disimpan)
+rate_limiter = TokenBucketLimiter(RATE_LIMITS, max_buckets=RATE_LIMIT_MAX_BUCKETS)
+
+async def wait_for_user_store(update, context):
+    """Tahap paling awal pipeline: tahan update sampai user store selesai dimuat"""
+    if not user_manager.ready:
+        await user_manager.wait_ready_async()
+
+async def check_rate_limit(update, context):
+    """Tahap pertama pipeline: buang update dari user yang melewati batas"""
+    user = update.effective_user
+    if user is None:
+        return
+    if not rate_limiter.allow(user.id, get_user_role(user.id)):
+        # Hentikan semua handler berikutnya: tidak disimpan, tidak dibalas
+        raise ApplicationHandlerStop
+
+@commands.command("p", description="Lihat prefix")
+async def cmd_prefix(update, context, args):
+    await update.message.reply_text(f"Prefix : {PREFIX}")
+
+@commands.command("test", description="Test bot response")
+async def cmd_test(update, context, args):
+    await update.message.reply_text("🏓 Pong!")
+
+@commands.command("menu", description="Menampilkan bantuan", aliases=("help",))
+async def cmd_menu(update, context, args):
+    # Tabel command tidak berubah setelah start: dirender sekali
+    help_text = responses.get(('menu', PREFIX), lambda: commands.render_help(PREFIX))
+    await update.message.reply_text(help_text, parse_mode='Markdown')
+
+def render_info():
+    """Bagian !info yang sama untuk semua user (dari counter UserManager)"""
+    return f"""
 ℹ️ **Bot Information**
 - Name: Multi-Bot Manager
 - Version: 2.0
 - Prefix: {PREFIX}
 - Status: Active
-- Total Users: {total_users}
-- Premium Users: {premium_users}
-- Your ID: {user_id}
+- Total Users: {user_manager.get_total_users()}
+- Premium Users: {user_manager.get_premium_count()}
 """
-        update.message.reply_text(info_text, parse_mode='Markdown')
-    
-    elif command == "ping":
-        update.message.reply_text("Pong! 🎯")
-    
-    elif command == "time":
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        update.message.reply_text(f"🕐 Waktu sekarang: {now}")
-    
-    elif command == "myid":
-        update.message.reply_text(f"🆔 Your Telegram ID: `{user_id}`", parse_mode='Markdown')
-    
-    elif command == "premium":
-        if is_user_premium(user_id):
-            user_data = user_manager.get_user_stats(user_id)
-            premium_since = user_data.get('premium_since', 'Unknown')[:10] if user_data.get('premium_since') else 'Unknown'
-            update.message.reply_text(f"🎉 **Anda adalah Premium User!**\n📅 Sejak: {premium_since}", parse_mode='Markdown')
-        else:
-            update.message.reply_text("❌ **Anda bukan Premium User**\nHubungi owner untuk upgrade!", parse_mode='Markdown')
-    
-    elif command == "stats":
-        user_data = user_manager.get_user_stats(user_id)
-        if user_data:
-            premium_status = "✅ Premium" if user_data.get('premium', False) else "❌ Regular"
-            stats_text = f"""
+
+@commands.command("info", description="Info bot")
+async def cmd_info(update, context, args):
+    info_text = await responses.get_async('info', lambda: call_store(render_info), RESPONSE_CACHE_TTL)
+    await update.message.reply_text(f"{info_text}- Your ID: {update.message.from_user.id}\n", parse_mode='Markdown')
+
+@commands.command("time", description="Waktu sekarang")
+async def cmd_time(update, context, args):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    await update.message.reply_text(f"🕐 Waktu sekarang: {now}")
+
+@commands.command("ping", description="Test ping")
+async def cmd_ping(update, context, args):
+    await update.message.reply_text("Pong! 🎯")
+
+@commands.command("stats", description="Statistik Anda")
+async def cmd_stats(update, context, args):
+    user = update.message.from_user
+    user_data = await call_store(user_manager.get_user_stats, user.id)
+    if user_data:
+        premium_status = "✅ Premium" if user_data.get('premium', False) else "❌ Regular"
+        stats_text = f"""
 📊 **Statistik {user.first_name}**
 
-🆔 ID: `{user_id}`
+🆔 ID: `{user.id}`
 👤 Username: @{user_data.get('username', 'No username')}
 📛 Status: {premium_status}
 📨 Total Pesan: {user_data.get('total_messages', 0)}
@@ -162,55 +184,227 @@ def handle_command_message(update, context):
 📅 Bergabung: {user_data.get('first_seen', 'Unknown')[:10]}
 ⏰ Terakhir Online: {user_data.get('last_seen', 'Unknown')[:16]}
 """
-            update.message.reply_text(stats_text, parse_mode='Markdown')
-        else:
-            update.message.reply_text("❌ Data tidak ditemukan!")
+        await update.message.reply_text(stats_text, parse_mode='Markdown')
+    else:
+        await update.message.reply_text("❌ Data tidak ditemukan!")
+
+@commands.command("myid", description="Lihat ID Anda")
+async def cmd_myid(update, context, args):
+    await update.message.reply_text(f"🆔 Your Telegram ID: `{update.message.from_user.id}`", parse_mode='Markdown')
+
+@commands.command("premium", description="Cek status premium")
+async def cmd_premium(update, context, args):
+    user_id = update.message.from_user.id
+    if is_user_premium(user_id):
+        user_data = await call_store(user_manager.get_user_stats, user_id) or {}
+        premium_since = user_data.get('premium_since', 'Unknown')[:10] if user_data.get('premium_since') else 'Unknown'
+        await update.message.reply_text(f"🎉 **Anda adalah Premium User!**\n📅 Sejak: {premium_since}", parse_mode='Markdown')
+    else:
+        await update.message.reply_text("❌ **Anda bukan Premium User**\nHubungi owner untuk upgrade!", parse_mode='Markdown')
+
+# OWNER COMMANDS
+def render_topusers():
+    """Teks !topusers dari index top users"""
+    top_users = user_manager.get_top_users(10)
+    top_text = "🏆 **TOP 10 PENGGUNA**\n\n"
+    for i, user_data in enumerate(top_users, 1):
+        premium_badge = "👑" if user_data['premium'] else ""
+        top_text += f"{i}. {user_data['name']} (@{user_data['username']}) {premium_badge}\n"
+        top_text += f"   📨 {user_data['total_messages']} pesan\n"
+        top_text += f"   📅 {user_data['first_seen'][:10]}\n\n"
+    return top_text
+
+@commands.command("topusers", permission=PERMISSION_OWNER, description="Top 10 pengguna")
+async def cmd_topusers(update, context, args):
+    top_text = await responses.get_async('topusers', lambda: call_store(render_topusers), RESPONSE_CACHE_TTL)
+    await reply_owner(update, context, top_text, parse_mode='Markdown')
+
+@commands.command("setpremium", permission=PERMISSION_OWNER, description="Set user premium",
+                  args=(int,), usage="<user_id>")
+async def cmd_setpremium(update, context, args):
+    target_user_id = args[0]
+    if await call_store(user_manager.set_premium, target_user_id, True):
+        await update.message.reply_text(f"✅ User {target_user_id} sekarang Premium!")
+    else:
+        await update.message.reply_text("❌ User tidak ditemukan!")
+
+@commands.command("ratelimit", permission=PERMISSION_OWNER, description="Statistik rate limiter")
+async def cmd_ratelimit(update, context, args):
+    stats = rate_limiter.get_stats()
+    await reply_owner(
+        update, context,
+        f"🚦 **Rate Limiter**\n"
+        f"✅ Diterima: {stats['admitted']}\n"
+        f"⛔ Di-throttle: {stats['throttled']}\n"
+        f"🪣 Bucket aktif: {stats['buckets']} (dibuang: {stats['evicted']})",
+        parse_mode='Markdown'
+    )
+
+@commands.command("queue", permission=PERMISSION_OWNER, description="Statistik antrian kirim")
+async def cmd_queue(update, context, args):
+    rate_limiter = context.bot.rate_limiter
+    if rate_limiter is None or not hasattr(rate_limiter, 'get_stats'):
+        await reply_owner(update, context, "❌ Antrian kirim tidak aktif!")
+        return
+    stats = rate_limiter.get_stats()
+    await reply_owner(
+        update, context,
+        f"📤 **Antrian Kirim**\n"
+        f"📥 Antri: {stats['queue_depth']}\n"
+        f"✅ Terkirim: {stats['sent']}\n"
+        f"🔁 Retry 429: {stats['retries']}\n"
+        f"🔗 Digabung: {stats['coalesced']}\n"
+        f"⏱️ Latency: {stats['avg_latency_ms']:.1f} ms (maks {stats['max_latency_ms']:.1f} ms)",
+        parse_mode='Markdown'
+    )
+
+def collect_handler_metrics():
+    """Metrics command, rate limiter dan user store (dibaca oleh /metrics dan !metrics)"""
+    limiter = rate_limiter.get_stats()
+    metrics = [
+        Metric("bot_command_duration_seconds", "histogram", "Durasi handler per command prefix",
+               [({'command': name}, command.latency) for name, command in commands.commands.items()]),
+        Metric("rate_limit_admitted_total", "counter", "Update yang lolos rate limiter", [({}, limiter['admitted'])]),
+        Metric("rate_limit_throttled_total", "counter", "Update yang di-throttle", [({}, limiter['throttled'])]),
+        Metric("response_cache_hits_total", "counter", "Balasan command dari cache",
+               [({}, responses.hits)]),
+        Metric("response_cache_misses_total", "counter", "Balasan command yang dirender ulang",
+               [({}, responses.misses)]),
+        Metric("log_dropped_total", "counter", "Baris log yang dibuang karena antrian penuh",
+               [({}, update_log.dropped)]),
+        Metric("log_sampled_out_total", "counter", "Pesan biasa yang tidak dicatat karena sampling",
+               [({}, update_log.sampled_out)]),
+        Metric("user_store_ready", "gauge", "1 jika user store selesai dimuat", [({}, int(user_manager.ready))]),
+    ]
+    # Selama warm-up user store belum punya statistik (jangan tunggu load)
+    if not user_manager.ready:
+        return metrics
+    storage = user_manager.get_storage_stats()
+    return metrics + [
+        Metric("user_store_save_duration_seconds", "histogram", "Durasi simpan batch user store",
+               [({}, storage['save_latency'])]),
+        Metric("user_store_bytes_written_total", "counter", "Byte yang ditulis user store dan ledger (json/journal)",
+               [({}, storage['bytes_written'])]),
+        Metric("user_store_dirty_users", "gauge", "User yang berubah tapi belum disimpan",
+               [({}, storage['dirty_users'])]),
+        Metric("user_store_pending_credits", "gauge", "Transaksi credits yang belum di-commit",
+               [({}, storage['pending_credits'])]),
+        Metric("user_store_users", "gauge", "Jumlah user tersimpan", [({}, storage['users'])]),
+    ]
+
+registry.register(collect_handler_metrics)
+
+@commands.command("metrics", permission=PERMISSION_OWNER, description="Latency, throughput dan antrian")
+async def cmd_metrics(update, context, args):
+    metrics = {metric.name: metric.samples for metric in registry.collect()}
+    lines = [f"📈 **Metrics** (uptime {metrics['bot_uptime_seconds'][0][1]:.0f} s)"]
     
-    # OWNER COMMANDS
-    elif command == "topusers" and user_id == OWNER_ID:
-        top_users = user_manager.get_top_users(10)
-        top_text = "🏆 **TOP 10 PENGGUNA**\n\n"
-        for i, user_data in enumerate(top_users, 1):
-            premium_badge = "👑" if user_data['premium'] else ""
-            top_text += f"{i}. {user_data['name']} (@{user_data['username']}) {premium_badge}\n"
-            top_text += f"   📨 {user_data['total_messages']} pesan\n"
-            top_text += f"   📅 {user_data['first_seen'][:10]}\n\n"
-        update.message.reply_text(top_text, parse_mode='Markdown')
+    rates = dict((labels['bot'], rate) for labels, rate in metrics.get('bot_updates_per_second', []))
+    for labels, histogram in metrics.get('bot_update_duration_seconds', []):
+        lines.append(
+            f"🤖 Bot {labels['bot']}: {histogram.count} update, {rates.get(labels['bot'], 0):.1f}/s, "
+            f"p50 {histogram.quantile(0.5) * 1000:.1f} ms, p99 {histogram.quantile(0.99) * 1000:.1f} ms"
+        )
     
-    elif command.startswith("setpremium") and user_id == OWNER_ID:
-        # !setpremium 123456789
-        parts = text.split()
-        if len(parts) >= 2:
-            target_user_id = int(parts[1])
-            if user_manager.set_premium(target_user_id, True):
-                update.message.reply_text(f"✅ User {target_user_id} sekarang Premium!")
-            else:
-                update.message.reply_text("❌ User tidak ditemukan!")
-        else:
-            update.message.reply_text("❌ Format: !setpremium <user_id>")
+    used = [(labels['command'], histogram) for labels, histogram in metrics['bot_command_duration_seconds']
+            if histogram.count]
+    used.sort(key=lambda item: item[1].count, reverse=True)
+    for name, histogram in used[:10]:
+        lines.append(
+            f"⌨️ {PREFIX}{name}: {histogram.count}x, p50 {histogram.quantile(0.5) * 1000:.1f} ms, "
+            f"p99 {histogram.quantile(0.99) * 1000:.1f} ms"
+        )
     
-    elif command == "premiumlist" and user_id == OWNER_ID:
-        premium_users = user_manager.get_premium_users()
-        if premium_users:
-            premium_text = "👑 **PREMIUM USERS**\n\n"
-            for i, user_data in enumerate(premium_users, 1):
-                premium_text += f"{i}. {user_data['name']} (@{user_data['username']})\n"
-                premium_text += f"   📅 Premium sejak: {user_data['premium_since'][:10]}\n\n"
-            update.message.reply_text(premium_text, parse_mode='Markdown')
-        else:
-            update.message.reply_text("❌ Belum ada premium users!")
+    saves = metrics['user_store_save_duration_seconds'][0][1]
+    written = metrics['user_store_bytes_written_total'][0][1]
+    lines.append(
+        f"💾 Simpan: {saves.count}x, rata-rata {saves.avg * 1000:.1f} ms, "
+        f"maks {saves.max * 1000:.1f} ms, {written / 1024:.0f} KiB ditulis"
+    )
     
+    update_queue = sum(depth for _, depth in metrics.get('bot_update_queue_depth', []))
+    outbound_queue = sum(depth for _, depth in metrics.get('outbound_queue_depth', []))
+    lines.append(
+        f"📥 Antrian: update {update_queue}, kirim {outbound_queue}, "
+        f"user belum disimpan {metrics['user_store_dirty_users'][0][1]}"
+    )
+    await reply_owner(update, context, "\n".join(lines), parse_mode='Markdown')
+
+def render_premiumlist():
+    """Teks !premiumlist; None jika belum ada user premium"""
+    premium_users = user_manager.get_premium_users()
+    if not premium_users:
+        return None
+    premium_text = "👑 **PREMIUM USERS**\n\n"
+    for i, user_data in enumerate(premium_users, 1):
+        premium_text += f"{i}. {user_data['name']} (@{user_data['username']})\n"
+        premium_text += f"   📅 Premium sejak: {user_data['premium_since'][:10]}\n\n"
+    return premium_text
+
+@commands.command("premiumlist", permission=PERMISSION_OWNER, description="List user premium")
+async def cmd_premiumlist(update, context, args):
+    premium_text = await responses.get_async('premiumlist', lambda: call_store(render_premiumlist),
+                                             RESPONSE_CACHE_TTL)
+    if premium_text:
+        await reply_owner(update, context, premium_text, parse_mode='Markdown')
     else:
-        # Command tidak dikenali
-        update.message.reply_text(f"❌ Command `{command}` tidak dikenali. Ketik `{PREFIX}help` untuk bantuan.", parse_mode='Markdown')
+        await reply_owner(update, context, "❌ Belum ada premium users!")
+
+def on_premium_change(user_id, premium):
+    """Teks yang memuat data premium dibuang saat status premium berubah"""
+    responses.invalidate('info', 'premiumlist', 'topusers')
+
+user_manager.add_premium_listener(on_premium_change)
 
-def handle_normal_message(update, context):
-    """Handler untuk pesan normal tanpa prefix"""
+# Teks statis dirender saat start
+responses.get(('menu', PREFIX), lambda: commands.render_help(PREFIX))
+
+class PrefixFilter(filters.MessageFilter):
+    """Filter murah: pesan teks yang diawali PREFIX"""
+    
+    def filter(self, message):
+        return bool(message.text) and message.text.startswith(PREFIX)
+
+prefix_filter = PrefixFilter()
+
+async def record_user_message(update, context):
+    """Ingress: catat user satu kali per update sebelum routing ke command/echo"""
+    await call_store(user_manager.add_or_update_user, update.message.from_user, update.message.text)
+
+async def handle_command_message(update, context):
+    """Main handler untuk semua command dengan prefix (sudah dicatat di ingress)"""
+    start = time.perf_counter()
     text = update.message.text
-    user = update.message.from_user
-    user_id = user.id
+    user_id = update.message.from_user.id
     
-    # Simpan/update user data untuk pesan normal juga
-    user_manager.add_or_update_user(user, text)
+    # Ambil nama command dan argumen setelah prefix
+    parts = text[len(PREFIX):].split()
+    name = parts[0].lower() if parts else ""
+    command = commands.get(name)
     
-    update.message.reply_text(f"Anda mengatakan: {text}")
\ No newline at end of file
+    status = "error"
+    try:
+        if command is None:
+            # Command tidak dikenali
+            status = "unknown"
+            await update.message.reply_text(f"❌ Command `{name}` tidak dikenali. Ketik `{PREFIX}menu` untuk bantuan.", parse_mode='Markdown')
+        elif not commands.is_allowed(command, user_id):
+            status = "forbidden"
+            await update.message.reply_text(f"❌ Command `{name}` khusus {command.permission}!", parse_mode='Markdown')
+        elif not await commands.dispatch(command, update, context, parts[1:]):
+            status = "bad_args"
+            await update.message.reply_text(f"❌ Format: {PREFIX}{command.name} {command.usage}")
+        else:
+            status = "ok"
+    finally:
+        update_log.command(user_id, name, status, time.perf_counter() - start, text)
+
+async def handle_normal_message(update, context):
+    """Handler untuk pesan normal tanpa prefix (sudah dicatat di ingress)"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        await update.message.reply_text(f"Anda mengatakan: {update.message.text}")
+        status = "ok"
+    finally:
+        update_log.message(update.message.from_user.id, status, time.perf_counter() - start)
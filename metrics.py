@@ -0,0 +1,213 @@
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from telegram.ext import Application
+
+from simple_http import HttpResponse, start_http_server
+
+# Satu metric untuk endpoint: kind "counter", "gauge" atau "histogram"
+# samples: list (labels dict, nilai); untuk histogram nilainya Histogram
+Metric = namedtuple('Metric', 'name kind help samples')
+
+
+class Histogram:
+    """Histogram latency dengan bucket tetap (detik), murah dipanggil di hot path
+
+    ``observe`` hanya bisect + tiga penjumlahan, tanpa lock: counter bisa
+    meleset sedikit jika dipanggil dari banyak thread, tapi tidak pernah
+    rusak. Bisa di-pickle (dikirim dari proses shard) dan digabung.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'max')
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # Bucket terakhir untuk nilai di atas bound terbesar (+Inf)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Tambahkan isi histogram lain (bucket harus sama)"""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Perkiraan kuantil (interpolasi linear di dalam bucket, seperti Prometheus)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.bounds[i] if i < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items())
+    if extra:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def render_prometheus(metrics):
+    """Format teks Prometheus (text exposition 0.0.4) dari list Metric"""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples:
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value.bounds + (float('inf'),), value.counts):
+                cumulative += count
+                le = _format_value(bound if bound == float('inf') else float(bound))
+                lines.append(f"{metric.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(float(value.sum))}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {value.count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    """Kumpulan collector; tiap collector adalah fungsi tanpa argumen yang return list Metric
+
+    Komponen tetap menyimpan counter-nya sendiri (lihat ``get_stats``);
+    collector hanya membaca counter itu saat endpoint / !metrics dibaca,
+    jadi tidak ada biaya tambahan per update selain counter tersebut.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._collectors = []
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def unregister(self, collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def collect(self):
+        """Semua metric dari semua collector (collector yang error dilewati)"""
+        metrics = [Metric("bot_uptime_seconds", "gauge", "Detik sejak proses start",
+                          [({}, time.time() - self.started_at)])]
+        for collector in list(self._collectors):
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                print(f"❌ Error collecting metrics: {e}")
+        return metrics
+
+    def render(self):
+        return render_prometheus(self.collect())
+
+
+# Registry default untuk proses ini
+registry = MetricsRegistry()
+
+
+class RateTracker:
+    """Laju counter (per detik) dalam jendela waktu terakhir, dihitung saat dibaca"""
+
+    def __init__(self, window=60.0, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.started = clock()
+        self._marks = {}
+
+    def rate(self, key, total):
+        now = self.clock()
+        # Pembacaan pertama: laju sejak tracker dibuat
+        marks = self._marks.setdefault(key, [(self.started, 0)])
+        marks.append((now, total))
+        # Simpan satu titik yang sudah lebih tua dari jendela sebagai patokan
+        while len(marks) > 2 and now - marks[1][0] >= self.window:
+            marks.pop(0)
+        since, base = marks[0]
+        elapsed = now - since
+        return (total - base) / elapsed if elapsed > 0 else 0.0
+
+
+class MeteredApplication(Application):
+    """Application yang mencatat jumlah, durasi dan error update per bot"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.updates_total = 0
+        self.update_errors = 0
+        self.update_latency = Histogram()
+
+    async def process_update(self, update):
+        start = time.perf_counter()
+        try:
+            await super().process_update(update)
+        finally:
+            self.updates_total += 1
+            self.update_latency.observe(time.perf_counter() - start)
+
+
+class MetricsServer:
+    """Endpoint HTTP lokal ``GET /metrics`` (format Prometheus) di atas simple_http"""
+
+    def __init__(self, host='127.0.0.1', port=9100, registry=registry):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+
+    async def handle(self, request):
+        if request.path != '/metrics':
+            return HttpResponse(404)
+        if request.method != 'GET':
+            return HttpResponse(405)
+        return HttpResponse(200, self.registry.render(), 'text/plain; version=0.0.4; charset=utf-8')
+
+    async def start(self):
+        self._server = await start_http_server(self.handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"📈 Metrics di http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Prioritas antrian (angka kecil dikirim lebih dulu)
+PRIORITY_OWNER = 0
+PRIORITY_NORMAL = 1
+
+
+def _retry_after_seconds(error):
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Antrian kirim bersama untuk semua bot dengan batas global dan per chat
+
+    Dipasang sebagai ``rate_limiter`` di setiap Application, jadi semua
+    request ke Bot API yang punya ``chat_id`` (sendMessage dkk.) lewat sini.
+    Request menunggu giliran di heap prioritas: balasan ke owner didahulukan,
+    lalu dikirim selama masih ada token global (~30/detik) dan chat tujuan
+    tidak sedang dalam jeda (1 pesan/detik untuk chat pribadi, lebih lambat
+    untuk grup). Jika Bot API membalas 429, ``retry_after`` dipatuhi untuk
+    seluruh bot tersebut (flood wait Telegram berlaku per bot, bukan per
+    chat): semua request bot itu ditahan sampai jeda selesai, bot lain
+    tetap jalan, lalu request dicoba lagi.
+
+    ``rate_limit_args`` per request: int (prioritas) atau dict
+    ``{'priority': ..., 'coalesce': True}``. Penggabungan hanya untuk request
+    yang memintanya (laporan command owner, lihat ``main_bot.reply_owner``):
+    sendMessage dengan payload yang sama persis (semua parameter, termasuk
+    reply dan thread) ke chat yang sama selagi yang pertama belum selesai
+    digabung menjadi satu request. Balasan biasa tidak pernah digabung, jadi pesan berulang tetap
+    terkirim semua.
+    """
+
+    # Batas jumlah chat yang jedanya dilacak sebelum entri kadaluarsa dibersihkan
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(self, global_rate=30, private_chat_interval=1.0, group_chat_interval=3.0,
+                 max_retries=3, priority_chat_ids=(), max_in_flight=None):
+        self.global_rate = global_rate
+        # Batas request kirim yang sedang berjalan (= koneksi pool yang boleh dipakai), None = tanpa batas
+        self.max_in_flight = max_in_flight
+        self.private_chat_interval = private_chat_interval
+        self.group_chat_interval = group_chat_interval
+        self.max_retries = max_retries
+        self.priority_chat_ids = set(priority_chat_ids)
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._chat_ready_at = {}
+        # Flood wait per bot (id objek bot -> waktu boleh kirim lagi)
+        self._bot_ready_at = {}
+        self._pending_sends = {}
+        self._in_flight = 0
+        self._tokens = float(global_rate)
+        self._last_refill = time.monotonic()
+        self._wakeup = None
+        self._dispatcher = None
+        self._users = 0
+
+        # Metrics
+        self.sent = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    async def initialize(self):
+        """Dipanggil oleh setiap bot; dispatcher dijalankan sekali"""
+        self._users += 1
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self):
+        """Dispatcher dihentikan saat bot terakhir shutdown"""
+        self._users = max(self._users - 1, 0)
+        if self._users == 0 and self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def _chat_interval(self, chat_id):
+        # ID chat grup/channel selalu negatif
+        if isinstance(chat_id, int) and chat_id < 0:
+            return self.group_chat_interval
+        if isinstance(chat_id, str) and chat_id.startswith(('-', '@')):
+            return self.group_chat_interval
+        return self.private_chat_interval
+
+    async def _dispatch_loop(self):
+        """Lepas request yang menunggu sesuai prioritas, token global dan jeda chat"""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._tokens = min(self.global_rate, self._tokens + (now - self._last_refill) * self.global_rate)
+            self._last_refill = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.global_rate)
+                continue
+            if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                # Pool penuh: burst ditahan sampai ada request yang selesai
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if len(self._chat_ready_at) > self.MAX_TRACKED_CHATS:
+                self._chat_ready_at = {
+                    chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items() if ready_at > now
+                }
+
+            # Cari request prioritas tertinggi yang chat-nya sudah boleh dikirimi
+            skipped = []
+            released = False
+            while self._queue:
+                entry = heapq.heappop(self._queue)
+                _, _, chat_id, bot_key, waiter = entry
+                if waiter.done():
+                    continue
+                if self._chat_ready_at.get(chat_id, 0) <= now and self._bot_ready_at.get(bot_key, 0) <= now:
+                    self._chat_ready_at[chat_id] = now + self._chat_interval(chat_id)
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    waiter.set_result(None)
+                    released = True
+                    break
+                skipped.append(entry)
+            for entry in skipped:
+                heapq.heappush(self._queue, entry)
+
+            if not released and self._queue:
+                # Semua chat/bot yang antri masih dalam jeda: tidur sampai yang paling cepat siap
+                next_ready = min(
+                    max(self._chat_ready_at.get(entry[2], 0), self._bot_ready_at.get(entry[3], 0))
+                    for entry in self._queue
+                )
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(next_ready - now, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _wait_turn(self, chat_id, bot_key, priority):
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), chat_id, bot_key, waiter))
+        self._wakeup.set()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Dibatalkan setelah dapat giliran: slot kirim dikembalikan
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        self._in_flight -= 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id') if data else None
+        if chat_id is None or self._dispatcher is None:
+            # getUpdates, getMe, setWebhook, dll. tidak dibatasi
+            return await callback(*args, **kwargs)
+
+        options = rate_limit_args if isinstance(rate_limit_args, dict) else {}
+        priority = options.get('priority', rate_limit_args if isinstance(rate_limit_args, int) else None)
+        if priority is None:
+            priority = PRIORITY_OWNER if chat_id in self.priority_chat_ids else PRIORITY_NORMAL
+
+        # Bot pengirim (callback adalah method _do_post milik bot)
+        bot_key = id(getattr(callback, '__self__', None))
+
+        # Gabungkan sendMessage identik yang masih antri (hanya jika diminta)
+        coalesce_key = None
+        if endpoint == 'sendMessage' and options.get('coalesce'):
+            coalesce_key = (bot_key, json.dumps(data, sort_keys=True, default=str))
+            pending = self._pending_sends.get(coalesce_key)
+            if pending is not None:
+                self.coalesced += 1
+                return await asyncio.shield(pending)
+            pending = asyncio.get_running_loop().create_future()
+            self._pending_sends[coalesce_key] = pending
+
+        start = time.monotonic()
+        try:
+            result = await self._send(callback, args, kwargs, chat_id, bot_key, priority)
+        except asyncio.CancelledError:
+            if coalesce_key is not None:
+                self._pending_sends.pop(coalesce_key, None)
+                pending.cancel()
+            raise
+        except Exception as e:
+            if coalesce_key is not None:
+                self._pending_sends.pop(coalesce_key, None)
+                pending.set_exception(e)
+                # Hindari warning "exception never retrieved" jika tidak ada yang menunggu
+                pending.exception()
+            raise
+
+        latency = time.monotonic() - start
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if coalesce_key is not None:
+            self._pending_sends.pop(coalesce_key, None)
+            pending.set_result(result)
+        return result
+
+    async def _send(self, callback, args, kwargs, chat_id, bot_key, priority):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id, bot_key, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                # Patuhi retry_after: bot ini (semua chat-nya) baru boleh kirim lagi setelah jeda
+                ready_at = time.monotonic() + _retry_after_seconds(e)
+                self._bot_ready_at[bot_key] = max(self._bot_ready_at.get(bot_key, 0), ready_at)
+                self._chat_ready_at[chat_id] = max(self._chat_ready_at.get(chat_id, 0), ready_at)
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+            finally:
+                self._release_slot()
+
+    def get_stats(self):
+        """Kedalaman antrian dan latency kirim (termasuk waktu antri)"""
+        return {
+            'queue_depth': len(self._queue),
+            'in_flight': self._in_flight,
+            'sent': self.sent,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'avg_latency_ms': (self.total_latency / self.sent * 1000) if self.sent else 0.0,
+            'max_latency_ms': self.max_latency * 1000
+        }
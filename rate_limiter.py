@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Rate limiter token bucket per user dengan tabel bucket berbatas (LRU)
+
+    ``budgets`` memetakan role ke ``(kapasitas, token_per_detik)``; role dengan
+    nilai ``None`` tidak dibatasi. Jika jumlah bucket melewati ``max_buckets``,
+    bucket yang paling lama tidak dipakai dibuang, jadi memory tetap walau
+    dibanjiri banyak user ID berbeda. User yang bucket-nya dibuang mulai lagi
+    dengan bucket penuh.
+    """
+
+    def __init__(self, budgets, max_buckets=100000, clock=time.monotonic):
+        self.budgets = budgets
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self.admitted = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    def allow(self, user_id, role):
+        """Ambil satu token untuk user; return False jika harus di-throttle"""
+        budget = self.budgets.get(role)
+        if budget is None:
+            self.admitted += 1
+            return True
+
+        capacity, refill_rate = budget
+        now = self.clock()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets[user_id] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.admitted += 1
+            return True
+
+        self.throttled += 1
+        return False
+
+    def get_stats(self):
+        """Counter admitted / throttled dan ukuran tabel bucket"""
+        return {
+            'admitted': self.admitted,
+            'throttled': self.throttled,
+            'buckets': len(self._buckets),
+            'evicted': self.evicted
+        }
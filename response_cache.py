@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+
+class ResponseCache:
+    """Cache teks balasan command: statis (render sekali) atau TTL (render ulang setelah kadaluarsa)
+
+    ``get(key, render, ttl)`` memanggil ``render()`` hanya jika entri belum
+    ada atau sudah kadaluarsa; ``ttl=None`` berarti entri tidak pernah
+    kadaluarsa (misal teks !menu). Entri yang bergantung pada data bisa
+    dibuang lebih cepat lewat ``invalidate`` (misal saat status premium
+    berubah). ``get_async`` sama, untuk render berupa coroutine (misal
+    query ke shard); hasil render yang dimulai sebelum ``invalidate`` tidak
+    disimpan karena bisa memuat data lama. Dipakai dari satu event loop,
+    jadi tanpa lock: ``invalidate`` dari thread lain (listener premium di
+    thread RPC shard) diteruskan ke event loop itu.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._entries = {}
+        # Naik setiap invalidate: render yang mulai di generasi lama tidak disimpan
+        self._generation = 0
+        self._loop = None
+        self._loop_thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render, ttl=None):
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+        value = render()
+        self._store(key, value, ttl)
+        return value
+
+    async def get_async(self, key, render, ttl=None):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+        generation = self._generation
+        value = await render()
+        if generation == self._generation:
+            self._store(key, value, ttl)
+        return value
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > self.clock():
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (None if ttl is None else self.clock() + ttl, value)
+
+    def invalidate(self, *keys):
+        """Buang entri tertentu (tanpa argumen: semua entri)"""
+        loop = self._loop
+        if loop is not None and threading.get_ident() != self._loop_thread:
+            try:
+                loop.call_soon_threadsafe(self._invalidate, keys)
+                return
+            except RuntimeError:
+                # Event loop sudah ditutup: tidak ada render yang bisa bentrok
+                pass
+        self._invalidate(keys)
+
+    def _invalidate(self, keys):
+        self._generation += 1
+        if not keys:
+            self._entries.clear()
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def get_stats(self):
+        """Jumlah entri, hit dan miss"""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses
+        }
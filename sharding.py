@@ -0,0 +1,579 @@
+import asyncio
+import heapq
+import json
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+from types import SimpleNamespace
+
+from config import (
+    USER_JSON, USER_STORAGE, USER_JOURNAL_COMPACT_THRESHOLD, USER_DB,
+    USER_WRITE_BEHIND, USER_FLUSH_INTERVAL, USER_FLUSH_THRESHOLD,
+    USER_MAX_FILE_SIZE, USER_MAX_USERS, USER_LOAD_WORKERS, USER_LOAD_BATCH_SIZE,
+    CREDIT_LEDGER, CREDIT_LEDGER_MAX_KEYS,
+    BOT_MODE, BOT_TOKENS, TOKEN_FILE, BOT_WORKERS, USER_SHARDS, USER_SHARD_START_TIMEOUT, PREMIUM_CACHE_TTL,
+    SHARD_RPC_THREADS, METRICS_PORT,
+)
+from credit_ledger import CreditLedger
+from storage import atomic_write_json, create_storage
+from user_manager import UserManager, validate_user_id, _pool_context
+
+# Env untuk proses bot worker: alamat shard user store dan authkey-nya
+SHARD_ADDRESSES_ENV = "USER_SHARD_ADDRESSES"
+SHARD_AUTHKEY_ENV = "USER_SHARD_AUTHKEY"
+
+
+def shard_filename(filename, shard_id):
+    """users.json -> users.shard0.json (file milik satu shard)"""
+    if shard_id is None:
+        return filename
+    root, ext = os.path.splitext(filename)
+    return f"{root}.shard{shard_id}{ext}"
+
+
+def shard_index(user_id, shards):
+    """Shard pemilik user (user_id sudah divalidasi, string angka)"""
+    return int(user_id) % shards
+
+
+def create_local_user_manager(shard_id=None):
+    """UserManager di proses ini sesuai config (shard_id: hanya file milik shard tersebut)"""
+    json_filename = shard_filename(USER_JSON, shard_id)
+    return UserManager(
+        json_filename,
+        write_behind=USER_WRITE_BEHIND,
+        flush_interval=USER_FLUSH_INTERVAL,
+        flush_threshold=USER_FLUSH_THRESHOLD,
+        storage=create_storage(
+            USER_STORAGE, json_filename,
+            compact_threshold=USER_JOURNAL_COMPACT_THRESHOLD,
+            db_filename=shard_filename(USER_DB, shard_id),
+            max_file_size=USER_MAX_FILE_SIZE,
+            max_users=USER_MAX_USERS,
+        ),
+        load_workers=USER_LOAD_WORKERS,
+        load_batch_size=USER_LOAD_BATCH_SIZE,
+        ledger=CreditLedger(shard_filename(CREDIT_LEDGER, shard_id), max_keys=CREDIT_LEDGER_MAX_KEYS),
+    )
+
+
+def create_user_manager():
+    """UserManager untuk main_bot: proxy ke shard jika dijalankan oleh supervisor"""
+    addresses = os.environ.get(SHARD_ADDRESSES_ENV)
+    if not addresses:
+        return create_local_user_manager()
+
+    parsed = []
+    for address in addresses.split(","):
+        host, port = address.rsplit(":", 1)
+        parsed.append((host, int(port)))
+    return ShardedUserManager.connect(parsed, bytes.fromhex(os.environ[SHARD_AUTHKEY_ENV]),
+                                      premium_ttl=PREMIUM_CACHE_TTL)
+
+
+class BackgroundUserManager:
+    """User store yang dimuat di thread background saat start (warm-up)
+
+    Bot bisa mulai polling selagi users.json dimuat. Handler pertama di
+    pipeline menunggu ``wait_ready_async`` sehingga update yang datang
+    selama warm-up ditahan, bukan diproses tanpa data user. Atribut lain
+    diteruskan ke UserManager asli dan menunggu sampai load selesai.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._manager = None
+        self._error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._waiters = []
+        self.load_seconds = None
+        self._thread = threading.Thread(target=self._load, name="user-store-warmup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            manager = self._factory()
+        except Exception as e:
+            print(f"❌ User store gagal dimuat: {e}")
+            self._error = e
+            manager = None
+        with self._lock:
+            if manager is not None:
+                for listener in self._listeners:
+                    manager.add_premium_listener(listener)
+            self._manager = manager
+            self.load_seconds = time.perf_counter() - start
+            self._ready.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    @property
+    def ready(self):
+        """True jika load sudah selesai (berhasil atau gagal)"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        """Tunggu (blocking) sampai load selesai; return UserManager asli"""
+        if self._manager is None:
+            self._ready.wait(timeout)
+            if self._manager is None:
+                raise RuntimeError(f"User store tidak tersedia: {self._error or 'masih dimuat'}")
+        return self._manager
+
+    async def wait_ready_async(self):
+        """Tunggu load selesai tanpa memblokir event loop"""
+        if not self._ready.is_set():
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                if self._ready.is_set():
+                    future.set_result(None)
+                else:
+                    self._waiters.append((loop, future))
+            await future
+        return self.wait_ready()
+
+    def add_premium_listener(self, listener):
+        """Listener didaftarkan ke UserManager asli setelah load selesai"""
+        with self._lock:
+            if self._manager is None:
+                self._listeners.append(listener)
+                return
+        self._manager.add_premium_listener(listener)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.wait_ready(), name)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ShardClient(BaseManager):
+    """Koneksi ke proses shard (UserManager di-host lewat multiprocessing.managers)"""
+
+
+ShardClient.register('user_manager')
+
+
+class ShardServer(BaseManager):
+    """Server di proses shard yang meng-host satu UserManager"""
+
+
+class ShardedUserManager:
+    """UserManager yang datanya dipecah ke beberapa shard berdasarkan hash user ID
+
+    Operasi per user (add/update, premium, credits, stats) diteruskan ke
+    shard pemiliknya saja. Operasi global untuk owner (total user, top
+    users, daftar premium) ditanyakan ke semua shard lalu digabung, jadi
+    hasilnya sama seperti satu UserManager. Shard bisa berupa UserManager
+    lokal atau proxy ke proses shard.
+
+    Setiap method yang menyentuh shard proxy adalah RPC blocking; handler
+    async menjalankannya di ``rpc_executor`` (lihat ``main_bot.call_store``)
+    supaya event loop tidak berhenti selama RPC atau saat shard macet.
+
+    Cek premium (dipanggil setiap update untuk role) dan statistik storage
+    dilayani dari salinan lokal yang diambil ulang thread background tiap
+    ``premium_ttl`` detik, jadi tidak pernah RPC di event loop. set_premium
+    lewat proses ini langsung memperbarui salinan itu (dan diterapkan ulang
+    pada hasil refresh yang sedang berjalan, supaya tidak tertimpa snapshot
+    lama); perubahan dari worker lain terlihat paling lambat setelah
+    ``premium_ttl``. Listener premium dipanggil di thread pemanggil
+    set_premium (biasanya thread ``rpc_executor``).
+    """
+
+    def __init__(self, shards, premium_ttl=5.0, rpc_threads=SHARD_RPC_THREADS):
+        self.shards = list(shards)
+        self.premium_ttl = premium_ttl
+        self.rpc_executor = ThreadPoolExecutor(max_workers=rpc_threads, thread_name_prefix="shard-rpc")
+        self._premium_listeners = []
+        # Lock untuk update lokal set premium dan pergantian hasil refresh
+        self._premium_lock = threading.Lock()
+        # set_premium lokal sejak refresh terakhir mulai mengambil data shard
+        self._premium_changes = {}
+        self._closed = threading.Event()
+        self._refresh()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="shard-refresh", daemon=True)
+        self._refresher.start()
+
+    @classmethod
+    def connect(cls, addresses, authkey, premium_ttl=5.0, rpc_threads=SHARD_RPC_THREADS):
+        """Sambungkan ke proses shard yang sudah berjalan"""
+        shards = []
+        for address in addresses:
+            client = ShardClient(address=address, authkey=authkey)
+            client.connect()
+            shards.append(client.user_manager())
+        return cls(shards, premium_ttl=premium_ttl, rpc_threads=rpc_threads)
+
+    def shard_for(self, user_id):
+        """Shard pemilik user; None jika user_id tidak valid"""
+        user_id = validate_user_id(user_id)
+        if not user_id:
+            return None
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    def add_or_update_user(self, telegram_user, message_text=None):
+        shard = self.shard_for(telegram_user.id)
+        if shard is None:
+            print(f"❌ Invalid user ID: {telegram_user.id}")
+            return None
+        # Kirim field yang dipakai saja (objek telegram.User berat untuk di-pickle)
+        user = SimpleNamespace(
+            id=telegram_user.id,
+            first_name=telegram_user.first_name,
+            username=telegram_user.username,
+            language_code=telegram_user.language_code,
+        )
+        return shard.add_or_update_user(user, message_text)
+
+    def set_premium(self, user_id, premium_status=True):
+        shard = self.shard_for(user_id)
+        if shard is None or not shard.set_premium(user_id, premium_status):
+            return False
+        user_id = int(validate_user_id(user_id))
+        with self._premium_lock:
+            self._apply_premium(self._premium_ids, user_id, premium_status)
+            self._premium_changes[user_id] = premium_status
+        for listener in self._premium_listeners:
+            listener(user_id, bool(premium_status))
+        return True
+
+    def add_premium_listener(self, listener):
+        """Listener dipanggil untuk set_premium yang lewat proses ini"""
+        self._premium_listeners.append(listener)
+
+    def get_premium_ids(self):
+        """ID semua user premium (dari salinan lokal)"""
+        return list(self._premium_ids)
+
+    def get_premium_count(self):
+        """Jumlah user premium (dari salinan lokal)"""
+        return len(self._premium_ids)
+
+    @staticmethod
+    def _apply_premium(premium_ids, user_id, premium_status):
+        if premium_status:
+            premium_ids.add(user_id)
+        else:
+            premium_ids.discard(user_id)
+
+    def _refresh(self):
+        """Ambil set premium dan statistik storage dari semua shard"""
+        with self._premium_lock:
+            self._premium_changes = {}
+        premium_ids = set()
+        stats = None
+        for shard in self.shards:
+            premium_ids.update(shard.get_premium_ids())
+            shard_stats = shard.get_storage_stats()
+            if stats is None:
+                stats = shard_stats
+                continue
+            stats['save_latency'].merge(shard_stats['save_latency'])
+            for key in ('bytes_written', 'dirty_users', 'pending_credits', 'users'):
+                stats[key] += shard_stats[key]
+        # set_premium selama pengambilan mungkin belum ada di snapshot shard: terapkan ulang
+        with self._premium_lock:
+            for user_id, premium_status in self._premium_changes.items():
+                self._apply_premium(premium_ids, user_id, premium_status)
+            # Ganti referensi sekaligus: pembaca di event loop tidak perlu lock
+            self._premium_ids = premium_ids
+        self._storage_stats = stats
+
+    def _refresh_loop(self):
+        while not self._closed.wait(self.premium_ttl):
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"⚠️ Gagal refresh data shard: {e}")
+
+    def is_premium(self, user_id):
+        # Fast path: ID dari Telegram selalu int
+        if type(user_id) is not int:
+            user_id = validate_user_id(user_id)
+            if not user_id:
+                return False
+            user_id = int(user_id)
+        return user_id in self._premium_ids
+
+    def add_credits(self, user_id, amount, idempotency_key=None):
+        shard = self.shard_for(user_id)
+        return shard.add_credits(user_id, amount, idempotency_key) if shard is not None else None
+
+    def deduct_credits(self, user_id, amount, idempotency_key=None):
+        shard = self.shard_for(user_id)
+        return shard.deduct_credits(user_id, amount, idempotency_key) if shard is not None else None
+
+    def get_user_stats(self, user_id):
+        shard = self.shard_for(user_id)
+        return shard.get_user_stats(user_id) if shard is not None else None
+
+    def get_total_users(self):
+        """Total user dari semua shard"""
+        return sum(shard.get_total_users() for shard in self.shards)
+
+    def get_premium_users(self):
+        """User premium dari semua shard"""
+        premium_users = []
+        for shard in self.shards:
+            premium_users.extend(shard.get_premium_users())
+        return premium_users
+
+    def get_top_users(self, limit=10):
+        """Gabungkan top-N tiap shard menjadi top-N global"""
+        candidates = []
+        for shard in self.shards:
+            candidates.extend(shard.get_top_users(limit))
+        return heapq.nlargest(limit, candidates, key=lambda user: user['total_messages'])
+
+    def get_all_users(self):
+        """Semua data user dari semua shard (format users.json)"""
+        users = {}
+        for shard in self.shards:
+            users.update(shard.get_all_users())
+        return users
+
+    def get_storage_stats(self):
+        """Statistik penyimpanan semua shard digabung (dari refresh terakhir)"""
+        return self._storage_stats
+
+    def flush(self):
+        """Flush semua shard"""
+        return all([shard.flush() for shard in self.shards])
+
+    def close(self):
+        """Shard dimiliki proses shard (ditutup supervisor): hentikan thread di sini lalu flush"""
+        self._closed.set()
+        self.rpc_executor.shutdown(wait=True)
+        self.flush()
+
+
+def split_user_store(shards, batch_size=USER_LOAD_BATCH_SIZE):
+    """Pecah user store dan ledger lama ke file per shard (sekali, saat shard belum ada)"""
+    shard_map = f"{os.path.splitext(USER_JSON)[0]}.shards.json"
+    if os.path.exists(shard_map):
+        with open(shard_map, 'r') as f:
+            current = json.load(f)['shards']
+        if current != shards:
+            # User sudah tersebar dengan modulo lama, tidak bisa langsung dipakai
+            raise RuntimeError(f"Jumlah shard berubah ({current} -> {shards}), kembalikan USER_SHARDS = {current}")
+        return False
+
+    source = create_storage(
+        USER_STORAGE, USER_JSON,
+        compact_threshold=USER_JOURNAL_COMPACT_THRESHOLD,
+        db_filename=USER_DB,
+        max_file_size=None,
+    )
+    try:
+        # Data mentah (sanitize dilakukan shard saat load)
+        users = [{} for _ in range(shards)]
+        for batch in source.iter_load(batch_size):
+            for user_id, data in batch:
+                user_id = validate_user_id(user_id)
+                if user_id:
+                    users[shard_index(user_id, shards)][user_id] = data
+    finally:
+        source.close()
+
+    ledgers = [CreditLedger(shard_filename(CREDIT_LEDGER, shard_id), max_keys=CREDIT_LEDGER_MAX_KEYS)
+               for shard_id in range(shards)]
+    if os.path.exists(CREDIT_LEDGER):
+        # Saldo terakhir dibawa sebagai transaksi pembuka di ledger shard
+        for user_id, balance in CreditLedger(CREDIT_LEDGER, max_keys=0).balances.items():
+            if balance:
+                ledgers[shard_index(user_id, shards)].apply(user_id, balance, f"opening:{user_id}")
+
+    total = 0
+    for shard_id in range(shards):
+        if users[shard_id]:
+            atomic_write_json(shard_filename(USER_JSON, shard_id), users[shard_id])
+        ledgers[shard_id].commit()
+        total += len(users[shard_id])
+    atomic_write_json(shard_map, {'shards': shards})
+    if total:
+        print(f"🔀 {total} user dipecah ke {shards} shard (file lama tetap disimpan)")
+    return True
+
+
+def run_shard(shard_id, authkey, conn):
+    """Proses shard: host UserManager untuk user_id % shards == shard_id"""
+    # Ctrl+C ditangani supervisor; shard berhenti setelah semua worker berhenti (SIGTERM)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    user_manager = create_local_user_manager(shard_id)
+    ShardServer.register('user_manager', callable=lambda: user_manager)
+    server = ShardServer(address=('127.0.0.1', 0), authkey=authkey).get_server()
+    conn.send(server.address)
+    conn.close()
+    try:
+        server.serve_forever()
+    finally:
+        user_manager.close()
+
+
+def run_worker(worker_id, tokens, mode, addresses, authkey):
+    """Proses bot worker: BotManager biasa dengan user store di shard"""
+    # Handler sinyal supervisor ikut ter-fork; worker memakai handler BotManager sendiri
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ[SHARD_ADDRESSES_ENV] = ",".join(f"{host}:{port}" for host, port in addresses)
+    os.environ[SHARD_AUTHKEY_ENV] = authkey.hex()
+
+    # Import di sini: main_bot membuat user_manager saat import, setelah env di atas diisi
+    from index_bot import BotManager
+
+    print(f"👷 Worker {worker_id}: {len(tokens)} bot")
+    # Endpoint metrics per worker di port berurutan
+    manager = BotManager(mode=mode, metrics_port=METRICS_PORT + worker_id if METRICS_PORT else 0)
+    manager.setup_bots(tokens)
+    try:
+        asyncio.run(manager.start_all())
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """Jalankan bot di beberapa proses worker dengan user store yang di-shard
+
+    Token dibagi rata (round-robin) ke ``workers`` proses BotManager, jadi
+    setiap worker punya GIL dan event loop sendiri. Data user dipecah ke
+    ``shards`` proses berdasarkan ``user_id % shards``; setiap shard memiliki
+    file users/ledger sendiri. Saat berhenti, worker dihentikan lebih dulu
+    (sisa update diproses), baru shard di-flush dan ditutup.
+    """
+
+    def __init__(self, tokens, workers=2, shards=2, mode="polling", start_timeout=USER_SHARD_START_TIMEOUT):
+        if not tokens:
+            raise ValueError("Tidak ada token untuk dijalankan")
+        if mode != "polling":
+            # Worker webhook butuh port/URL sendiri per proses
+            raise ValueError("Supervisor hanya mendukung mode polling")
+        self.tokens = list(tokens)
+        self.workers = max(1, min(workers, len(self.tokens)))
+        self.shards = max(1, shards)
+        self.mode = mode
+        self.start_timeout = start_timeout
+        self.authkey = secrets.token_bytes(32)
+        self.context = _pool_context()
+        self.shard_processes = []
+        self.worker_processes = []
+        self.addresses = []
+
+    def start_shards(self):
+        """Mulai semua proses shard dan tunggu sampai data user selesai dimuat"""
+        split_user_store(self.shards)
+        pipes = []
+        for shard_id in range(self.shards):
+            receiver, sender = self.context.Pipe(duplex=False)
+            process = self.context.Process(
+                target=run_shard, args=(shard_id, self.authkey, sender), name=f"UserShard-{shard_id}"
+            )
+            process.start()
+            sender.close()
+            self.shard_processes.append(process)
+            pipes.append(receiver)
+
+        deadline = time.monotonic() + self.start_timeout
+        for shard_id, (process, receiver) in enumerate(zip(self.shard_processes, pipes)):
+            while not receiver.poll(0.5):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    raise RuntimeError(f"Shard {shard_id} gagal dimulai")
+            self.addresses.append(receiver.recv())
+            receiver.close()
+        print(f"🗂️ {self.shards} shard user siap")
+
+    def start_workers(self):
+        """Bagi token ke worker lalu mulai proses BotManager"""
+        for worker_id in range(self.workers):
+            tokens = self.tokens[worker_id::self.workers]
+            process = self.context.Process(
+                target=run_worker, args=(worker_id, tokens, self.mode, self.addresses, self.authkey),
+                name=f"BotWorker-{worker_id}"
+            )
+            process.start()
+            self.worker_processes.append(process)
+        print(f"👷 {self.workers} worker menjalankan {len(self.tokens)} bot")
+
+    def _stop_processes(self, processes, timeout):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                print(f"⚠️ {process.name} tidak berhenti, dipaksa kill")
+                process.kill()
+                process.join()
+
+    def stop(self, timeout=30):
+        """Hentikan worker dulu (drain), lalu shard (flush terakhir)"""
+        print("🛑 Menghentikan worker...")
+        self._stop_processes(self.worker_processes, timeout)
+        self.worker_processes = []
+        print("🛑 Menghentikan shard...")
+        self._stop_processes(self.shard_processes, timeout)
+        self.shard_processes = []
+
+    def run(self):
+        """Mulai shard dan worker lalu tunggu sampai Ctrl+C / SIGTERM atau worker mati"""
+        stop_requested = False
+
+        def request_stop(*args):
+            nonlocal stop_requested
+            stop_requested = True
+
+        previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start_shards()
+            self.start_workers()
+            while not stop_requested:
+                if any(not process.is_alive() for process in self.worker_processes + self.shard_processes):
+                    print("❌ Ada proses worker/shard yang berhenti, semua dihentikan")
+                    break
+                time.sleep(0.5)
+        finally:
+            self.stop()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+
+def main():
+    """Jalankan bot dari BOT_TOKENS / token.json lewat supervisor multi-proses"""
+    tokens = BOT_TOKENS
+    if not tokens:
+        try:
+            with open(TOKEN_FILE, 'r') as f:
+                tokens = json.load(f)
+        except FileNotFoundError:
+            tokens = []
+    if not tokens:
+        print("❌ Tidak ada bot yang bisa dijalankan! Tambahkan token lewat index_bot.py")
+        return
+
+    print("🤖 Multi-Bot Supervisor")
+    print(f"📶 Mode: {BOT_MODE}, worker: {BOT_WORKERS}, shard user: {USER_SHARDS}")
+    Supervisor(tokens, workers=BOT_WORKERS, shards=USER_SHARDS, mode=BOT_MODE).run()
+    print("👋 Semua bot berhenti")
+
+
+if __name__ == "__main__":
+    main()
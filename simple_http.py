@@ -0,0 +1,168 @@
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+# Detik koneksi keep-alive boleh diam sebelum ditutup server
+KEEPALIVE_TIMEOUT = 75
+
+
+class HttpRequest:
+    """Request HTTP yang sudah di-parse"""
+
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        """Body sebagai JSON (form-urlencoded juga diterima, seperti Bot API)"""
+        content_type = self.headers.get('content-type', '')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return {key: values[-1] for key, values in parse_qs(self.body.decode('utf-8')).items()}
+        if not self.body:
+            return dict(self.query)
+        return json.loads(self.body)
+
+
+class HttpResponse:
+    """Response HTTP sederhana"""
+
+    def __init__(self, status=200, body=b'', content_type='text/plain; charset=utf-8', headers=None):
+        self.status = status
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status=200, headers=None):
+        return cls(status, json.dumps(data, ensure_ascii=False), 'application/json', headers)
+
+
+async def _read_request(reader, max_body_size, idle_timeout=None):
+    """Baca satu request HTTP/1.1; return None jika koneksi ditutup atau diam lebih dari ``idle_timeout``"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), idle_timeout)
+    except asyncio.TimeoutError:
+        return None
+    if not request_line:
+        return None
+
+    try:
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise ValueError("Invalid request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    if length > max_body_size:
+        raise OverflowError("Body too large")
+    body = await reader.readexactly(length) if length else b''
+    return HttpRequest(method.upper(), target, headers, body)
+
+
+def _write_response(writer, response, keep_alive):
+    head = [
+        f"HTTP/1.1 {response.status} {STATUS_TEXT.get(response.status, 'Unknown')}",
+        f"Content-Type: {response.content_type}",
+        f"Content-Length: {len(response.body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    head.extend(f"{name}: {value}" for name, value in response.headers.items())
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + response.body)
+
+
+class HttpServer:
+    """``asyncio.Server`` beserta koneksi keep-alive yang sedang menunggu request
+
+    ``close()`` juga menutup koneksi yang sedang diam; koneksi yang sedang
+    memproses request ditutup setelah response-nya terkirim. Tanpa ini
+    ``wait_closed()`` di Python 3.12+ menunggu klien keep-alive (Telegram,
+    scraper Prometheus) selamanya.
+    """
+
+    def __init__(self):
+        self.server = None
+        self.closing = False
+        self._idle = set()
+
+    @property
+    def sockets(self):
+        return self.server.sockets
+
+    def close(self):
+        self.closing = True
+        self.server.close()
+        for writer in list(self._idle):
+            writer.close()
+
+    async def wait_closed(self):
+        await self.server.wait_closed()
+
+
+async def start_http_server(handler, host='127.0.0.1', port=8080, max_body_size=1024 * 1024,
+                            idle_timeout=KEEPALIVE_TIMEOUT):
+    """Jalankan server HTTP/1.1 (keep-alive) di event loop yang sedang berjalan
+
+    ``handler`` adalah coroutine ``handler(HttpRequest) -> HttpResponse``.
+    Return ``HttpServer`` (``sockets``, ``close()``, ``wait_closed()``).
+    """
+    http_server = HttpServer()
+
+    async def on_connection(reader, writer):
+        try:
+            while not http_server.closing:
+                # Koneksi yang menunggu request berikutnya boleh ditutup saat stop
+                http_server._idle.add(writer)
+                try:
+                    request = await _read_request(reader, max_body_size, idle_timeout)
+                except OverflowError:
+                    _write_response(writer, HttpResponse(413), keep_alive=False)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    _write_response(writer, HttpResponse(400), keep_alive=False)
+                    break
+                finally:
+                    http_server._idle.discard(writer)
+                if request is None:
+                    break
+
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    response = HttpResponse(500, f"Internal error: {e}")
+
+                keep_alive = request.headers.get('connection', '').lower() != 'close' and not http_server.closing
+                _write_response(writer, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Koneksi putus atau server dimatikan saat koneksi keep-alive masih terbuka
+            pass
+        finally:
+            writer.close()
+
+    http_server.server = await asyncio.start_server(on_connection, host, port)
+    return http_server
@@ -0,0 +1,653 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+# Kolom data user, urutan sama dengan format users.json
+USER_FIELDS = (
+    'id', 'first_name', 'username', 'language_code',
+    'first_seen', 'last_seen', 'message_count',
+    'total_messages', 'last_message', 'premium',
+    'premium_since', 'credits'
+)
+
+
+def atomic_write_json(filename, data):
+    """Tulis JSON ke file sementara lalu rename, file lama tetap utuh jika crash
+
+    Return jumlah byte yang ditulis.
+    """
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+    os.replace(tmp_filename, filename)
+    return size
+
+
+# Token di level atas dokumen users.json
+_OBJECT_START = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*(\})?')
+_ENTRY_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*')
+_ENTRY_END = re.compile(r'[ \t\n\r]*([,}])')
+
+
+def iter_json_object(f, chunk_size=1024 * 1024, max_entry_size=16 * 1024 * 1024):
+    """Parse dokumen ``{key: value, ...}`` secara bertahap, yield (key, value)
+
+    File dibaca per chunk dan tiap entry di-decode dengan ``raw_decode``, jadi
+    memory yang dipakai sebanding dengan satu chunk, bukan seluruh file. Jika
+    satu entry terpotong di ujung chunk, chunk berikutnya dibaca lalu entry
+    tersebut di-parse ulang. Entry lebih besar dari ``max_entry_size`` dianggap corrupt.
+    """
+    raw_decode = json.JSONDecoder().raw_decode
+    buffer = f.read(chunk_size)
+    pos = 0
+    eof = not buffer
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        if eof or len(buffer) - pos > max_entry_size:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        match = _OBJECT_START.match(buffer)
+        if match is not None and match.end() < len(buffer):
+            break
+        if not read_more():
+            if match is None:
+                raise json.JSONDecodeError("Expecting '{'", buffer, 0)
+            break
+    if match.group(1):
+        return
+    pos = match.end()
+
+    while True:
+        key_match = _ENTRY_KEY.match(buffer, pos)
+        if key_match is not None:
+            try:
+                value, end = raw_decode(buffer, key_match.end())
+            except json.JSONDecodeError:
+                end = len(buffer)
+            # Butuh satu karakter setelah value untuk memastikan value sudah lengkap
+            end_match = _ENTRY_END.match(buffer, end) if end < len(buffer) else None
+            if end_match is not None:
+                key = key_match.group(1)
+                if '\\' in key:
+                    key = json.loads(f'"{key}"')
+                pos = end_match.end()
+                yield key, value
+                if end_match.group(1) == '}':
+                    return
+                continue
+
+        if not read_more():
+            raise json.JSONDecodeError("Invalid entry", buffer, pos)
+
+
+# Batas antar entry level atas: }, "<user_id>": {  (tidak mungkin ada di dalam string JSON)
+_ENTRY_BOUNDARY = re.compile(r'\}[ \t\n\r]*,[ \t\n\r]*(?="\d+"[ \t\n\r]*:[ \t\n\r]*\{)')
+
+
+def _last_entry_boundary(buffer):
+    """Return (akhir fragmen, awal entry berikutnya) untuk batas entry terakhir di buffer"""
+    pos = len(buffer)
+    while True:
+        pos = buffer.rfind('}', 0, pos)
+        if pos < 0:
+            return None
+        match = _ENTRY_BOUNDARY.match(buffer, pos)
+        if match is not None:
+            return pos + 1, match.end()
+
+
+def iter_json_object_fragments(f, chunk_size=4 * 1024 * 1024):
+    """Potong dokumen ``{"<user_id>": {...}, ...}`` menjadi fragmen teks berisi entry utuh
+
+    Tiap fragmen bisa di-parse sendiri dengan ``json.loads('{' + fragmen + '}')``,
+    jadi parsing bisa dibagi ke beberapa proses. Di sini teks hanya dipotong,
+    tidak di-parse.
+    """
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('{'):
+        raise json.JSONDecodeError("Expecting '{'", buffer, 0)
+    buffer = buffer[1:]
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        boundary = _last_entry_boundary(buffer)
+        if boundary is not None:
+            fragment_end, next_start = boundary
+            yield buffer[:fragment_end]
+            buffer = buffer[next_start:]
+
+    buffer = buffer.rstrip()
+    if not buffer.endswith('}'):
+        raise json.JSONDecodeError("Expecting '}'", buffer, len(buffer))
+    buffer = buffer[:-1]
+    if buffer.strip():
+        yield buffer
+
+
+def iter_json_object_chunks(f, chunk_size=4 * 1024 * 1024):
+    """Parse dokumen ``{"<user_id>": {...}, ...}`` per fragmen, yield (key, value)
+
+    Tiap fragmen dari ``iter_json_object_fragments`` (beberapa MiB) di-parse
+    sekali dengan ``json.loads``, jauh lebih cepat dari ``raw_decode`` per
+    entry. Jika dokumen rusak, file dibaca ulang dengan ``iter_json_object``
+    supaya entry sebelum titik rusak tetap didapat.
+    """
+    yielded = 0
+    try:
+        for fragment in iter_json_object_fragments(f, chunk_size):
+            data = json.loads('{' + fragment + '}')
+            for item in data.items():
+                yielded += 1
+                yield item
+    except json.JSONDecodeError:
+        f.seek(0)
+        for index, item in enumerate(iter_json_object(f)):
+            if index >= yielded:
+                yield item
+        raise
+
+
+def iter_batches(pairs, batch_size):
+    """Kelompokkan iterator (user_id, data) menjadi list berukuran batch_size"""
+    batch = []
+    try:
+        for pair in pairs:
+            batch.append(pair)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # Entry sebelum titik rusak tetap dikirim
+        if batch:
+            yield batch
+        raise
+    if batch:
+        yield batch
+
+
+def backup_corrupted_file(filename):
+    """Backup file yang corrupt"""
+    try:
+        if os.path.exists(filename):
+            backup_name = f"{filename}.corrupted.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.rename(filename, backup_name)
+            print(f"📦 File corrupt dibackup sebagai: {backup_name}")
+    except Exception as e:
+        print(f"❌ Gagal backup file corrupt: {e}")
+
+
+class JsonStorage:
+    """Backend penyimpanan: seluruh user dalam satu dokumen users.json"""
+
+    # Batas default ukuran file saat load (prevent memory exhaustion), None = tanpa batas
+    MAX_FILE_SIZE = 512 * 1024 * 1024
+    # Limit default jumlah users saat save
+    MAX_USERS = 1000000
+    # Backend ini tidak punya query terindeks, UserManager scan di memory
+    supports_queries = False
+    # Snapshot bisa dipotong per fragmen untuk di-parse paralel
+    supports_fragments = True
+
+    def __init__(self, filename, max_file_size=MAX_FILE_SIZE, max_users=MAX_USERS):
+        self.filename = filename
+        self.max_file_size = max_file_size
+        self.max_users = max_users
+        # Total byte yang ditulis ke disk (untuk metrics)
+        self.bytes_written = 0
+
+    def _snapshot_readable(self):
+        """Cek file snapshot ada dan tidak melewati batas ukuran"""
+        if not os.path.exists(self.filename):
+            return False
+
+        if self.max_file_size and os.path.getsize(self.filename) > self.max_file_size:
+            print(f"❌ File terlalu besar! (batas {self.max_file_size:,} byte)")
+            return False
+        return True
+
+    def _iter_snapshot(self, batch_size):
+        """Baca users.json mentah (tanpa sanitize) per batch secara streaming"""
+        if not self._snapshot_readable():
+            return
+
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            yield from iter_batches(iter_json_object_chunks(f), batch_size)
+
+    def iter_fragments(self, chunk_size=4 * 1024 * 1024):
+        """Fragmen teks snapshot berisi entry utuh (untuk di-parse di process pool)"""
+        if not self._snapshot_readable():
+            return
+
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            yield from iter_json_object_fragments(f, chunk_size)
+
+    def load_changes(self):
+        """Perubahan yang belum masuk snapshot (tidak ada untuk users.json penuh)"""
+        return {}
+
+    def iter_load(self, batch_size=10000):
+        """Load data mentah user per batch list (user_id, data)
+
+        Jika file ternyata corrupt di tengah jalan, user sebelum titik rusak
+        tetap dipakai dan file asli dibackup.
+        """
+        try:
+            yield from self._iter_snapshot(batch_size)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"❌ Error loading users (corrupted file): {e}")
+            self.backup_corrupted()
+
+    def load(self):
+        """Load data mentah semua user"""
+        users = {}
+        for batch in self.iter_load():
+            users.update(batch)
+        return users
+
+    def backup_corrupted(self):
+        """Backup file snapshot yang corrupt"""
+        backup_corrupted_file(self.filename)
+
+    def record(self, op, user_id, fields, delta=None):
+        """Catat mutasi user (tidak perlu, snapshot selalu ditulis penuh)"""
+
+    def commit(self):
+        """Persist mutasi yang tercatat"""
+        return True
+
+    def needs_snapshot(self):
+        """Dokumen JSON selalu ditulis ulang penuh"""
+        return True
+
+    def write_snapshot(self, users):
+        """Tulis semua user ke users.json secara atomic"""
+        if self.max_users and len(users) > self.max_users:
+            print("❌ Too many users!")
+            return False
+
+        self.bytes_written += atomic_write_json(self.filename, users)
+        return True
+
+    def close(self):
+        """Tidak ada resource yang perlu ditutup"""
+
+
+class JournalStorage(JsonStorage):
+    """Backend penyimpanan: snapshot users.json + journal append-only per mutasi
+
+    Setiap mutasi ditulis sebagai satu baris JSON kecil di file journal, jadi
+    biaya simpan sebanding dengan perubahan, bukan jumlah user. Saat journal
+    sudah panjang, snapshot ditulis ulang dan journal dikosongkan. Saat start,
+    snapshot dibaca lalu journal di-replay di atasnya.
+    """
+
+    def __init__(self, filename, compact_threshold=10000, max_file_size=JsonStorage.MAX_FILE_SIZE):
+        super().__init__(filename, max_file_size=max_file_size)
+        self.journal_filename = f"{filename}.journal"
+        self.compact_threshold = compact_threshold
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._journal_records = 0
+
+    def iter_load(self, batch_size=10000):
+        """Stream snapshot per batch dengan perubahan dari journal sudah diterapkan
+
+        Journal (dibatasi compact_threshold) di-replay dulu ke dict kecil berisi
+        field terbaru per user, lalu digabung ke tiap user saat snapshot dibaca.
+        User yang hanya ada di journal dikirim di batch terakhir.
+        """
+        changes = self.load_changes()
+
+        # Snapshot rusak: backup (di super), lalu pulihkan sebanyak mungkin dari journal
+        for batch in super().iter_load(batch_size):
+            for user_id, data in batch:
+                fields = changes.pop(user_id, None)
+                if fields is not None and isinstance(data, dict):
+                    data.update(fields)
+            yield batch
+
+        yield from iter_batches(changes.items(), batch_size)
+
+    def load_changes(self):
+        """Replay journal menjadi dict {user_id: field terbaru}"""
+        changes = {}
+        self._journal_records = self._replay_journal(changes)
+        return changes
+
+    def _replay_journal(self, users):
+        """Terapkan record journal ke dict users, return jumlah record valid"""
+        if not os.path.exists(self.journal_filename):
+            return 0
+
+        replayed = 0
+        valid_size = 0
+        with open(self.journal_filename, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.endswith(b'\n'):
+                    # Baris terakhir terpotong karena crash saat menulis
+                    print(f"⚠️ Journal baris {line_number} terpotong, dibuang")
+                    break
+                valid_size += len(line)
+                try:
+                    entry = json.loads(line)
+                    user_id = entry['u']
+                    fields = entry['f']
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                    print(f"⚠️ Journal baris {line_number} rusak, dilewati")
+                    continue
+
+                if not isinstance(fields, dict):
+                    continue
+                user = users.setdefault(str(user_id), {})
+                if isinstance(user, dict):
+                    user.update(fields)
+                replayed += 1
+
+        # Buang ekor yang terpotong supaya append berikutnya mulai di baris baru
+        if os.path.getsize(self.journal_filename) > valid_size:
+            with open(self.journal_filename, 'r+b') as f:
+                f.truncate(valid_size)
+
+        if replayed:
+            print(f"📜 {replayed} mutasi di-replay dari journal")
+        return replayed
+
+    def record(self, op, user_id, fields, delta=None):
+        """Catat mutasi (nilai absolut field yang berubah) ke buffer journal
+
+        ``delta`` (misal perubahan credits) ikut dicatat untuk audit, tapi
+        replay hanya memakai nilai absolut di ``fields``.
+        """
+        entry = {'o': op, 'u': user_id, 'f': fields}
+        if delta is not None:
+            entry['d'] = delta
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        with self._pending_lock:
+            self._pending.append(line)
+
+    def commit(self):
+        """Append semua mutasi di buffer ke journal dalam satu write + fsync"""
+        with self._pending_lock:
+            if not self._pending:
+                return True
+            pending = self._pending
+            self._pending = []
+
+        data = ('\n'.join(pending) + '\n').encode('utf-8')
+        try:
+            with open(self.journal_filename, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"❌ Error writing journal: {e}")
+            # Kembalikan ke buffer supaya dicoba lagi di flush berikutnya
+            with self._pending_lock:
+                self._pending = pending + self._pending
+            return False
+
+        self._journal_records += len(pending)
+        self.bytes_written += len(data)
+        return True
+
+    def needs_snapshot(self):
+        """Compact journal ke snapshot jika sudah melewati threshold"""
+        return self._journal_records >= self.compact_threshold
+
+    def write_snapshot(self, users):
+        """Tulis snapshot baru lalu kosongkan journal
+
+        Record journal memakai nilai absolut, jadi record yang juga sudah
+        masuk snapshot aman di-replay ulang.
+        """
+        self.bytes_written += atomic_write_json(self.filename, users)
+        with open(self.journal_filename, 'w', encoding='utf-8'):
+            pass
+        self._journal_records = 0
+        return True
+
+    def close(self):
+        """Pastikan buffer journal tertulis"""
+        self.commit()
+
+
+class SqliteStorage:
+    """Backend penyimpanan: database SQLite (WAL) dengan index untuk query owner
+
+    Mutasi di-buffer lalu ditulis dalam satu transaksi saat commit, memakai
+    statement yang sama per jenis mutasi sehingga di-cache oleh sqlite3.
+    Tidak ada batas jumlah user seperti pada users.json. Index total_messages
+    dan premium melayani top users dan daftar premium tanpa scan tabel; query
+    meng-commit mutasi yang di-buffer dulu, jadi hasilnya selalu terbaru.
+    """
+
+    supports_queries = True
+    supports_fragments = False
+
+    # Statement UPDATE per jenis mutasi
+    UPDATE_STATEMENTS = {
+        'seen': (
+            'UPDATE users SET last_seen = ?, message_count = ?, total_messages = ?, '
+            'last_message = ?, first_name = ?, username = ? WHERE id = ?',
+            ('last_seen', 'message_count', 'total_messages', 'last_message', 'first_name', 'username')
+        ),
+        'premium': (
+            'UPDATE users SET premium = ?, premium_since = ? WHERE id = ?',
+            ('premium', 'premium_since')
+        ),
+        'credits': (
+            'UPDATE users SET credits = ? WHERE id = ?',
+            ('credits',)
+        ),
+    }
+
+    UPSERT_STATEMENT = (
+        f"INSERT OR REPLACE INTO users (user_id, {', '.join(USER_FIELDS)}) "
+        f"VALUES ({', '.join('?' * (len(USER_FIELDS) + 1))})"
+    )
+
+    def __init__(self, db_filename, legacy_json=None):
+        self.db_filename = db_filename
+        self.legacy_json = legacy_json
+        # Tidak diukur untuk SQLite (halaman ditulis oleh sqlite sendiri)
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn = sqlite3.connect(db_filename, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+    def _create_schema(self):
+        """Buat tabel dan index jika belum ada"""
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'user_id TEXT PRIMARY KEY, id INTEGER, first_name TEXT, username TEXT, '
+                'language_code TEXT, first_seen TEXT, last_seen TEXT, '
+                'message_count INTEGER DEFAULT 0, total_messages INTEGER DEFAULT 0, '
+                'last_message TEXT, premium INTEGER DEFAULT 0, premium_since TEXT, '
+                'credits INTEGER DEFAULT 0)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_users_total_messages ON users (total_messages DESC)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_users_premium ON users (premium) WHERE premium = 1'
+            )
+
+    def _row_to_user(self, row):
+        """Konversi row SQLite ke dict format users.json"""
+        user = {field: row[field] for field in USER_FIELDS if row[field] is not None}
+        user['premium'] = bool(row['premium'])
+        return user
+
+    def _upsert_params(self, user_id, user):
+        """Parameter INSERT OR REPLACE untuk satu user"""
+        params = [user_id]
+        for field in USER_FIELDS:
+            value = user.get(field)
+            params.append(int(value) if field == 'premium' and value is not None else value)
+        return params
+
+    def iter_load(self, batch_size=10000):
+        """Load user per batch; migrasi otomatis dari users.json jika database kosong"""
+        with self._lock:
+            empty = self._conn.execute('SELECT 1 FROM users LIMIT 1').fetchone() is None
+        if empty and self.legacy_json and os.path.exists(self.legacy_json):
+            migrate_json_to_sqlite(self.legacy_json, self, batch_size)
+
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute('SELECT * FROM users')
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(row['user_id'], self._row_to_user(row)) for row in rows]
+
+    def load(self):
+        """Load semua user"""
+        users = {}
+        for batch in self.iter_load():
+            users.update(batch)
+        return users
+
+    def backup_corrupted(self):
+        """Backup file database yang corrupt"""
+        backup_corrupted_file(self.db_filename)
+
+    def record(self, op, user_id, fields, delta=None):
+        """Buffer mutasi sampai commit berikutnya"""
+        with self._lock:
+            self._pending.append((op, user_id, fields))
+
+    def commit(self):
+        """Tulis semua mutasi yang di-buffer dalam satu transaksi"""
+        with self._lock:
+            if not self._pending:
+                return True
+            pending = self._pending
+            self._pending = []
+
+            try:
+                with self._conn:
+                    for op, user_id, fields in pending:
+                        if op in self.UPDATE_STATEMENTS:
+                            statement, columns = self.UPDATE_STATEMENTS[op]
+                            params = [fields.get(column) for column in columns]
+                            if op == 'premium':
+                                params[0] = int(bool(params[0]))
+                            self._conn.execute(statement, params + [user_id])
+                        else:
+                            self._conn.execute(self.UPSERT_STATEMENT, self._upsert_params(user_id, fields))
+            except sqlite3.Error as e:
+                print(f"❌ Error writing database: {e}")
+                self._pending = pending + self._pending
+                return False
+        return True
+
+    def needs_snapshot(self):
+        """Database sudah up to date setelah commit"""
+        return False
+
+    def write_snapshot(self, users):
+        """Upsert semua user dalam satu transaksi"""
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    self.UPSERT_STATEMENT,
+                    (self._upsert_params(user_id, user) for user_id, user in users.items())
+                )
+        return True
+
+    def query_top_users(self, limit=10):
+        """Top users berdasarkan total pesan (memakai index total_messages)"""
+        self.commit()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT user_id, first_name, username, total_messages, first_seen, premium '
+                'FROM users ORDER BY total_messages DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [{
+            'id': row['user_id'],
+            'name': row['first_name'] if row['first_name'] is not None else 'Unknown',
+            'username': row['username'] if row['username'] is not None else 'No username',
+            'total_messages': row['total_messages'] or 0,
+            'first_seen': row['first_seen'] if row['first_seen'] is not None else 'Unknown',
+            'premium': bool(row['premium'])
+        } for row in rows]
+
+    def query_premium_users(self):
+        """Semua user premium (memakai partial index premium)"""
+        self.commit()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT user_id, first_name, username, premium_since FROM users WHERE premium = 1'
+            ).fetchall()
+        return [{
+            'id': row['user_id'],
+            'name': row['first_name'] if row['first_name'] is not None else 'Unknown',
+            'username': row['username'] if row['username'] is not None else 'No username',
+            'premium_since': row['premium_since'] if row['premium_since'] is not None else 'Unknown'
+        } for row in rows]
+
+    def query_premium_ids(self):
+        """ID user premium (partial index premium, tanpa baca kolom lain)"""
+        with self._lock:
+            rows = self._conn.execute('SELECT user_id FROM users WHERE premium = 1').fetchall()
+        return [row['user_id'] for row in rows]
+
+    def close(self):
+        """Commit sisa buffer lalu tutup koneksi"""
+        self.commit()
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_to_sqlite(json_filename, storage, batch_size=10000):
+    """Migrasi satu kali dari users.json (plus journal jika ada) ke database SQLite"""
+    migrated = 0
+    # Migrasi satu kali: tanpa batas ukuran file, ditulis per batch
+    for batch in JournalStorage(json_filename, max_file_size=None).iter_load(batch_size):
+        users = {
+            str(user_id): user_data for user_id, user_data in batch
+            if isinstance(user_data, dict)
+        }
+        storage.write_snapshot(users)
+        migrated += len(users)
+    print(f"🔁 {migrated} user dimigrasi dari {json_filename} ke {storage.db_filename}")
+    return migrated
+
+
+def create_storage(kind, filename, compact_threshold=10000, db_filename="users.db",
+                   max_file_size=JsonStorage.MAX_FILE_SIZE, max_users=JsonStorage.MAX_USERS):
+    """Buat backend penyimpanan berdasarkan nama di config"""
+    if kind == "json":
+        return JsonStorage(filename, max_file_size=max_file_size, max_users=max_users)
+    if kind == "journal":
+        return JournalStorage(filename, compact_threshold=compact_threshold, max_file_size=max_file_size)
+    if kind == "sqlite":
+        return SqliteStorage(db_filename, legacy_json=filename)
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from credit_ledger import CreditLedger
+from storage import JournalStorage
+from user_manager import UserManager
+
+
+def test_idempotency_key_is_scoped_per_user(tmp_path):
+    ledger = CreditLedger(str(tmp_path / 'credits.ledger'))
+    ledger.credit(1, 100)
+    ledger.credit(2, 100)
+
+    assert ledger.apply(1, -30, key="order-1") == (70, True)
+    # Key yang sama dari user lain tetap diterapkan
+    assert ledger.apply(2, -10, key="order-1") == (90, True)
+    # Retry oleh user yang sama tidak diulang
+    assert ledger.apply(1, -30, key="order-1") == (70, False)
+    ledger.commit()
+
+    reloaded = CreditLedger(str(tmp_path / 'credits.ledger'))
+    assert (reloaded.balance(1), reloaded.balance(2)) == (70, 90)
+    assert reloaded.apply(2, -10, key="order-1") == (90, False)
+
+
+def test_debit_is_durable_before_return_with_write_behind(tmp_path):
+    ledger_file = str(tmp_path / 'credits.ledger')
+    manager = UserManager('users.json', storage=JournalStorage(str(tmp_path / 'users.json')),
+                          write_behind=True, flush_interval=3600, ledger=CreditLedger(ledger_file))
+    try:
+        user = SimpleNamespace(id=700001, first_name="User", username="user", language_code='id')
+        manager.add_or_update_user(user, 'halo')
+        manager.add_credits(user.id, 100)
+        assert manager.deduct_credits(user.id, 40, idempotency_key="order-1") == 60
+
+        # Tanpa flush: ledger di disk sudah berisi debit
+        assert CreditLedger(ledger_file).balance(str(user.id)) == 60
+    finally:
+        manager.close()
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from telegram import Update
+from telegram.ext import Application
+
+from benchmark import RecordingRequest, make_text_update
+from config import OWNER_ID
+from outbound import OutboundScheduler
+from sharding import ShardedUserManager
+
+
+@pytest.fixture(scope="module")
+def bot_modules(tmp_path_factory):
+    """main_bot membuat user store di direktori kerja saat import: pakai direktori sementara"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("store"))
+    import index_bot
+    import main_bot
+    main_bot.user_manager.wait_ready()
+    yield index_bot, main_bot
+    main_bot.user_manager.close()
+    main_bot.update_log.close()
+    os.chdir(cwd)
+
+
+def _process(bot_modules, texts, monkeypatch):
+    """Jalankan update lewat handler asli; return (jumlah mutasi storage per update, balasan)"""
+    index_bot, main_bot = bot_modules
+    storage = main_bot.user_manager.wait_ready().storage
+    mutations = []
+    record = storage.record
+
+    def counting_record(*args, **kwargs):
+        mutations[-1] += 1
+        return record(*args, **kwargs)
+
+    monkeypatch.setattr(storage, 'record', counting_record)
+
+    async def scenario():
+        request = RecordingRequest(1000)
+        application = (
+            Application.builder().token("1000:test").request(request)
+            .get_updates_request(RecordingRequest(1000)).build()
+        )
+        index_bot.BotManager(metrics_port=0).setup_bot_handlers(application)
+        await application.initialize()
+        for number, text in enumerate(texts, 1):
+            mutations.append(0)
+            # User berbeda per update supaya tidak kena rate limit
+            update = Update.de_json(make_text_update(number, 200000000 + len(mutations), text), application.bot)
+            await application.process_update(update)
+        await application.shutdown()
+        return request.calls['sendMessage']
+
+    replies = asyncio.run(scenario())
+    return mutations, replies
+
+
+@pytest.mark.parametrize("text, replies", [
+    ("halo", 1),
+    ("!ping", 1),
+    ("!tidakada", 1),
+    ("/start", 1),
+    ("/foo", 0),
+])
+def test_one_store_mutation_per_update(bot_modules, monkeypatch, text, replies):
+    mutations, sent = _process(bot_modules, [text, text], monkeypatch)
+    assert mutations == [1, 1]
+    assert sent == 2 * replies
+
+
+class TextRecordingRequest(RecordingRequest):
+    """RecordingRequest yang juga menyimpan teks setiap sendMessage"""
+
+    def __init__(self, bot_id):
+        super().__init__(bot_id)
+        self.texts = []
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        if url.endswith('/sendMessage'):
+            self.texts.append(request_data.parameters['text'])
+        return await super().do_request(url, method, request_data, *args, **kwargs)
+
+
+def test_start_without_user_data_gets_fallback_reply(bot_modules, monkeypatch):
+    index_bot, main_bot = bot_modules
+    # Store tidak punya data user (misal pencatatan di ingress ditolak)
+    monkeypatch.setattr(main_bot.user_manager, 'get_user_stats', lambda user_id: None)
+
+    async def scenario():
+        request = TextRecordingRequest(1000)
+        application = (
+            Application.builder().token("1000:test").request(request)
+            .get_updates_request(RecordingRequest(1000)).build()
+        )
+        index_bot.BotManager(metrics_port=0).setup_bot_handlers(application)
+        await application.initialize()
+        await application.process_update(Update.de_json(make_text_update(1, 200000900, "/start"), application.bot))
+        await application.shutdown()
+        return request.texts
+
+    texts = asyncio.run(scenario())
+    assert len(texts) == 1
+    assert "Selamat Datang" in texts[0] and "belum tersimpan" in texts[0]
+
+
+def test_repeated_owner_reports_are_coalesced(bot_modules):
+    index_bot, _ = bot_modules
+
+    async def scenario():
+        request = RecordingRequest(1000)
+        scheduler = OutboundScheduler(private_chat_interval=0.2)
+        application = (
+            Application.builder().token("1000:test").request(request)
+            .get_updates_request(RecordingRequest(1000)).rate_limiter(scheduler).build()
+        )
+        index_bot.BotManager(metrics_port=0).setup_bot_handlers(application)
+        await application.initialize()
+
+        def update(number, text):
+            return Update.de_json(make_text_update(number, OWNER_ID, text), application.bot)
+
+        # Balasan pertama membuat chat owner masuk jeda, sisanya antri bersamaan
+        await application.process_update(update(1, "!ping"))
+        await asyncio.gather(*(
+            application.process_update(update(number, text))
+            for number, text in enumerate(("!topusers", "!topusers", "!ping", "!ping"), 2)
+        ))
+        await application.shutdown()
+        return request.calls['sendMessage'], scheduler.coalesced
+
+    # !topusers kedua digabung; balasan biasa yang sama tetap terkirim semua
+    assert asyncio.run(scenario()) == (4, 1)
+
+
+class StalledShard:
+    """Shard palsu yang menahan add_or_update_user sampai dilepas"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.recorded = []
+
+    def get_premium_ids(self):
+        return []
+
+    def get_storage_stats(self):
+        return {'users': 0}
+
+    def add_or_update_user(self, user, message_text=None):
+        self.release.wait(5)
+        self.recorded.append((user.id, message_text))
+
+    def flush(self):
+        return True
+
+
+def test_stalled_shard_does_not_block_event_loop(bot_modules, monkeypatch):
+    _, main_bot = bot_modules
+    shard = StalledShard()
+    manager = ShardedUserManager([shard], premium_ttl=60)
+    monkeypatch.setattr(main_bot, 'user_manager', manager)
+
+    async def scenario():
+        update = Update.de_json(make_text_update(1, 200000001, "halo"), None)
+        record = asyncio.create_task(main_bot.record_user_message(update, None))
+        # Event loop tetap jalan selama RPC ke shard tertahan
+        ticks = 0
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not record.done()
+        shard.release.set()
+        await record
+        return ticks
+
+    try:
+        assert asyncio.run(scenario()) == 10
+    finally:
+        shard.release.set()
+        manager.close()
+    assert shard.recorded == [(200000001, "halo")]
@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+from fake_bot_api import FakeBotApi
+from outbound import OutboundScheduler
+
+
+async def _send_concurrently(*calls):
+    api = FakeBotApi()
+    await api.start()
+    scheduler = OutboundScheduler(private_chat_interval=0, group_chat_interval=0)
+    bot = ExtBot("1:test", base_url=f"{api.base_url}/bot", rate_limiter=scheduler)
+    await bot.initialize()
+    try:
+        await asyncio.gather(*(bot.send_message(*args, **kwargs) for args, kwargs in calls))
+    finally:
+        await bot.shutdown()
+        await api.stop()
+    return api.bots["1:test"].sent, scheduler.coalesced
+
+
+def test_identical_replies_are_all_sent():
+    sent, coalesced = asyncio.run(_send_concurrently(
+        ((5, "!ping"), {}),
+        ((5, "!ping"), {}),
+    ))
+    assert (sent, coalesced) == (2, 0)
+
+
+def test_replies_to_different_messages_are_not_merged():
+    sent, coalesced = asyncio.run(_send_concurrently(
+        ((-7, "halo"), {'reply_to_message_id': 1, 'rate_limit_args': {'coalesce': True}}),
+        ((-7, "halo"), {'reply_to_message_id': 2, 'rate_limit_args': {'coalesce': True}}),
+        ((-7, "halo"), {'message_thread_id': 3, 'rate_limit_args': {'coalesce': True}}),
+    ))
+    assert (sent, coalesced) == (3, 0)
+
+
+def test_opt_in_identical_sends_are_merged():
+    sent, coalesced = asyncio.run(_send_concurrently(
+        *[((9, "pengumuman"), {'rate_limit_args': {'coalesce': True}})] * 3
+    ))
+    assert (sent, coalesced) == (1, 2)
+
+
+def test_in_flight_sends_are_capped():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, private_chat_interval=0, max_in_flight=3)
+        await scheduler.initialize()
+        running = peak = 0
+
+        async def callback():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return True
+
+        await asyncio.gather(*(
+            scheduler.process_request(callback, (), {}, 'sendMessage', {'chat_id': chat_id, 'text': "x"}, None)
+            for chat_id in range(1, 21)
+        ))
+        stats = scheduler.get_stats()
+        await scheduler.shutdown()
+        return peak, stats
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 3
+    assert (stats['sent'], stats['in_flight']) == (20, 0)
+
+
+# Toleransi timer event loop (callback bisa jalan sedikit lebih awal dari jadwal)
+TOLERANCE = 0.01
+
+
+async def _with_bots(scenario, tokens=("1:test",), api_kwargs=None, **scheduler_kwargs):
+    """Jalankan scenario(api, scheduler, *bots) dengan beberapa bot yang berbagi satu scheduler"""
+    api = FakeBotApi(**(api_kwargs or {}))
+    await api.start()
+    scheduler = OutboundScheduler(**scheduler_kwargs)
+    bots = [ExtBot(token, base_url=f"{api.base_url}/bot", rate_limiter=scheduler) for token in tokens]
+    for bot in bots:
+        await bot.initialize()
+    try:
+        return await scenario(api, scheduler, *bots)
+    finally:
+        for bot in bots:
+            await bot.shutdown()
+        await api.stop()
+
+
+def _delivered(api):
+    """(waktu, token, chat_id) untuk setiap sendMessage yang sukses"""
+    return [(at, token, chat_id) for at, token, _, chat_id, status in api.send_log if status == 200]
+
+
+def test_retry_after_is_waited_before_resend():
+    async def scenario(api, scheduler, bot):
+        api.inject_429(1)
+        await bot.send_message(5, "halo")
+        return api.send_log, scheduler.get_stats()
+
+    log, stats = asyncio.run(_with_bots(scenario, api_kwargs={'retry_after': 0.3}, private_chat_interval=0))
+    assert [entry[4] for entry in log] == [429, 200]
+    assert log[1][0] - log[0][0] >= 0.3 - TOLERANCE
+    assert (stats['retries'], stats['sent']) == (1, 1)
+
+
+def test_max_retries_is_respected():
+    async def scenario(api, scheduler, bot):
+        api.inject_429(10)
+        with pytest.raises(RetryAfter):
+            await bot.send_message(5, "halo")
+        return api.send_log
+
+    log = asyncio.run(_with_bots(scenario, api_kwargs={'retry_after': 0.05}, max_retries=2,
+                                 private_chat_interval=0))
+    # Percobaan pertama + max_retries, lalu 429 diteruskan ke pemanggil
+    assert [entry[4] for entry in log] == [429] * 3
+
+
+def test_global_rate_is_held():
+    rate = 20
+
+    async def scenario(api, scheduler, bot):
+        await asyncio.gather(*(bot.send_message(chat_id, "halo") for chat_id in range(1, 31)))
+        return _delivered(api)
+
+    delivered = asyncio.run(_with_bots(scenario, global_rate=rate, private_chat_interval=0))
+    times = sorted(at for at, _, _ in delivered)
+    assert len(times) == 30
+    # Burst sebesar bucket, setelah itu 1 pesan per 1/rate detik
+    for index, at in enumerate(times[rate:], rate):
+        assert at - times[0] >= (index - rate + 1) / rate - TOLERANCE
+
+
+def test_per_chat_intervals_hold():
+    async def scenario(api, scheduler, bot):
+        await asyncio.gather(*(bot.send_message(chat_id, "halo") for chat_id in (5, 5, -7, -7)))
+        return _delivered(api)
+
+    # Default scheduler: 1 detik per chat pribadi, 3 detik per grup
+    delivered = asyncio.run(_with_bots(scenario))
+    private = [at for at, _, chat_id in delivered if chat_id == 5]
+    group = [at for at, _, chat_id in delivered if chat_id == -7]
+    assert private[1] - private[0] >= 1.0 - TOLERANCE
+    assert group[1] - group[0] >= 3.0 - TOLERANCE
+
+
+def test_owner_chat_is_released_first():
+    owner = 42
+
+    async def scenario(api, scheduler, bot):
+        sends = [bot.send_message(chat_id, "halo") for chat_id in range(1, 6)]
+        sends.append(bot.send_message(owner, "balasan owner"))
+        await asyncio.gather(*sends)
+        return [chat_id for _, _, chat_id in _delivered(api)]
+
+    # Satu request berjalan sekaligus: sisanya antri dan dilepas sesuai prioritas
+    order = asyncio.run(_with_bots(scenario, api_kwargs={'latency': 0.05}, global_rate=1000,
+                                   private_chat_interval=0, max_in_flight=1, priority_chat_ids={owner}))
+    assert sorted(order) == [1, 2, 3, 4, 5, owner]
+    assert order.index(owner) <= 1
+
+
+def test_flood_wait_holds_the_whole_bot():
+    async def scenario(api, scheduler, bot, other_bot):
+        api.inject_429(1)
+        first = asyncio.create_task(bot.send_message(1, "halo"))
+        while scheduler.retries == 0:
+            await asyncio.sleep(0.001)
+        # Chat lain dari bot yang kena 429 ikut ditahan, bot lain tidak
+        await asyncio.gather(first, bot.send_message(2, "halo"), bot.send_message(3, "halo"),
+                             other_bot.send_message(4, "halo"))
+        return api.send_log
+
+    log = asyncio.run(_with_bots(scenario, tokens=("1:test", "2:test"), api_kwargs={'retry_after': 0.3},
+                                 private_chat_interval=0))
+    flood_at = next(at for at, _, _, _, status in log if status == 429)
+    delivered = {chat_id: at for at, _, _, chat_id, status in log if status == 200}
+    for chat_id in (1, 2, 3):
+        assert delivered[chat_id] - flood_at >= 0.3 - TOLERANCE
+    assert delivered[4] - flood_at < 0.3
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import ResponseCache
+
+
+def test_render_started_before_invalidate_is_not_stored():
+    cache = ResponseCache()
+
+    async def scenario():
+        async def render_stale():
+            # Data dibaca dulu, lalu status premium berubah selagi render masih berjalan
+            value = "lama"
+            await asyncio.sleep(0)
+            cache.invalidate('premiumlist')
+            return value
+
+        first = await cache.get_async('premiumlist', render_stale, 60)
+        second = await cache.get_async('premiumlist', lambda: asyncio.sleep(0, "baru"), 60)
+        return first, second
+
+    assert asyncio.run(scenario()) == ("lama", "baru")
+
+
+def test_invalidate_from_other_thread_runs_on_event_loop():
+    cache = ResponseCache()
+    threads = []
+    invalidate = cache._invalidate
+
+    def recording_invalidate(keys):
+        threads.append(threading.get_ident())
+        invalidate(keys)
+
+    cache._invalidate = recording_invalidate
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+
+        async def render_stale():
+            # Listener premium dipanggil di thread RPC selagi render menunggu
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                await loop.run_in_executor(executor, cache.invalidate, 'topusers')
+            return "lama"
+
+        assert await cache.get_async('topusers', render_stale, 60) == "lama"
+        await asyncio.sleep(0)
+        return await cache.get_async('topusers', lambda: asyncio.sleep(0, "baru"), 60)
+
+    assert asyncio.run(scenario()) == "baru"
+    assert threads == [threading.get_ident()]
@@ -0,0 +1,62 @@
+import threading
+
+from sharding import ShardedUserManager
+
+
+class PremiumShard:
+    """Shard palsu yang bisa menahan refresh setelah snapshot premium diambil"""
+
+    def __init__(self, premium_ids=()):
+        self.premium_ids = set(premium_ids)
+        self.hold = False
+        self.snapshot_taken = threading.Event()
+        self.resume = threading.Event()
+
+    def get_premium_ids(self):
+        snapshot = list(self.premium_ids)
+        if self.hold:
+            self.snapshot_taken.set()
+            self.resume.wait(5)
+        return snapshot
+
+    def get_storage_stats(self):
+        return {'users': 0}
+
+    def set_premium(self, user_id, premium_status=True):
+        if premium_status:
+            self.premium_ids.add(user_id)
+        else:
+            self.premium_ids.discard(user_id)
+        return True
+
+    def flush(self):
+        return True
+
+
+def test_set_premium_during_refresh_is_not_lost():
+    shard = PremiumShard(premium_ids={500000002})
+    manager = ShardedUserManager([shard], premium_ttl=3600)
+    changes = []
+    manager.add_premium_listener(lambda user_id, premium: changes.append((user_id, premium)))
+    try:
+        # Refresh sudah mengambil snapshot lama saat set_premium lewat worker ini
+        shard.hold = True
+        refresher = threading.Thread(target=manager._refresh)
+        refresher.start()
+        assert shard.snapshot_taken.wait(5)
+        assert manager.set_premium(500000001, True)
+        assert manager.set_premium(500000002, False)
+        shard.resume.set()
+        refresher.join()
+
+        assert manager.is_premium(500000001)
+        assert not manager.is_premium(500000002)
+        assert changes == [(500000001, True), (500000002, False)]
+
+        # Refresh berikutnya memakai data shard yang sudah memuat perubahan
+        shard.hold = False
+        manager._refresh()
+        assert manager.get_premium_ids() == [500000001]
+    finally:
+        shard.resume.set()
+        manager.close()
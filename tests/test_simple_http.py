@@ -0,0 +1,52 @@
+import asyncio
+
+from simple_http import HttpResponse, start_http_server
+
+
+async def _handler(request):
+    if request.path == '/slow':
+        await asyncio.sleep(0.2)
+    return HttpResponse(200, "ok")
+
+
+async def _request(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode())
+    await writer.drain()
+    return reader, writer
+
+
+def test_stop_does_not_wait_for_idle_keepalive_connections():
+    async def scenario():
+        server = await start_http_server(_handler, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        idle_reader, idle_writer = await _request(port, '/')
+        assert (await idle_reader.readuntil(b"ok")).startswith(b"HTTP/1.1 200")
+        busy_reader, busy_writer = await _request(port, '/slow')
+        await asyncio.sleep(0.05)
+
+        server.close()
+        await asyncio.wait_for(server.wait_closed(), 2)
+        # Request yang sedang diproses tetap dijawab, lalu koneksinya ditutup
+        response = await asyncio.wait_for(busy_reader.read(), 2)
+        assert response.startswith(b"HTTP/1.1 200")
+        assert b"Connection: close" in response
+        assert await asyncio.wait_for(idle_reader.read(), 2) == b""
+        idle_writer.close()
+        busy_writer.close()
+
+    asyncio.run(scenario())
+
+
+def test_idle_connection_is_closed_after_timeout():
+    async def scenario():
+        server = await start_http_server(_handler, '127.0.0.1', 0, idle_timeout=0.1)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await _request(port, '/')
+        await reader.readuntil(b"ok")
+        assert await asyncio.wait_for(reader.read(), 2) == b""
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
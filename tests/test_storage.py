@@ -0,0 +1,139 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from benchmark import iter_synthetic_users
+from storage import JsonStorage, SqliteStorage, atomic_write_json, iter_json_object_chunks
+from user_manager import UserManager, load_batch, sanitize_user_data
+from user_record import UserRecord
+
+
+def _document(count):
+    return json.dumps(dict(iter_synthetic_users(count)))
+
+
+def test_chunks_match_json_loads():
+    text = _document(500)
+    # Chunk kecil supaya dokumen terpotong ke banyak fragmen
+    items = list(iter_json_object_chunks(io.StringIO(text), chunk_size=4096))
+    assert items == list(json.loads(text).items())
+
+
+def test_chunks_keep_entries_before_corruption():
+    text = _document(500)
+    truncated = text[:len(text) * 3 // 4]
+    expected = []
+    with pytest.raises(json.JSONDecodeError):
+        for item in iter_json_object_chunks(io.StringIO(truncated), chunk_size=4096):
+            expected.append(item)
+    keys = [user_id for user_id, _ in expected]
+    assert len(keys) == len(set(keys))
+    assert len(keys) > 300
+    assert expected == list(json.loads(text).items())[:len(keys)]
+
+
+def test_load_batch_matches_sanitize_then_from_dict():
+    batch = list(iter_synthetic_users(200))
+    batch += [
+        ("300000001", {'first_name': 'Kutip "x"\x07', 'credits': -5, 'message_count': 2.7,
+                       'language_code': 'bukan kode', 'first_seen': '2024-01-01', 'premium': 1,
+                       'premium_since': '2024-02-03T04:05:06', 'unknown': 1}),
+        ("300000002", {'username': None, 'last_seen': 123}),
+        ("bukan-id", {'first_name': 'X'}),
+        ("300000003", "bukan dict"),
+    ]
+    expected = [
+        (user_id, UserRecord.from_dict(sanitize_user_data(data)).as_tuple())
+        for user_id, data in batch[:-2]
+    ]
+    assert [(user_id, record.as_tuple()) for user_id, record in load_batch(batch)] == expected
+
+
+def _legacy_users():
+    """users.json kecil: total pesan berbeda per user, dua user premium"""
+    users = dict(iter_synthetic_users(6))
+    for rank, (user_id, data) in enumerate(users.items()):
+        data['total_messages'] = (rank + 1) * 10
+        data['premium'] = rank in (1, 4)
+        data['premium_since'] = '2024-05-01T10:00:00' if data['premium'] else None
+    return users
+
+
+def _index_plan(storage, query):
+    with storage._lock:
+        return " ".join(row[-1] for row in storage._conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+
+
+def test_sqlite_migrates_users_json_and_serves_owner_queries_after_reopen(tmp_path):
+    legacy = _legacy_users()
+    json_file = str(tmp_path / 'users.json')
+    db_file = str(tmp_path / 'users.db')
+    atomic_write_json(json_file, legacy)
+    by_messages = sorted(legacy, key=lambda user_id: legacy[user_id]['total_messages'], reverse=True)
+    premium = sorted(user_id for user_id, data in legacy.items() if data['premium'])
+
+    manager = UserManager('users.json', storage=SqliteStorage(db_file, legacy_json=json_file))
+    try:
+        assert manager.get_total_users() == len(legacy)
+        assert [user['id'] for user in manager.get_top_users(3)] == by_messages[:3]
+    finally:
+        manager.close()
+
+    # users.json diubah setelah migrasi: database yang sudah terisi tidak dimigrasi ulang
+    atomic_write_json(json_file, {})
+    manager = UserManager('users.json', storage=SqliteStorage(db_file, legacy_json=json_file))
+    try:
+        assert manager.get_total_users() == len(legacy)
+        top = manager.get_top_users(3)
+        assert [(user['id'], user['total_messages']) for user in top] == [
+            (user_id, legacy[user_id]['total_messages']) for user_id in by_messages[:3]
+        ]
+        assert sorted(user['id'] for user in manager.get_premium_users()) == premium
+        assert sorted(str(user_id) for user_id in manager.get_premium_ids()) == premium
+        assert all(user['premium_since'] == '2024-05-01T10:00:00' for user in manager.get_premium_users())
+        # Query owner memakai index, bukan scan tabel
+        assert 'idx_users_total_messages' in _index_plan(
+            manager.storage, 'SELECT user_id FROM users ORDER BY total_messages DESC LIMIT 10')
+        assert 'idx_users_premium' in _index_plan(
+            manager.storage, 'SELECT user_id FROM users WHERE premium = 1')
+    finally:
+        manager.close()
+
+
+def test_sqlite_queries_see_buffered_mutations(tmp_path):
+    db_file = str(tmp_path / 'users.db')
+    manager = UserManager('users.json', storage=SqliteStorage(db_file), write_behind=True, flush_interval=3600)
+    try:
+        for i in range(3):
+            user = SimpleNamespace(id=500000 + i, first_name=f"User{i}", username=f"user{i}", language_code='id')
+            for _ in range(i + 1):
+                manager.add_or_update_user(user, 'halo')
+        manager.set_premium(500000)
+        # Belum di-flush: query tetap melihat mutasi terakhir
+        assert [user['id'] for user in manager.get_top_users(2)] == ['500002', '500001']
+        assert [user['id'] for user in manager.get_premium_users()] == ['500000']
+    finally:
+        manager.close()
+
+    reopened = UserManager('users.json', storage=SqliteStorage(db_file))
+    try:
+        assert [user['total_messages'] for user in reopened.get_top_users(3)] == [3, 2, 1]
+        assert reopened.is_premium(500000)
+    finally:
+        reopened.close()
+
+
+def test_sqlite_has_no_user_cap(tmp_path):
+    users = dict(iter_synthetic_users(5))
+    assert not JsonStorage(str(tmp_path / 'users.json'), max_users=3).write_snapshot(users)
+
+    storage = SqliteStorage(str(tmp_path / 'users.db'))
+    assert storage.write_snapshot(users)
+    storage.close()
+    storage = SqliteStorage(str(tmp_path / 'users.db'))
+    try:
+        assert sorted(storage.load()) == sorted(users)
+    finally:
+        storage.close()
@@ -0,0 +1,75 @@
+import asyncio
+
+from telegram import Bot
+
+from fake_bot_api import FakeBotApi
+from transport import SharedTransport
+
+TOKENS = ("1:test", "2:test", "3:test")
+
+
+async def _with_bots(scenario, **transport_kwargs):
+    """Jalankan scenario(transport, bots) dengan beberapa bot di atas satu SharedTransport"""
+    api = FakeBotApi()
+    await api.start()
+    transport = SharedTransport(http2=False, **transport_kwargs)
+    bots = [
+        Bot(token, base_url=f"{api.base_url}/bot", request=transport.request_for(token[:1]))
+        for token in TOKENS
+    ]
+    try:
+        return await scenario(api, transport, bots)
+    finally:
+        for bot in bots:
+            await bot.shutdown()
+        await api.stop()
+
+
+def test_bots_share_one_pool_and_reuse_its_connection():
+    async def scenario(api, transport, bots):
+        for bot in bots:
+            await bot.initialize()
+        client = transport._client
+        assert [bot.request._client for bot in bots] == [client] * len(bots)
+
+        # Request berurutan: koneksi keep-alive dari bot pertama dipakai ulang semua bot
+        for bot in bots:
+            for chat_id in (10, 11, 12):
+                await bot.send_message(chat_id, "halo")
+        return transport.get_stats(), sum(bot.sent for bot in api.bots.values())
+
+    stats, sent = asyncio.run(_with_bots(scenario))
+    assert sent == 9
+    # getMe + 3 sendMessage per bot
+    assert {name: bot['requests'] for name, bot in stats.items()} == {'1': 4, '2': 4, '3': 4}
+    assert {name: bot['new_connections'] for name, bot in stats.items()} == {'1': 1, '2': 0, '3': 0}
+    assert {name: bot['reused_connections'] for name, bot in stats.items()} == {'1': 3, '2': 4, '3': 4}
+    assert all(bot['errors'] == 0 for bot in stats.values())
+
+
+def test_burst_stays_within_pool_size():
+    async def scenario(api, transport, bots):
+        for bot in bots:
+            await bot.initialize()
+        await asyncio.gather(*(bot.send_message(chat_id, "halo") for bot in bots for chat_id in range(10)))
+        return transport.get_stats()
+
+    stats = asyncio.run(_with_bots(scenario, pool_size=2, keepalive_connections=2))
+    assert sum(bot['requests'] for bot in stats.values()) == 33
+    assert 1 <= sum(bot['new_connections'] for bot in stats.values()) <= 2
+    assert sum(bot['errors'] for bot in stats.values()) == 0
+
+
+def test_client_closes_after_last_bot_shuts_down():
+    async def scenario(api, transport, bots):
+        for bot in bots:
+            await bot.initialize()
+        client = transport._client
+        for bot in bots[:-1]:
+            await bot.shutdown()
+        assert transport._client is client and not client.is_closed
+        await bots[-1].shutdown()
+        return client
+
+    client = asyncio.run(_with_bots(scenario))
+    assert client.is_closed
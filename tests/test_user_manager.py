@@ -0,0 +1,127 @@
+import contextlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from storage import JournalStorage
+from user_manager import UserManager
+from user_record import UserRecord
+
+THREADS = 8
+OPERATIONS = 300
+USERS = 4
+INITIAL_CREDITS = 1000
+
+
+class YieldingRecord(UserRecord):
+    """UserRecord yang melepas GIL di antara baca dan tulis counter
+
+    Memaksa thread lain berjalan di tengah read-modify-write, jadi update
+    yang hilang tanpa lock per user pasti terlihat (tidak bergantung pada
+    kapan interpreter kebetulan berganti thread).
+    """
+
+    __slots__ = ()
+
+
+def _yielding_field(name):
+    slot = getattr(UserRecord, name)
+
+    def get(self):
+        value = slot.__get__(self)
+        time.sleep(0)
+        return value
+
+    return property(get, slot.__set__)
+
+
+for _field in ('credits', 'message_count', 'total_messages'):
+    setattr(YieldingRecord, _field, _yielding_field(_field))
+
+
+def _telegram_user(user_id):
+    return SimpleNamespace(id=user_id, first_name=f"User{user_id}", username=f"user{user_id}", language_code='id')
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """UserManager tanpa ledger (credits langsung di record) dengan record yang memaksa interleaving"""
+    storage = JournalStorage(str(tmp_path / 'users.json'))
+    manager = UserManager('users.json', storage=storage, write_behind=True, flush_interval=3600)
+    manager.user_ids = []
+    for i in range(USERS):
+        user = _telegram_user(700000 + i)
+        manager.add_or_update_user(user, 'halo')
+        manager.add_credits(user.id, INITIAL_CREDITS)
+        manager.users[str(user.id)].__class__ = YieldingRecord
+        manager.user_ids.append(user.id)
+    yield manager
+    manager.close()
+
+
+def _run_threads(target):
+    threads = [threading.Thread(target=target, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _credits_stress(manager):
+    """Add/deduct dari banyak thread; return (saldo di memory, saldo yang diharapkan)"""
+    net_changes = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        net = dict.fromkeys(manager.user_ids, 0)
+        for _ in range(OPERATIONS):
+            user_id = rng.choice(manager.user_ids)
+            amount = rng.randint(1, 50)
+            if rng.random() < 0.5:
+                manager.add_credits(user_id, amount)
+                net[user_id] += amount
+            elif manager.deduct_credits(user_id, amount) is not None:
+                net[user_id] -= amount
+        net_changes.append(net)
+
+    _run_threads(worker)
+    expected = {
+        user_id: INITIAL_CREDITS + sum(net[user_id] for net in net_changes) for user_id in manager.user_ids
+    }
+    actual = {user_id: manager.get_user_stats(user_id)['credits'] for user_id in manager.user_ids}
+    return actual, expected
+
+
+def test_concurrent_credits_are_exact(manager, tmp_path):
+    actual, expected = _credits_stress(manager)
+    assert actual == expected
+
+    # Journal per user harus mengikuti urutan mutasi: saldo sama setelah load ulang
+    manager.flush()
+    reloaded = UserManager('users.json', storage=JournalStorage(str(tmp_path / 'users.json')))
+    try:
+        assert {user_id: reloaded.get_user_stats(user_id)['credits'] for user_id in manager.user_ids} == expected
+    finally:
+        reloaded.close()
+
+
+def test_concurrent_messages_are_counted(manager):
+    def worker(seed):
+        for i in range(OPERATIONS):
+            manager.add_or_update_user(_telegram_user(manager.user_ids[i % USERS]), f"pesan {seed}")
+
+    _run_threads(worker)
+    per_user = 1 + THREADS * OPERATIONS // USERS
+    for user_id in manager.user_ids:
+        stats = manager.get_user_stats(user_id)
+        assert (stats['message_count'], stats['total_messages']) == (per_user, per_user)
+
+
+def test_stress_detects_lost_updates_without_user_locks(manager, monkeypatch):
+    # Read-modify-write tanpa lock per user (kode sebelum striped lock) kehilangan update
+    monkeypatch.setattr(manager, '_lock_for', lambda user_id: contextlib.nullcontext())
+    actual, expected = _credits_stress(manager)
+    assert actual != expected
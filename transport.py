@@ -0,0 +1,171 @@
+import time
+
+import httpx
+from telegram.error import NetworkError, TimedOut
+from telegram.request import BaseRequest
+
+try:
+    import h2  # noqa: F401  (dibutuhkan httpx untuk HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _or_default(value, default):
+    """Ganti nilai DEFAULT_NONE dari python-telegram-bot dengan default transport"""
+    return default if isinstance(value, type(BaseRequest.DEFAULT_NONE)) else value
+
+
+class ConnectionStats:
+    """Statistik request dan pemakaian ulang koneksi untuk satu bot"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.total_time = 0.0
+
+    @property
+    def reused_connections(self):
+        return max(self.requests - self.new_connections, 0)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'errors': self.errors,
+            'avg_latency_ms': (self.total_time / self.requests * 1000) if self.requests else 0.0
+        }
+
+
+class SharedTransport:
+    """Satu connection pool HTTP (keep-alive, HTTP/2 jika ada) untuk semua bot
+
+    Setiap bot mendapat ``SharedRequest`` sendiri lewat ``request_for`` supaya
+    statistiknya terpisah, tapi semuanya memakai ``httpx.AsyncClient`` yang
+    sama. Client dibuat saat bot pertama initialize dan ditutup saat bot
+    terakhir shutdown. ``pool_size`` / ``keepalive_connections`` None berarti
+    tanpa batas (dipakai untuk pool long polling: satu koneksi per bot).
+    """
+
+    def __init__(self, pool_size=100, keepalive_connections=20, keepalive_expiry=30.0,
+                 http2=True, connect_timeout=5.0, read_timeout=5.0,
+                 write_timeout=5.0, pool_timeout=1.0):
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.stats = {}
+        self._client = None
+        self._users = 0
+
+    def request_for(self, name):
+        """Buat request object untuk satu bot (nama dipakai sebagai key statistik)"""
+        stats = self.stats.setdefault(name, ConnectionStats())
+        return SharedRequest(self, stats)
+
+    async def acquire(self):
+        """Ambil client bersama, buat jika belum ada"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2
+            )
+        self._users += 1
+        return self._client
+
+    async def release(self):
+        """Lepas client; ditutup saat tidak ada bot yang memakai lagi"""
+        self._users = max(self._users - 1, 0)
+        if self._users == 0 and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self):
+        """Statistik per bot dalam bentuk dict"""
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+
+class SharedRequest(BaseRequest):
+    """Implementasi BaseRequest python-telegram-bot di atas SharedTransport"""
+
+    def __init__(self, transport, stats):
+        self._transport = transport
+        self._stats = stats
+        self._client = None
+
+    @property
+    def read_timeout(self):
+        return self._transport.timeout.read
+
+    async def initialize(self):
+        if self._client is None:
+            self._client = await self._transport.acquire()
+
+    async def shutdown(self):
+        if self._client is not None:
+            self._client = None
+            await self._transport.release()
+
+    async def _trace(self, event_name, info):
+        """Hook httpcore: hitung koneksi TCP baru (sisanya memakai ulang koneksi)"""
+        if event_name == 'connection.connect_tcp.complete':
+            self._stats.new_connections += 1
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        if self._client is None:
+            raise RuntimeError("This SharedRequest is not initialized!")
+
+        files = request_data.multipart_data if request_data else None
+        data = request_data.json_parameters if request_data else None
+
+        # Pakai timeout default transport jika tidak diisi oleh method bot
+        default = self._transport.timeout
+        timeout = httpx.Timeout(
+            connect=_or_default(connect_timeout, default.connect),
+            read=_or_default(read_timeout, default.read),
+            write=_or_default(write_timeout, default.write),
+            pool=_or_default(pool_timeout, default.pool)
+        )
+
+        self._stats.requests += 1
+        start = time.perf_counter()
+        try:
+            res = await self._client.request(
+                method=method,
+                url=url,
+                headers={"User-Agent": self.USER_AGENT},
+                timeout=timeout,
+                files=files,
+                data=data,
+                extensions={"trace": self._trace}
+            )
+        except httpx.TimeoutException as err:
+            self._stats.errors += 1
+            raise TimedOut from err
+        except httpx.HTTPError as err:
+            self._stats.errors += 1
+            raise NetworkError(f"httpx.{err.__class__.__name__}: {err}") from err
+        finally:
+            self._stats.total_time += time.perf_counter() - start
+
+        return res.status_code, res.content
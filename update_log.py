@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueListener
+
+# Warna ANSI untuk mode pretty (hanya untuk terminal interaktif)
+GREEN = "\033[92m"
+CYAN = "\033[96m"
+PURPLE = "\033[95m"
+RED = "\033[91m"
+RESET = "\033[0m"
+WHITE = "\033[97m"
+YELLOW = "\033[93m"
+LINE = f"{PURPLE}━━━━━━━━━━━━━━━━━━━━━━━{RESET}"
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu baris JSON per record; field tambahan dari atribut ``event`` (dict)"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'msg': record.getMessage(),
+        }
+        data.update(getattr(record, 'event', None) or {})
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class PrettyFormatter(logging.Formatter):
+    """Banner berwarna seperti log lama, untuk dijalankan langsung di terminal"""
+
+    def format(self, record):
+        event = getattr(record, 'event', None) or {}
+        now = datetime.fromtimestamp(record.created).strftime("%H:%M:%S")
+        status = event.get('status', '')
+        status_color = GREEN if status == 'ok' else RED
+        lines = [
+            LINE,
+            f"{CYAN}❗ {record.getMessage().upper()}{WHITE}({now}){RESET}",
+            f"{YELLOW}[ID] User   : {event.get('user_id')}{RESET}",
+        ]
+        if 'command' in event:
+            lines.append(f"{GREEN}[CMD] Command: {event['command']}{RESET}")
+        if 'text' in event:
+            lines.append(f"{GREEN}[MSG] Pesan  : {event['text']}{RESET}")
+        lines.append(f"{status_color} Status : {status} ({event.get('latency_ms', 0):.1f} ms){RESET}")
+        lines.append(LINE)
+        return "\n".join(lines)
+
+
+class EventListener(QueueListener):
+    """QueueListener untuk tuple ``(waktu, pesan, event)``
+
+    LogRecord baru dibuat di thread listener, jadi handler bot hanya
+    membayar satu ``put`` tuple ke antrian.
+    """
+
+    def __init__(self, log_queue, *handlers, name="bot.updates"):
+        super().__init__(log_queue, *handlers)
+        self.name = name
+
+    def prepare(self, item):
+        created, msg, event = item
+        return logging.makeLogRecord({
+            'name': self.name, 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': msg, 'created': created, 'event': event
+        })
+
+
+class UpdateLog:
+    """Log terstruktur per update lewat antrian + thread listener (QueueListener)
+
+    Command selalu dicatat; pesan biasa (echo) hanya dicatat dengan peluang
+    ``sample_rate`` supaya bot ramai tidak membanjiri log. Baris pesan
+    biasa menyertakan ``sample_rate`` agar jumlahnya bisa diskalakan ulang.
+    Format "auto" memakai banner berwarna jika stdout adalah terminal,
+    selain itu JSON per baris. Handler tidak pernah menunggu: jika antrian
+    penuh (output macet), baris log dibuang dan dihitung di ``dropped``.
+    """
+
+    def __init__(self, log_format="auto", sample_rate=0.01, queue_size=10000, stream=None,
+                 name="bot.updates"):
+        stream = stream if stream is not None else sys.stdout
+        if log_format == "auto":
+            log_format = "pretty" if stream.isatty() else "json"
+        if log_format not in ("json", "pretty"):
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.log_format = log_format
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.sampled_out = 0
+        self.dropped = 0
+
+        self.output = logging.StreamHandler(stream)
+        self.output.setFormatter(PrettyFormatter() if log_format == "pretty" else JsonFormatter())
+        self.queue = queue.SimpleQueue()
+        self.listener = EventListener(self.queue, self.output, name=name)
+        self._closed = False
+        self.listener.start()
+        atexit.register(self.close)
+
+    def _enqueue(self, msg, event):
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            return
+        self.queue.put((time.time(), msg, event))
+
+    def command(self, user_id, command, status, latency, text=None):
+        """Catat satu command (selalu dicatat)"""
+        event = {'user_id': user_id, 'command': command, 'status': status,
+                 'latency_ms': round(latency * 1000, 3)}
+        if text is not None:
+            event['text'] = text
+        self._enqueue("command", event)
+
+    def message(self, user_id, status, latency):
+        """Catat pesan biasa dengan sampling (isi pesan tidak dicatat)"""
+        if random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        self._enqueue("message", {
+            'user_id': user_id, 'status': status, 'latency_ms': round(latency * 1000, 3),
+            'sample_rate': self.sample_rate
+        })
+
+    def close(self):
+        """Tulis sisa antrian lalu hentikan thread listener"""
+        if self._closed:
+            return
+        self._closed = True
+        self.listener.stop()
+        self.output.flush()
@@ -1,176 +1,517 @@
+import atexit
+import gc
 import json
-import os
+import multiprocessing
 import re
-from datetime import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from telegram import User
+from leaderboard import TopUsersIndex
+from metrics import Histogram
+from storage import JsonStorage
+from user_record import UserRecord, now_epoch, to_epoch, to_iso
+
+# Pattern validasi, di-compile sekali
+FILENAME_PATTERN = re.compile(r'^[\w\.-]+\.json$')
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+# Karakter yang membuat sanitize_input mengubah teks (control characters, backslash, kutip)
+UNSAFE_CHARS_PATTERN = re.compile(r'[\x00-\x1f\x7f-\x9f\\"]')
+ISO_DATETIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}')
+LANGUAGE_CODE_PATTERN = re.compile(r'^[a-z]{2,3}(-[A-Z]{2,3})?$')
+
+# User ID maksimal 20 digit
+MAX_USER_ID = 10 ** 20
+
+# Field yang diizinkan per jenis validasi
+TEXT_FIELDS = frozenset({'first_name', 'username', 'last_message'})
+DATETIME_FIELDS = frozenset({'first_seen', 'last_seen', 'premium_since'})
+NUMBER_FIELDS = frozenset({'id', 'message_count', 'total_messages', 'credits'})
+
+
+def sanitize_input(text, max_length=1000):
+    """Sanitize input text untuk mencegah injeksi"""
+    if text is None:
+        return ""
+    
+    # Batasi panjang
+    if type(text) is not str:
+        text = str(text)
+    if len(text) > max_length:
+        text = text[:max_length]
+    
+    # Fast path: teks biasa tidak perlu diubah (tanpa alokasi string baru)
+    if UNSAFE_CHARS_PATTERN.search(text) is None:
+        return text
+    
+    # Hapus karakter berbahaya untuk JSON
+    text = CONTROL_CHARS_PATTERN.sub('', text)  # Hapus control characters
+    return text.replace('\\', '\\\\').replace('"', '\\"')  # Escape karakter
+
+
+def sanitize_unchanged(text, stored, max_length=1000):
+    """Sanitize teks, tapi pakai nilai tersimpan jika sama persis dan sudah bersih
+
+    Nilai tersimpan adalah hasil sanitize_input: setiap kutip di-escape dengan
+    backslash, jadi jika tidak ada backslash nilainya memang tidak diubah.
+    """
+    if text == stored and '\\' not in stored:
+        return stored
+    return sanitize_input(text, max_length)
+
+
+def validate_user_id(user_id):
+    """Validasi user_id"""
+    # Fast path: ID dari Telegram selalu int
+    if type(user_id) is int:
+        return str(user_id) if 0 <= user_id < MAX_USER_ID else None
+    if isinstance(user_id, (int, str)):
+        user_id_str = str(user_id)
+        if user_id_str.isdigit() and len(user_id_str) <= 20:
+            return user_id_str
+    return None
+
+
+def sanitize_user_data(user_data):
+    """Sanitize data user individual"""
+    sanitized = {}
+    
+    for field, value in user_data.items():
+        if field in TEXT_FIELDS:
+            sanitized[field] = sanitize_input(value, 500)
+        elif field in DATETIME_FIELDS:
+            # Validasi format datetime ISO
+            if isinstance(value, str) and ISO_DATETIME_PATTERN.match(value):
+                sanitized[field] = value
+        elif field in NUMBER_FIELDS:
+            # Validasi angka
+            if isinstance(value, (int, float)) and value >= 0:
+                sanitized[field] = int(value)
+        elif field == 'premium':
+            # Validasi boolean
+            sanitized[field] = bool(value)
+        elif field == 'language_code':
+            # Validasi language code
+            if isinstance(value, str) and LANGUAGE_CODE_PATTERN.match(value):
+                sanitized[field] = value
+    
+    return sanitized
+
+
+def _load_number(value):
+    return int(value) if isinstance(value, (int, float)) and value >= 0 else 0
+
+
+def _load_timestamp(value):
+    return to_epoch(value) if isinstance(value, str) and ISO_DATETIME_PATTERN.match(value) else None
+
+
+def load_user_record(user_data):
+    """Data mentah users.json -> UserRecord dalam satu langkah
+
+    Hasilnya sama dengan ``UserRecord.from_dict(sanitize_user_data(data))``,
+    tapi tanpa dict perantara per user (jalur panas saat load).
+    """
+    get = user_data.get
+    language_code = get('language_code')
+    return UserRecord(
+        id=_load_number(get('id')),
+        first_name=sanitize_input(get('first_name'), 500),
+        username=sanitize_input(get('username'), 500),
+        language_code=language_code if isinstance(language_code, str) and LANGUAGE_CODE_PATTERN.match(language_code) else "",
+        first_seen=_load_timestamp(get('first_seen')),
+        last_seen=_load_timestamp(get('last_seen')),
+        message_count=_load_number(get('message_count')),
+        total_messages=_load_number(get('total_messages')),
+        last_message=sanitize_input(get('last_message'), 500),
+        premium=bool(get('premium', False)),
+        premium_since=_load_timestamp(get('premium_since')),
+        credits=_load_number(get('credits')),
+    )
+
+
+def load_batch(batch):
+    """Validasi satu batch (user_id, data) mentah menjadi (user_id, UserRecord); bisa dijalankan di process pool"""
+    return [
+        (user_id, load_user_record(user_data)) for user_id, user_data in batch
+        if validate_user_id(user_id) and isinstance(user_data, dict)
+    ]
+
+
+# Perubahan journal yang belum masuk snapshot, di-set sekali per worker
+_worker_changes = {}
+
+
+def _init_load_worker(changes):
+    global _worker_changes
+    _worker_changes = changes
+
+
+def load_fragment(fragment):
+    """Parse + validasi satu fragmen users.json di worker; return list (user_id, nilai record)"""
+    data = json.loads('{' + fragment + '}')
+    for user_id, user_data in data.items():
+        fields = _worker_changes.get(user_id)
+        if fields is not None and isinstance(user_data, dict):
+            user_data.update(fields)
+    return [(user_id, record.as_tuple()) for user_id, record in load_batch(data.items())]
+
+
+def _pool_context():
+    """Pakai fork jika ada, supaya worker tidak meng-import ulang modul bot"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _timed(iterator, timings, phase):
+    """Bungkus iterator dan jumlahkan waktu yang dihabiskan di dalamnya"""
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[phase] += time.perf_counter() - start
+            return
+        timings[phase] += time.perf_counter() - start
+        yield item
+
 
 class UserManager:
-    def __init__(self, filename="users.json"):
+    # Jumlah lock per user (striped): user dengan hash sama berbagi satu lock
+    LOCK_STRIPES = 64
+    # Data di memori proses ini: handler memanggil langsung (lihat ShardedUserManager)
+    rpc_executor = None
+    
+    def __init__(self, filename="users.json", write_behind=False,
+                 flush_interval=5.0, flush_threshold=500, storage=None,
+                 load_workers=0, load_batch_size=10000, ledger=None):
         # Validasi filename
-        if not re.match(r'^[\w\.-]+\.json$', filename):
+        if not FILENAME_PATTERN.match(filename):
             raise ValueError("Invalid filename")
         self.filename = filename
+        # Lock per kelompok user untuk read-modify-write, plus lock untuk index ranking
+        self._user_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._index_lock = threading.Lock()
+        # Backend penyimpanan (default: users.json penuh)
+        self.storage = storage if storage is not None else JsonStorage(filename)
+        # Load streaming per batch, validasi opsional di process pool (0 = proses ini)
+        self.load_workers = load_workers
+        self.load_batch_size = load_batch_size
+        self.load_timings = {'read': 0.0, 'validate': 0.0, 'build': 0.0, 'index': 0.0}
         self.users = self.load_users()
-    
-    def sanitize_input(self, text, max_length=1000):
-        """Sanitize input text untuk mencegah injeksi"""
-        if text is None:
-            return ""
         
-        # Batasi panjang
-        text = str(text)[:max_length]
+        # Ranking incremental untuk get_top_users (SQLite: index total_messages di database)
+        start = time.perf_counter()
+        self.top_users_index = None
+        if not self.storage.supports_queries:
+            self.top_users_index = TopUsersIndex()
+            self.top_users_index.rebuild(self.users)
+        # Set user premium (dict ID int -> None, urutan tetap) untuk cek role per pesan
+        if self.storage.supports_queries:
+            # Dari partial index premium, tanpa scan semua record
+            premium_ids = [user_id for user_id in self.storage.query_premium_ids() if user_id in self.users]
+        else:
+            premium_ids = [user_id for user_id, user in self.users.items() if user.premium]
+        self._premium_ids = {int(user_id): None for user_id in premium_ids}
+        self._premium_listeners = []
+        self.load_timings['index'] = time.perf_counter() - start
+        self.print_load_timings()
         
-        # Hapus karakter berbahaya untuk JSON
-        text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)  # Hapus control characters
-        text = text.replace('\\', '\\\\').replace('"', '\\"')  # Escape karakter
+        # Ledger credits (opsional): sumber kebenaran saldo, users.json hanya salinan
+        self.ledger = ledger
+        if self.ledger is not None:
+            self._reconcile_credits()
         
-        return text
+        # Write-behind: mutasi hanya menandai user dirty, flusher yang menyimpan
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._save_lock = threading.RLock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._flusher = None
+        # Durasi tiap penyimpanan batch (journal/snapshot/database)
+        self.save_latency = Histogram()
+        
+        if self.write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="UserManagerFlusher", daemon=True)
+            self._flusher.start()
+            # Pastikan data tersimpan saat proses berhenti
+            atexit.register(self.close)
+    
+    def sanitize_input(self, text, max_length=1000):
+        """Sanitize input text untuk mencegah injeksi"""
+        return sanitize_input(text, max_length)
     
     def validate_user_id(self, user_id):
         """Validasi user_id"""
-        if isinstance(user_id, (int, str)):
-            user_id_str = str(user_id)
-            if user_id_str.isdigit() and len(user_id_str) <= 20:
-                return user_id_str
-        return None
+        return validate_user_id(user_id)
     
     def load_users(self):
-        """Load data pengguna dari file JSON dengan security"""
+        """Load data pengguna dari storage dengan security (streaming per batch)"""
+        # Jutaan objek baru saat load: matikan GC siklik sementara (tidak ada siklus di sini)
+        gc_enabled = gc.isenabled()
+        gc.disable()
         try:
-            if os.path.exists(self.filename):
-                # Cek file size (max 10MB)
-                if os.path.getsize(self.filename) > 10 * 1024 * 1024:
-                    print("❌ File terlalu besar!")
-                    return {}
-                
-                with open(self.filename, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # Validasi structure data
-                    if isinstance(data, dict):
-                        # Sanitize semua data
-                        sanitized_data = {}
-                        for user_id, user_data in data.items():
-                            if self.validate_user_id(user_id) and isinstance(user_data, dict):
-                                sanitized_data[user_id] = self.sanitize_user_data(user_data)
-                        return sanitized_data
-                    return {}
-            return {}
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            print(f"❌ Error loading users (corrupted file): {e}")
-            # Backup file yang corrupt
-            self.backup_corrupted_file()
-            return {}
+            if self.load_workers > 0 and self.storage.supports_fragments:
+                try:
+                    return self._load_users_parallel()
+                except Exception as e:
+                    print(f"⚠️ Load paralel gagal ({e}), diulang tanpa process pool")
+                    for phase in self.load_timings:
+                        self.load_timings[phase] = 0.0
+            return self._load_users_serial()
         except Exception as e:
             print(f"❌ Error loading users: {e}")
             return {}
+        finally:
+            if gc_enabled:
+                gc.enable()
     
-    def sanitize_user_data(self, user_data):
-        """Sanitize data user individual"""
-        sanitized = {}
+    def _load_users_serial(self):
+        """Baca batch mentah dari storage, validasi langsung ke record di proses ini"""
+        timings = self.load_timings
+        users = {}
+        for batch in _timed(self.storage.iter_load(self.load_batch_size), timings, 'read'):
+            start = time.perf_counter()
+            records = load_batch(batch)
+            timings['validate'] += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            users.update(records)
+            timings['build'] += time.perf_counter() - start
+        return users
+    
+    def _load_users_parallel(self):
+        """Potong snapshot per fragmen, parse + validasi di process pool"""
+        timings = self.load_timings
+        users = {}
         
-        # Field yang diizinkan
-        allowed_fields = {
-            'id', 'first_name', 'username', 'language_code', 
-            'first_seen', 'last_seen', 'message_count', 
-            'total_messages', 'last_message', 'premium', 
-            'premium_since', 'credits'
-        }
+        def build(future):
+            start = time.perf_counter()
+            loaded = future.result()
+            timings['validate'] += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            for user_id, values in loaded:
+                users[user_id] = UserRecord(*values)
+            timings['build'] += time.perf_counter() - start
+        
+        start = time.perf_counter()
+        changes = self.storage.load_changes()
+        timings['read'] += time.perf_counter() - start
         
-        for field, value in user_data.items():
-            if field in allowed_fields:
-                if field in ['first_name', 'username', 'last_message']:
-                    sanitized[field] = self.sanitize_input(value, 500)
-                elif field in ['first_seen', 'last_seen', 'premium_since']:
-                    # Validasi format datetime ISO
-                    if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', value):
-                        sanitized[field] = value
-                elif field in ['id', 'message_count', 'total_messages', 'credits']:
-                    # Validasi angka
-                    if isinstance(value, (int, float)) and value >= 0:
-                        sanitized[field] = int(value)
-                elif field == 'premium':
-                    # Validasi boolean
-                    sanitized[field] = bool(value)
-                elif field == 'language_code':
-                    # Validasi language code
-                    if isinstance(value, str) and re.match(r'^[a-z]{2,3}(-[A-Z]{2,3})?$', value):
-                        sanitized[field] = value
+        with ProcessPoolExecutor(max_workers=self.load_workers, mp_context=_pool_context(),
+                                 initializer=_init_load_worker, initargs=(changes,)) as executor:
+            # Fragmen yang sedang diproses dibatasi supaya memory tetap kecil
+            in_flight = deque()
+            for fragment in _timed(self.storage.iter_fragments(), timings, 'read'):
+                in_flight.append(executor.submit(load_fragment, fragment))
+                if len(in_flight) >= self.load_workers * 2:
+                    build(in_flight.popleft())
+            while in_flight:
+                build(in_flight.popleft())
         
-        return sanitized
+        # User yang hanya ada di journal
+        new_users = [(user_id, fields) for user_id, fields in changes.items() if user_id not in users]
+        users.update(load_batch(new_users))
+        return users
+    
+    def print_load_timings(self):
+        """Tampilkan waktu load per fase"""
+        timings = self.load_timings
+        total = sum(timings.values())
+        print(f"📂 {len(self.users)} user dimuat dalam {total:.2f}s "
+              f"(baca {timings['read']:.2f}s | validasi {timings['validate']:.2f}s | "
+              f"record {timings['build']:.2f}s | index {timings['index']:.2f}s)")
+    
+    def sanitize_user_data(self, user_data):
+        """Sanitize data user individual"""
+        return sanitize_user_data(user_data)
+    
+    def _reconcile_credits(self):
+        """Saldo dari ledger menang; credits lama tanpa riwayat dicatat sebagai saldo awal"""
+        for user_id, user in self.users.items():
+            balance = self.ledger.balances.get(user_id)
+            if balance is not None:
+                user.credits = balance
+            elif user.credits:
+                self.ledger.apply(user_id, user.credits, f"opening:{user_id}")
+        self.ledger.commit()
     
     def backup_corrupted_file(self):
         """Backup file yang corrupt"""
-        try:
-            if os.path.exists(self.filename):
-                backup_name = f"{self.filename}.corrupted.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                os.rename(self.filename, backup_name)
-                print(f"📦 File corrupt dibackup sebagai: {backup_name}")
-        except Exception as e:
-            print(f"❌ Gagal backup file corrupt: {e}")
+        self.storage.backup_corrupted()
     
     def save_users(self):
-        """Simpan data pengguna ke file JSON dengan security"""
+        """Tulis snapshot semua pengguna ke storage dengan security (atomic write)"""
         try:
             # Validasi data sebelum save
             if not isinstance(self.users, dict):
                 print("❌ Invalid data structure!")
-                return
+                return False
             
-            # Limit jumlah users (prevent memory exhaustion)
-            if len(self.users) > 100000:
-                print("❌ Too many users!")
-                return
-            
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, indent=2, ensure_ascii=False)
+            with self._save_lock:
+                # Copy dict (atomic), lalu serialisasi tiap record di bawah lock user-nya
+                # supaya tidak tercampur dengan mutasi yang sedang berjalan
+                snapshot = {}
+                for user_id, record in self.users.copy().items():
+                    with self._lock_for(user_id):
+                        snapshot[user_id] = record.to_dict()
+                return self.storage.write_snapshot(snapshot)
         except Exception as e:
             print(f"❌ Error saving users: {e}")
+            return False
+    
+    def _lock_for(self, user_id):
+        """Lock stripe untuk satu user"""
+        return self._user_locks[hash(user_id) % self.LOCK_STRIPES]
+    
+    def _update_index(self, user_id, total_messages):
+        if self.top_users_index is None:
+            return
+        with self._index_lock:
+            self.top_users_index.update(user_id, total_messages)
+    
+    def _record_change(self, user_id, op, fields, delta=None):
+        """Catat mutasi ke storage (dipanggil di bawah lock user, urutan journal = urutan mutasi)"""
+        self.storage.record(op, user_id, fields, delta)
+        
+        with self._dirty_lock:
+            self._dirty.add(user_id)
+            if self.write_behind and len(self._dirty) >= self.flush_threshold:
+                self._flush_event.set()
+    
+    def _save_if_sync(self):
+        """Simpan langsung jika write-behind tidak aktif (di luar lock user)"""
+        if not self.write_behind:
+            self.flush()
+    
+    def _flush_loop(self):
+        """Loop background: flush tiap interval atau saat dirty melewati threshold"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+    
+    def flush(self):
+        """Simpan semua perubahan yang tertunda dalam satu batch"""
+        # Transaksi credits: satu batch ledger per flush
+        if self.ledger is not None and not self.ledger.commit():
+            return False
+        
+        with self._dirty_lock:
+            if not self._dirty:
+                return True
+            dirty = self._dirty
+            self._dirty = set()
+        
+        with self._save_lock:
+            start = time.perf_counter()
+            saved = self.storage.commit()
+            if saved and self.storage.needs_snapshot():
+                # Compact: tulis snapshot penuh (JSON: selalu, journal: jika sudah panjang)
+                saved = self.save_users()
+            self.save_latency.observe(time.perf_counter() - start)
+        
+        if not saved:
+            # Gagal simpan, kembalikan ke antrian dirty untuk dicoba lagi
+            with self._dirty_lock:
+                self._dirty |= dirty
+            return False
+        return True
+    
+    def get_storage_stats(self):
+        """Durasi simpan, byte yang ditulis dan antrian yang belum tersimpan"""
+        ledger_stats = self.ledger.get_stats() if self.ledger is not None else {}
+        return {
+            'save_latency': self.save_latency,
+            'bytes_written': self.storage.bytes_written + ledger_stats.get('bytes_written', 0),
+            'dirty_users': len(self._dirty),
+            'pending_credits': ledger_stats.get('pending', 0),
+            'users': len(self.users)
+        }
+    
+    def close(self):
+        """Hentikan flusher dan flush data terakhir"""
+        if self._flusher is not None:
+            self._stop_event.set()
+            self._flush_event.set()
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        self.storage.close()
     
     def add_or_update_user(self, telegram_user: User, message_text=None):
         """Tambah atau update data pengguna dengan security"""
-        user_id = self.validate_user_id(telegram_user.id)
+        user_id = validate_user_id(telegram_user.id)
         if not user_id:
             print(f"❌ Invalid user ID: {telegram_user.id}")
             return None
         
-        # Sanitize input
-        sanitized_message = self.sanitize_input(message_text, 500)
-        sanitized_first_name = self.sanitize_input(telegram_user.first_name, 100)
-        sanitized_username = self.sanitize_input(telegram_user.username, 100)
+        # Sanitize input (nama/username yang tidak berubah tidak di-sanitize ulang)
+        sanitized_message = sanitize_input(message_text, 500)
+        with self._lock_for(user_id):
+            user = self._add_or_update_locked(user_id, telegram_user, sanitized_message)
+        self._save_if_sync()
+        return user
+    
+    def _add_or_update_locked(self, user_id, telegram_user, sanitized_message):
+        """Bagian add_or_update_user yang berjalan di bawah lock user"""
+        user = self.users.get(user_id)
+        if user is None:
+            sanitized_first_name = sanitize_input(telegram_user.first_name, 100)
+            sanitized_username = sanitize_input(telegram_user.username, 100)
+        else:
+            sanitized_first_name = sanitize_unchanged(telegram_user.first_name, user.first_name, 100)
+            sanitized_username = sanitize_unchanged(telegram_user.username, user.username, 100)
         
-        if user_id not in self.users:
+        if user is None:
             # User baru
-            self.users[user_id] = {
-                'id': telegram_user.id,
-                'first_name': sanitized_first_name,
-                'username': sanitized_username,
-                'language_code': self.sanitize_input(telegram_user.language_code, 10),
-                'first_seen': datetime.now().isoformat(),
-                'last_seen': datetime.now().isoformat(),
-                'message_count': 1,
-                'total_messages': 1,
-                'last_message': sanitized_message,
-                'premium': False,
-                'premium_since': None,
-                'credits': 0
-            }
+            now = now_epoch()
+            user = UserRecord(
+                id=telegram_user.id,
+                first_name=sanitized_first_name,
+                username=sanitized_username,
+                language_code=sanitize_input(telegram_user.language_code, 10),
+                first_seen=now,
+                last_seen=now,
+                message_count=1,
+                total_messages=1,
+                last_message=sanitized_message
+            )
+            self.users[user_id] = user
             print(f"👤 User baru ditambahkan: {sanitized_first_name} (ID: {user_id})")
+            self._update_index(user_id, 1)
+            self._record_change(user_id, 'new', user.to_dict())
         else:
             # Update user yang sudah ada
-            self.users[user_id]['last_seen'] = datetime.now().isoformat()
-            self.users[user_id]['message_count'] += 1
-            self.users[user_id]['total_messages'] += 1
-            self.users[user_id]['last_message'] = sanitized_message
+            user.last_seen = now_epoch()
+            user.message_count += 1
+            user.total_messages += 1
+            user.last_message = sanitized_message
             
             # Update info jika ada perubahan
-            self.users[user_id]['first_name'] = sanitized_first_name
-            self.users[user_id]['username'] = sanitized_username
-        
-        # Auto-save ke file
-        self.save_users()
+            user.first_name = sanitized_first_name
+            user.username = sanitized_username
+            self._update_index(user_id, user.total_messages)
+            
+            # Auto-save ke file (langsung atau via write-behind)
+            self._record_change(user_id, 'seen', {
+                'last_seen': to_iso(user.last_seen),
+                'message_count': user.message_count,
+                'total_messages': user.total_messages,
+                'last_message': sanitized_message,
+                'first_name': sanitized_first_name,
+                'username': sanitized_username
+            })
         
-        return self.users[user_id]
+        return user
     
     def set_premium(self, user_id, premium_status=True):
         """Set status premium user dengan security"""
@@ -181,39 +522,82 @@ class UserManager:
         # Validasi input
         premium_status = bool(premium_status)
         
-        self.users[user_id]['premium'] = premium_status
-        if premium_status:
-            self.users[user_id]['premium_since'] = datetime.now().isoformat()
-        else:
-            self.users[user_id]['premium_since'] = None
+        user = self.users[user_id]
+        with self._lock_for(user_id):
+            user.premium = premium_status
+            user.premium_since = now_epoch() if premium_status else None
+            if premium_status:
+                self._premium_ids[int(user_id)] = None
+            else:
+                self._premium_ids.pop(int(user_id), None)
+            
+            self._record_change(user_id, 'premium', {
+                'premium': premium_status,
+                'premium_since': to_iso(user.premium_since)
+            })
+        self._save_if_sync()
         
-        self.save_users()
+        # Beri tahu cache lain (misal cache role) bahwa status premium berubah
+        for listener in self._premium_listeners:
+            listener(int(user_id), premium_status)
         return True
     
+    def add_premium_listener(self, listener):
+        """Daftarkan ``listener(user_id, premium)`` yang dipanggil setiap set_premium"""
+        self._premium_listeners.append(listener)
+    
     def is_premium(self, user_id):
-        """Cek apakah user premium dengan security"""
-        user_id = self.validate_user_id(user_id)
-        if not user_id or user_id not in self.users:
-            return False
-        
-        return self.users[user_id].get('premium', False)
+        """Cek apakah user premium (satu lookup di set premium)"""
+        # Fast path: ID dari Telegram selalu int
+        if type(user_id) is not int:
+            user_id = self.validate_user_id(user_id)
+            if not user_id:
+                return False
+            user_id = int(user_id)
+        return user_id in self._premium_ids
+    
+    def get_premium_ids(self):
+        """ID semua user premium"""
+        return list(self._premium_ids)
+    
+    def get_premium_count(self):
+        """Jumlah user premium (ukuran set premium)"""
+        return len(self._premium_ids)
     
     # FUNGSI YANG DITAMBAHKAN:
     
     def get_premium_users(self):
-        """Ambil semua user premium"""
+        """Ambil semua user premium (partial index SQLite atau set premium, tanpa scan semua user)"""
+        if self.storage.supports_queries:
+            return self.storage.query_premium_users()
         premium_users = []
-        for user_id, data in self.users.items():
-            if data.get('premium', False):
-                premium_users.append({
-                    'id': user_id,
-                    'name': data.get('first_name', 'Unknown'),
-                    'username': data.get('username', 'No username'),
-                    'premium_since': data.get('premium_since', 'Unknown')
-                })
+        for user_id in list(self._premium_ids):
+            user_id = str(user_id)
+            user = self.users.get(user_id)
+            if user is None:
+                continue
+            premium_users.append({
+                'id': user_id,
+                'name': user.first_name,
+                'username': user.username,
+                'premium_since': to_iso(user.premium_since) or 'Unknown'
+            })
         return premium_users
     
-    def add_credits(self, user_id, amount):
+    def _apply_credits(self, user_id, user, amount, idempotency_key):
+        """Catat transaksi credits di ledger; return saldo atau None jika ditolak"""
+        with self._lock_for(user_id):
+            credits, applied = self.ledger.apply(user_id, amount, idempotency_key)
+            if applied:
+                user.credits = credits
+        # Durable sebelum return (juga saat write-behind): cukup append satu batch ke ledger,
+        # users.json tidak ditulis ulang. Commit dari thread lain yang bersamaan ikut satu fsync.
+        # Retry dengan key yang sama juga menunggu transaksi pertama tersimpan.
+        if credits is not None:
+            self.ledger.commit()
+        return credits
+    
+    def add_credits(self, user_id, amount, idempotency_key=None):
         """Tambah credits ke user dengan security"""
         user_id = self.validate_user_id(user_id)
         if not user_id or user_id not in self.users:
@@ -223,11 +607,18 @@ class UserManager:
         if not isinstance(amount, (int, float)) or amount < 0:
             return None
         
-        self.users[user_id]['credits'] = self.users[user_id].get('credits', 0) + amount
-        self.save_users()
-        return self.users[user_id]['credits']
+        user = self.users[user_id]
+        if self.ledger is not None:
+            return self._apply_credits(user_id, user, amount, idempotency_key)
+        
+        with self._lock_for(user_id):
+            user.credits += amount
+            credits = user.credits
+            self._record_change(user_id, 'credits', {'credits': credits}, delta=amount)
+        self._save_if_sync()
+        return credits
     
-    def deduct_credits(self, user_id, amount):
+    def deduct_credits(self, user_id, amount, idempotency_key=None):
         """Kurangi credits user dengan security"""
         user_id = self.validate_user_id(user_id)
         if not user_id or user_id not in self.users:
@@ -237,41 +628,54 @@ class UserManager:
         if not isinstance(amount, (int, float)) or amount < 0:
             return None
         
-        current_credits = self.users[user_id].get('credits', 0)
-        if current_credits >= amount:
-            self.users[user_id]['credits'] = current_credits - amount
-            self.save_users()
-            return self.users[user_id]['credits']
-        return None
+        user = self.users[user_id]
+        if self.ledger is not None:
+            return self._apply_credits(user_id, user, -amount, idempotency_key)
+        
+        with self._lock_for(user_id):
+            if user.credits < amount:
+                return None
+            user.credits -= amount
+            credits = user.credits
+            self._record_change(user_id, 'credits', {'credits': credits}, delta=-amount)
+        self._save_if_sync()
+        return credits
     
     def get_user_stats(self, user_id):
         """Ambil statistik pengguna"""
         user_id = self.validate_user_id(user_id)
         if not user_id or user_id not in self.users:
             return None
-        return self.users[user_id]
+        with self._lock_for(user_id):
+            return self.users[user_id].to_dict()
     
     def get_all_users(self):
-        """Ambil semua data pengguna"""
-        return self.users
+        """Ambil semua data pengguna (format users.json)"""
+        users = {}
+        for user_id, user in self.users.copy().items():
+            with self._lock_for(user_id):
+                users[user_id] = user.to_dict()
+        return users
     
     def get_total_users(self):
         """Hitung total pengguna unik"""
         return len(self.users)
     
     def get_top_users(self, limit=10):
-        """Ambil top users berdasarkan jumlah pesan"""
-        users_list = []
-        for user_id, data in self.users.items():
-            users_list.append({
+        """Ambil top users berdasarkan jumlah pesan (dari index SQLite atau index di memory, O(limit))"""
+        if self.storage.supports_queries:
+            return self.storage.query_top_users(limit)
+        top_users = []
+        with self._index_lock:
+            top_user_ids = self.top_users_index.top(limit)
+        for user_id in top_user_ids:
+            user = self.users[user_id]
+            top_users.append({
                 'id': user_id,
-                'name': data.get('first_name', 'Unknown'),
-                'username': data.get('username', 'No username'),
-                'total_messages': data.get('total_messages', 0),
-                'first_seen': data.get('first_seen', 'Unknown'),
-                'premium': data.get('premium', False)
+                'name': user.first_name,
+                'username': user.username,
+                'total_messages': user.total_messages,
+                'first_seen': user.get('first_seen', 'Unknown'),
+                'premium': user.premium
             })
-        
-        # Urutkan berdasarkan total messages (descending)
-        users_list.sort(key=lambda x: x['total_messages'], reverse=True)
-        return users_list[:limit]
\ No newline at end of file
+        return top_users
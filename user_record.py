@@ -0,0 +1,112 @@
+import sys
+from datetime import datetime, timedelta
+
+from storage import USER_FIELDS
+
+# Field waktu disimpan sebagai epoch detik (int), di JSON tetap string ISO
+TIMESTAMP_FIELDS = ('first_seen', 'last_seen', 'premium_since')
+# Field yang tidak ditulis ke JSON jika kosong (user lama bisa tidak punya)
+OPTIONAL_FIELDS = ('first_seen', 'last_seen')
+
+# Epoch dihitung dari jam lokal (sama seperti string ISO di users.json), tanpa konversi timezone
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def to_epoch(value):
+    """ISO string -> epoch detik; None jika kosong/tidak valid"""
+    if not value:
+        return None
+    try:
+        return (datetime.fromisoformat(value) - _EPOCH) // _SECOND
+    except (TypeError, ValueError):
+        return None
+
+
+def to_iso(epoch):
+    """Epoch detik -> ISO string (format lama users.json)"""
+    if epoch is None:
+        return None
+    return (_EPOCH + timedelta(seconds=epoch)).isoformat()
+
+
+def now_epoch():
+    return (datetime.now() - _EPOCH) // _SECOND
+
+
+class UserRecord:
+    """Data satu user dalam bentuk ringkas (slots, bukan dict per user)
+
+    Timestamp disimpan sebagai epoch int dan language_code di-intern, jadi
+    ribuan user dengan bahasa sama berbagi satu string. Konversi ke format
+    users.json lewat ``to_dict`` / ``from_dict``; akses baca ala dict
+    (``record['credits']``, ``record.get(...)``) tetap didukung untuk kode lama.
+    """
+
+    __slots__ = USER_FIELDS
+
+    def __init__(self, id=0, first_name="", username="", language_code="",
+                 first_seen=None, last_seen=None, message_count=0, total_messages=0,
+                 last_message="", premium=False, premium_since=None, credits=0):
+        self.id = id
+        self.first_name = first_name
+        self.username = username
+        self.language_code = sys.intern(language_code)
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.message_count = message_count
+        self.total_messages = total_messages
+        self.last_message = last_message
+        self.premium = premium
+        self.premium_since = premium_since
+        self.credits = credits
+
+    @classmethod
+    def from_dict(cls, data):
+        """Buat record dari dict format users.json (sudah di-sanitize)"""
+        return cls(
+            id=data.get('id', 0),
+            first_name=data.get('first_name', ""),
+            username=data.get('username', ""),
+            language_code=data.get('language_code', ""),
+            first_seen=to_epoch(data.get('first_seen')),
+            last_seen=to_epoch(data.get('last_seen')),
+            message_count=data.get('message_count', 0),
+            total_messages=data.get('total_messages', 0),
+            last_message=data.get('last_message', ""),
+            premium=data.get('premium', False),
+            premium_since=to_epoch(data.get('premium_since')),
+            credits=data.get('credits', 0)
+        )
+
+    def as_tuple(self):
+        """Nilai field berurutan sesuai USER_FIELDS (ringan untuk dikirim antar proses)"""
+        return tuple(getattr(self, field) for field in USER_FIELDS)
+
+    def to_dict(self):
+        """Serialisasi ke dict format users.json"""
+        data = {field: getattr(self, field) for field in USER_FIELDS}
+        for field in TIMESTAMP_FIELDS:
+            data[field] = to_iso(data[field])
+        for field in OPTIONAL_FIELDS:
+            if data[field] is None:
+                del data[field]
+        return data
+
+    def get(self, field, default=None):
+        """Baca field seperti dict (timestamp dikembalikan sebagai ISO string)"""
+        if field not in USER_FIELDS:
+            return default
+        value = getattr(self, field)
+        if value is None and field in OPTIONAL_FIELDS:
+            return default
+        return to_iso(value) if field in TIMESTAMP_FIELDS else value
+
+    def __getitem__(self, field):
+        if field not in USER_FIELDS or (field in OPTIONAL_FIELDS and getattr(self, field) is None):
+            raise KeyError(field)
+        value = getattr(self, field)
+        return to_iso(value) if field in TIMESTAMP_FIELDS else value
+
+    def __repr__(self):
+        return f"UserRecord(id={self.id!r}, first_name={self.first_name!r})"
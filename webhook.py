@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+from telegram import Update
+
+from simple_http import HttpResponse, start_http_server
+
+
+def bot_id_from_token(token):
+    """Bagian angka token (ID bot) dipakai sebagai path webhook"""
+    return token.split(':', 1)[0]
+
+
+def webhook_secret_for(token, secret):
+    """Secret token per bot (dikirim Telegram di header X-Telegram-Bot-Api-Secret-Token)"""
+    return hmac.new(secret.encode('utf-8'), token.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class WebhookServer:
+    """Satu server HTTP lokal yang menerima webhook untuk semua bot
+
+    Update diarahkan ke bot sesuai path ``/bot<id>`` dan dicek dengan secret
+    token masing-masing bot. Update dimasukkan ke ``update_queue`` aplikasi;
+    jika antrian (bounded) penuh, server membalas 503 sehingga Telegram
+    mengirim ulang nanti (backpressure).
+    """
+
+    def __init__(self, host='127.0.0.1', port=8443, max_body_size=1024 * 1024):
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.routes = {}
+        self.accepted = 0
+        self.rejected = 0
+        self._server = None
+
+    def add_bot(self, application, token, secret):
+        """Daftarkan bot; return (path, secret_token) untuk setWebhook"""
+        path = f"/bot{bot_id_from_token(token)}"
+        secret_token = webhook_secret_for(token, secret)
+        self.routes[path] = (application, secret_token)
+        return path, secret_token
+
+    def remove_bot(self, token):
+        """Hapus route untuk satu bot"""
+        self.routes.pop(f"/bot{bot_id_from_token(token)}", None)
+
+    def queue_depths(self):
+        """Jumlah update yang menunggu di antrian tiap bot"""
+        return {path: application.update_queue.qsize() for path, (application, _) in self.routes.items()}
+
+    @property
+    def bound_port(self):
+        """Port yang benar-benar dipakai (berguna jika port=0)"""
+        if self._server is None:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self._server = await start_http_server(
+            self.handle_request, self.host, self.port, self.max_body_size
+        )
+        print(f"🌐 Webhook server listening di {self.host}:{self.bound_port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle_request(self, request):
+        """Terima satu update webhook"""
+        if request.method != 'POST':
+            return HttpResponse(405)
+
+        route = self.routes.get(request.path)
+        if route is None:
+            return HttpResponse(404)
+
+        application, secret_token = route
+        received_secret = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(received_secret, secret_token):
+            return HttpResponse(403)
+
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except (ValueError, TypeError, KeyError):
+            return HttpResponse(400)
+
+        try:
+            application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Backpressure: Telegram akan retry update ini
+            self.rejected += 1
+            return HttpResponse(503, headers={'Retry-After': '1'})
+
+        self.accepted += 1
+        return HttpResponse(200)